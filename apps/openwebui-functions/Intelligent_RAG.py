@@ -24,6 +24,58 @@ from pydantic import BaseModel, Field
 import requests
 
 
+class FullContextMarkerDetector:
+    """
+    Finds the full context marker in a streamed response, chunk by chunk.
+    
+    Same interface as intelligent_rag.FullContextMarkerDetector, copied here
+    because an Open WebUI function is a single file. Until the marker is found
+    only the last ``len(marker) - 1`` characters are kept between chunks, so a
+    marker split across chunk boundaries is still found without rescanning.
+    Text after the marker is kept, since the model explains its request there.
+    """
+    
+    def __init__(self, marker: str):
+        self.marker = marker
+        self.detected = False
+        # Offset of the marker in the whole response, once detected
+        self.marker_offset: Optional[int] = None
+        self._chunk_end: Optional[int] = None
+        self._consumed = 0
+        self._tail = ""
+        self._after: List[str] = []
+    
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk; returns True for the chunk that completes the marker."""
+        if self.detected:
+            self._after.append(chunk)
+            self._consumed += len(chunk)
+            return False
+        window = self._tail + chunk
+        index = window.find(self.marker)
+        if index >= 0:
+            self.detected = True
+            self.marker_offset = self._consumed - len(self._tail) + index
+            self._chunk_end = index + len(self.marker) - len(self._tail)
+            self._after.append(window[index + len(self.marker):])
+        else:
+            keep = len(self.marker) - 1
+            self._tail = window[-keep:] if keep else ""
+        self._consumed += len(chunk)
+        return self.detected
+    
+    def chunk_index(self, chunk: str) -> int:
+        """Position of the end of the marker within the chunk that completed it."""
+        if self._chunk_end is None:
+            return len(chunk)
+        return self._chunk_end
+    
+    @property
+    def reasoning(self) -> str:
+        """Text streamed after the marker so far."""
+        return "".join(self._after).strip()
+
+
 class Filter:
     """Open WebUI Function Filter for Intelligent RAG."""
     
@@ -41,6 +93,11 @@ class Filter:
             default=True,
             description="Automatically reroll with full context when requested"
         )
+        stop_stream_on_marker: bool = Field(
+            default=True,
+            description="Hide the rest of the answer once the model requests full context "
+                        "(the model still generates it upstream)"
+        )
         verbose: bool = Field(
             default=True,
             description="Show classification details in response"
@@ -69,6 +126,13 @@ class Filter:
         self.api_key = self.valves.openrouter_api_key or os.getenv("OPENROUTER_API_KEY", "")
         self.classification_cache: Dict[str, Dict] = {}
         self.full_context_marker = "[REQUEST_FULL_CONTEXT]"
+        # Marker detectors for responses currently streaming, keyed by message id
+        self.stream_detectors: Dict[str, FullContextMarkerDetector] = {}
+        # Explanations that followed a marker hidden from finished streams, for outlet
+        self.stream_reasons: Dict[str, str] = {}
+        self.max_streams = 1000
+        # Keep-alive session so classifier calls reuse their TCP connection
+        self.session = requests.Session()
     
     def classify_query(self, query: str) -> Optional[Dict]:
         """Classify query using the intelligent RAG service."""
@@ -77,7 +141,7 @@ class Filter:
             if query in self.classification_cache:
                 return self.classification_cache[query]
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.classifier_url}/classify",
                 json={"query": query},
                 timeout=10
@@ -168,7 +232,7 @@ Respond with JSON: {{"tier": 1|2|3, "type": "...", "confidence": 0.0-1.0, "reaso
                 print(f"[IntelligentRAG] Direct LLM error: {e}")
             return None
     
-    def check_response_for_full_context(self, response: str, rag_config: Dict) -> Tuple[bool, str]:
+    def check_response_for_full_context(self, response: str, rag_config: Optional[Dict] = None) -> Tuple[bool, str]:
         """Check if response contains a full context request marker."""
         if self.full_context_marker in response:
             parts = response.split(self.full_context_marker, 1)
@@ -314,7 +378,8 @@ TOP_K: {new_top_k}
         
         return body
     
-    def outlet(self, body: Dict, __user__: Optional[Dict] = None) -> Dict:
+    def outlet(self, body: Dict, __user__: Optional[Dict] = None,
+               __metadata__: Optional[Dict] = None) -> Dict:
         """
         Process outgoing response from LLM.
         Check for full context requests.
@@ -322,6 +387,10 @@ TOP_K: {new_top_k}
         if not self.valves.enabled or not self.valves.auto_reroll:
             return body
         
+        message_id = body.get("id") or (__metadata__ or {}).get("message_id")
+        # Set when stream hid the explanation after the marker from the message
+        streamed_reason = self.stream_reasons.pop(message_id, "") if message_id else ""
+        
         # Get the assistant's response
         messages = body.get("messages", [])
         last_assistant_msg = None
@@ -335,6 +404,7 @@ TOP_K: {new_top_k}
         
         # Check if response requests full context
         has_marker, reasoning = self.check_response_for_full_context(last_assistant_msg)
+        reasoning = reasoning or streamed_reason
         
         if has_marker:
             if self.valves.verbose:
@@ -351,6 +421,69 @@ TOP_K: {new_top_k}
             body["metadata"]["intelligent_rag"]["reroll_reason"] = reasoning
         
         return body
+    
+    def stream(self, event: Dict, __metadata__: Optional[Dict] = None) -> Dict:
+        """
+        Watch streamed response chunks for the full context marker.
+        
+        As soon as the marker is complete, the rest of the answer is blanked
+        out, so the user does not read the model's under-contexted answer.
+        This only truncates what is displayed: a stream filter cannot cancel
+        the upstream completion, which runs (and is billed) to its real end,
+        and the stream finishes with the model's own finish_reason. The marker
+        stays in the message, and the hidden explanation after it is handed to
+        outlet, which records the reroll request with its reason.
+        
+        Streams are told apart by message id, or by completion id when Open
+        WebUI passes no metadata; a stream with neither is not watched, since
+        it could not be kept apart from other chats streaming at the same time.
+        Without a message id the answer is still truncated, but the hidden
+        explanation is dropped when the stream finishes, as outlet could not
+        match it to the message.
+        """
+        if not self.valves.enabled or not self.valves.auto_reroll:
+            return event
+        
+        message_id = (__metadata__ or {}).get("message_id")
+        stream_id = message_id or event.get("id")
+        if not stream_id:
+            return event
+        for choice in event.get("choices", []):
+            delta = choice.get("delta") or {}
+            content = delta.get("content")
+            finished = choice.get("finish_reason")
+            
+            detector = self.stream_detectors.get(stream_id)
+            if detector is None and content:
+                if len(self.stream_detectors) >= self.max_streams:
+                    # Drop the oldest stream that never reported a finish_reason
+                    self.stream_detectors.pop(next(iter(self.stream_detectors)))
+                detector = FullContextMarkerDetector(self.full_context_marker)
+                self.stream_detectors[stream_id] = detector
+            
+            if detector is not None and content:
+                if detector.detected:
+                    detector.feed(content)  # Kept as the reroll reason
+                    if self.valves.stop_stream_on_marker:
+                        delta["content"] = ""
+                elif detector.feed(content):
+                    if self.valves.verbose:
+                        print(f"[IntelligentRAG] ⚠️ Full context requested mid-stream")
+                    if self.valves.stop_stream_on_marker:
+                        delta["content"] = content[:detector.chunk_index(content)]
+            
+            if finished:
+                detector = self.stream_detectors.pop(stream_id, None)
+                # outlet looks reasons up by message id, so one keyed by a
+                # completion id could never be collected
+                if (detector is not None and detector.detected and message_id
+                        and self.valves.stop_stream_on_marker):
+                    if len(self.stream_reasons) >= self.max_streams:
+                        # Drop the oldest reason outlet never collected
+                        self.stream_reasons.pop(next(iter(self.stream_reasons)))
+                    self.stream_reasons[stream_id] = detector.reasoning
+        
+        return event
 
 
 class Pipe:
@@ -48,10 +48,11 @@ echo "    Bin dir: $BIN_DIR"
 # Copy files
 echo -e "${BLUE}[3/5]${NC} Installing files..."
 cp "$SCRIPT_DIR/intelligent_rag.py" "$INSTALL_DIR/"
+cp "$SCRIPT_DIR/intelligent_rag_llm.py" "$SCRIPT_DIR/intelligent_rag_distill.py" "$SCRIPT_DIR/intelligent_rag_bench.py" "$INSTALL_DIR/"
 cp "$SCRIPT_DIR/rag-cli" "$INSTALL_DIR/"
 chmod +x "$INSTALL_DIR/rag-cli"
 chmod +x "$INSTALL_DIR/intelligent_rag.py"
-echo "    Copied intelligent_rag.py"
+echo "    Copied intelligent_rag.py and its LLM, distill and bench modules"
 echo "    Copied rag-cli"
 
 # Install Python dependencies
@@ -14,18 +14,35 @@ Usage:
 import os
 import sys
 import json
+import logging
 import re
 import argparse
 import asyncio
+import bisect
+import hashlib
+import io
+import sqlite3
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Literal
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Literal
 from dataclasses import dataclass, asdict
 from datetime import datetime
 from enum import Enum
 import http.server
+import multiprocessing
+import signal
+import socket
 import socketserver
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
 
+try:
+    import orjson  # Optional: faster JSON encoding for server responses
+except ImportError:
+    orjson = None
+
 
 class QueryType(Enum):
     """Classification of query types for context management."""
@@ -43,6 +60,8 @@ class QueryClassification:
     recommended_tier: int
     rag_full_context: bool
     top_k: int
+    # A stand-in answer, e.g. keywords while the LLM is late; callers should not cache it
+    provisional: bool = False
 
 
 @dataclass
@@ -95,6 +114,53 @@ Respond with [REQUEST_FULL_CONTEXT] to retrieve all documents.
 }
 
 
+def _trie_pattern(words) -> str:
+    """Build a regex that matches the longest of ``words`` via a character trie."""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    
+    def node_pattern(node: Dict) -> str:
+        branches = [re.escape(char) + node_pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Greedy optional: prefer the longer word when this node also ends one
+        return f"(?:{body})?" if "" in node else body
+    
+    return node_pattern(trie)
+
+
+def _literal_prefix(pattern: str) -> str:
+    """Return the plain-word prefix every match of ``pattern`` must start with."""
+    depth = 0
+    chars = iter(pattern)
+    for char in chars:
+        if char == "\\":
+            next(chars, None)
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            # Top-level alternation: matches need not share any prefix
+            return ""
+    
+    prefix = re.match(r"[A-Za-z0-9 ]*", pattern).group()
+    if prefix and pattern[len(prefix):len(prefix) + 1] in ("?", "*", "{"):
+        # The last character is quantified, so it is not guaranteed
+        prefix = prefix[:-1]
+    return prefix.lower()
+
+
+def _disjoint_prefixes(a: str, b: str) -> bool:
+    """True if no string can start with both literal prefixes ``a`` and ``b``."""
+    return bool(a) and bool(b) and not a.startswith(b) and not b.startswith(a)
+
+
 class QueryClassifier:
     """Classifies user queries to determine appropriate context strategy."""
     
@@ -149,23 +215,167 @@ class QueryClassifier:
         r"comprehensive\s+(?:diagram|documentation|analysis|review)"
     ]
     
-    def __init__(self):
+    # Terms checked by the architecture/design indicators in classify()
+    ARCH_INDICATOR_TERMS = [
+        "architecture", "design", "pattern", "system",
+        "flow", "diagram", "overview",
+        "how", "connect", "interact", "work together"
+    ]
+    
+    # Queries longer than this many characters are classified in long-input mode
+    MAX_SCAN_CHARS = 4000
+    
+    # Lines of pasted machine output: traceback frames, log lines, exception lines
+    NOISE_LINE = re.compile(
+        r"""^(?:\s+(?:File\s"|at\s|\.\.\.)"""
+        r"""|Traceback\s\(most\srecent\scall\slast\)"""
+        r"""|\s*\[?\d{4}-\d{2}-\d{2}[T\s]\d{2}:\d{2}"""
+        r"""|[\w.]+(?:Error|Exception|Warning):)"""
+    )
+    
+    def __init__(self, max_scan_chars: Optional[int] = None):
         self.creative_patterns = [re.compile(p, re.IGNORECASE) for p in self.CREATIVE_PATTERNS]
+        self.max_scan_chars = self.MAX_SCAN_CHARS if max_scan_chars is None else max_scan_chars
+        self._build_matcher()
+    
+    def _build_matcher(self):
+        """
+        Compile every keyword, indicator term and creative pattern into a
+        single regex so a query is scanned once, whatever the vocabulary size.
+        
+        The scanner stops only where a term from the keyword trie starts and
+        captures the longest one. Creative patterns are tried only at those
+        positions, each in its own optional lookahead; their leading words are
+        added to the trie as triggers so every pattern start is visited.
+        """
+        self._comprehensive_terms = frozenset(self.COMPREHENSIVE_KEYWORDS)
+        self._specific_terms = frozenset(self.SPECIFIC_KEYWORDS)
+        terms = set(self._comprehensive_terms | self._specific_terms)
+        terms.update(self.ARCH_INDICATOR_TERMS)
+        
+        triggers = [_literal_prefix(pattern) for pattern in self.CREATIVE_PATTERNS]
+        terms.update(trigger for trigger in triggers if trigger)
+        
+        # Any shorter term that is a prefix of the longest match also matched there
+        self._prefix_terms = {
+            term: tuple(other for other in terms if term.startswith(other))
+            for term in terms
+        }
+        
+        start = f"(?P<term>{_trie_pattern(terms)})"
+        untriggered = [p for p, trigger in zip(self.CREATIVE_PATTERNS, triggers) if not trigger]
+        if untriggered:
+            # Patterns without a literal start widen the set of scan positions
+            start = "|".join([f"(?:{start})"] + [f"(?i:{p})" for p in untriggered])
+        
+        # Patterns in one lane start with different words, so at most one of
+        # them can match at a position and they can share a single alternation
+        lanes: List[List[int]] = []
+        for i, trigger in enumerate(triggers):
+            for lane in lanes:
+                if all(_disjoint_prefixes(trigger, triggers[j]) for j in lane):
+                    lane.append(i)
+                    break
+            else:
+                lanes.append([i])
+        
+        self._creative_groups = tuple(f"creative{i}" for i in range(len(self.CREATIVE_PATTERNS)))
+        creative_lookaheads = "".join(
+            "(?:(?=(?i:" + "|".join(
+                f"(?P<{self._creative_groups[i]}>{self.CREATIVE_PATTERNS[i]})" for i in lane
+            ) + ")))?"
+            for lane in lanes
+        )
+        # Case-insensitivity is scoped to the patterns: the trie scans lower-cased
+        # text, and a global IGNORECASE flag would triple its cost
+        self._matcher = re.compile(f"(?=(?:{start})){creative_lookaheads}")
+    
+    def _scan(self, query_lower: str) -> Tuple[set, int]:
+        """
+        Scan a lower-cased query once.
+        
+        Returns:
+            Tuple of (matched keyword/indicator terms, creative pattern matches)
+        """
+        longest = set()
+        creative = set()
+        for match in self._matcher.finditer(query_lower):
+            longest.add(match.group("term"))
+            # Creative groups close after the term group, so this is the common case
+            if match.lastgroup != "term":
+                creative.update(g for g in self._creative_groups if match.group(g) is not None)
+        longest.discard(None)
+        
+        terms = set()
+        for term in longest:
+            terms.update(self._prefix_terms[term])
+        return terms, len(creative)
+    
+    def bounded_text(self, query: str) -> str:
+        """
+        Reduce a long query to the text worth classifying, at bounded cost.
+        
+        Queries within ``max_scan_chars`` (or with the limit disabled by
+        setting it to 0) are returned unchanged. Longer ones keep only a
+        head and a tail window of ``max_scan_chars / 2`` each, since the
+        question usually comes before or after the pasted material. Fenced
+        code blocks and stack trace or log lines are then dropped from the
+        windows. If nothing but code is left, the raw windows are used.
+        """
+        if self.max_scan_chars <= 0 or len(query) <= self.max_scan_chars:
+            return query
+        
+        half = self.max_scan_chars // 2
+        tail_start = len(query) - half
+        head = query[:half]
+        tail = query[tail_start:]
+        # An odd number of fences before the tail means it starts inside a code block
+        tail_in_fence = query.count("```", 0, tail_start) % 2 == 1
+        
+        prose = "\n".join(filter(None, [
+            self._strip_code(head, in_fence=False),
+            self._strip_code(tail, in_fence=tail_in_fence),
+        ]))
+        return prose if prose.strip() else head + "\n" + tail
+    
+    def _strip_code(self, text: str, in_fence: bool) -> str:
+        """Drop fenced code blocks and pasted trace/log lines from ``text``."""
+        kept = []
+        for line in text.splitlines():
+            if line.lstrip().startswith("```"):
+                in_fence = not in_fence
+            elif not in_fence and not self.NOISE_LINE.match(line):
+                kept.append(line)
+        return "\n".join(kept)
     
     def classify(self, query: str) -> QueryClassification:
         """
         Classify a query and return recommended RAG configuration.
         
+        Queries longer than ``max_scan_chars`` are classified from
+        ``bounded_text()``, so cost stays flat however much text is pasted.
+        
         Args:
             query: The user's query string
             
         Returns:
             QueryClassification with tier recommendation
         """
+        text = self.bounded_text(query)
+        classification = self._classify_text(text)
+        if text is not query:
+            classification.reasoning += (
+                f" Long input: classified {len(text)} of {len(query)} characters "
+                f"with code and stack traces removed."
+            )
+        return classification
+    
+    def _classify_text(self, query: str) -> QueryClassification:
+        """Score a query with the compiled matcher."""
         query_lower = query.lower()
+        terms, creative_matches = self._scan(query_lower)
         
         # Check for creative synthesis patterns (Tier 3)
-        creative_matches = sum(1 for pattern in self.creative_patterns if pattern.search(query))
         if creative_matches > 0:
             return QueryClassification(
                 query_type=QueryType.CREATIVE_SYNTHESIS,
@@ -177,15 +387,15 @@ class QueryClassifier:
             )
         
         # Score comprehensive vs specific keywords
-        comp_score = sum(1 for k in self.COMPREHENSIVE_KEYWORDS if k in query_lower)
-        spec_score = sum(1 for k in self.SPECIFIC_KEYWORDS if k in query_lower)
+        comp_score = len(terms & self._comprehensive_terms)
+        spec_score = len(terms & self._specific_terms)
         
         # Check for architecture/design patterns
         arch_indicators = [
-            "architecture" in query_lower,
-            "design" in query_lower and "pattern" in query_lower,
-            "system" in query_lower and any(x in query_lower for x in ["flow", "diagram", "overview"]),
-            "how" in query_lower and any(x in query_lower for x in ["connect", "interact", "work together"])
+            "architecture" in terms,
+            "design" in terms and "pattern" in terms,
+            "system" in terms and any(x in terms for x in ["flow", "diagram", "overview"]),
+            "how" in terms and any(x in terms for x in ["connect", "interact", "work together"])
         ]
         arch_score = sum(arch_indicators)
         
@@ -213,6 +423,24 @@ class QueryClassifier:
             top_k=TIER_CONFIGS[1].top_k
         )
     
+    def classify_many(self, queries: List[str]) -> List[QueryClassification]:
+        """
+        Classify a batch of queries with the same compiled matcher.
+        
+        Repeated queries in the batch are classified once.
+        
+        Args:
+            queries: Query strings to classify
+            
+        Returns:
+            One QueryClassification per query, in input order
+        """
+        results: Dict[str, QueryClassification] = {}
+        for query in queries:
+            if query not in results:
+                results[query] = self.classify(query)
+        return [results[query] for query in queries]
+    
     def get_system_prompt_addition(self, classification: QueryClassification) -> str:
         """Get the system prompt addition for the classified query."""
         return TIER_CONFIGS[classification.recommended_tier].system_prompt_addition
@@ -237,6 +465,10 @@ class RAGResponseHandler:
             return True, reasoning
         return False, ""
     
+    def stream_detector(self) -> "FullContextMarkerDetector":
+        """Create a detector that finds the marker while a response is still streaming."""
+        return FullContextMarkerDetector(self.FULL_CONTEXT_MARKER)
+    
     def create_reroll_config(self, original_config: Dict, reasoning: str) -> Dict:
         """
         Create a new RAG config for reroll with full context.
@@ -256,32 +488,902 @@ class RAGResponseHandler:
         return new_config
 
 
+class FullContextMarkerDetector:
+    """
+    Incremental detector for the full context marker in a streamed response.
+    
+    Feed it token chunks as they arrive; it reports the marker as soon as it is
+    complete, even when it is split across chunk boundaries. Until then only
+    the last ``len(marker) - 1`` characters are kept between chunks, so each
+    chunk is scanned once and a response without the marker takes constant
+    memory. Everything after the marker is kept for ``reasoning``, so memory
+    grows with the text that follows it.
+    """
+    
+    def __init__(self, marker: str = RAGResponseHandler.FULL_CONTEXT_MARKER):
+        self.marker = marker
+        self.detected = False
+        # Offset of the marker in the whole response, once detected
+        self.marker_offset: Optional[int] = None
+        self._chunk_end: Optional[int] = None
+        self._consumed = 0
+        self._tail = ""
+        self._after: List[str] = []
+    
+    def feed(self, chunk: str) -> bool:
+        """
+        Consume the next chunk of the response.
+        
+        Returns:
+            True for the chunk that completes the marker, False otherwise
+        """
+        if self.detected:
+            self._after.append(chunk)
+            self._consumed += len(chunk)
+            return False
+        
+        window = self._tail + chunk
+        index = window.find(self.marker)
+        if index >= 0:
+            self.detected = True
+            self.marker_offset = self._consumed - len(self._tail) + index
+            self._chunk_end = index + len(self.marker) - len(self._tail)
+            self._after.append(window[index + len(self.marker):])
+        else:
+            keep = len(self.marker) - 1
+            self._tail = window[-keep:] if keep else ""
+        self._consumed += len(chunk)
+        return self.detected
+    
+    def chunk_index(self, chunk: str) -> int:
+        """
+        Position of the end of the marker within the chunk that completed it.
+        
+        Text from this index on is what the model wrote after asking for more
+        context; callers streaming to a user can cut the chunk here.
+        """
+        if self._chunk_end is None:
+            return len(chunk)
+        return self._chunk_end
+    
+    @property
+    def reasoning(self) -> str:
+        """Text received after the marker so far, as check_for_full_context_request returns it."""
+        return "".join(self._after).strip()
+
+
+# Characters stripped from the end of a query when normalizing it
+TRAILING_PUNCTUATION = "?!.,;:"
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for caching: collapse whitespace, lower-case, drop trailing punctuation."""
+    return " ".join(query.lower().split()).rstrip(TRAILING_PUNCTUATION).rstrip()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with an entry limit, optional TTL and hit/miss counters.
+    
+    A ``max_entries`` of 0 disables caching: every lookup misses and nothing is stored.
+    
+    With ``max_bytes`` the cache is also bounded by the approximate memory of
+    its keys and values (values are measured with ``sizeof``), so a few huge
+    keys cannot grow it past the limit. Keys longer than ``hash_keys_over``
+    characters are stored as fixed-size SHA-1 digests instead of in full.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, hash_keys_over: Optional[int] = None,
+                 sizeof=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hash_keys_over = hash_keys_over
+        self.sizeof = sizeof or approximate_size
+        # key -> (expires_at, value, size in bytes)
+        self._entries: "OrderedDict[str, Tuple[float, object, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def _key(self, key: str) -> str:
+        if self.hash_keys_over is not None and len(key) > self.hash_keys_over:
+            return "sha1:" + hashlib.sha1(key.encode("utf-8", "surrogatepass")).hexdigest()
+        return key
+    
+    def get(self, key: str, default=None):
+        """Return the cached value for ``key``, or ``default`` if missing or expired."""
+        key = self._key(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value, size = entry
+                if expires_at >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.bytes -= size
+                self.expirations += 1
+            self.misses += 1
+            return default
+    
+    def put(self, key: str, value):
+        """Store ``value`` under ``key``, evicting the least recently used entries."""
+        if self.max_entries <= 0:
+            return
+        key = self._key(key)
+        size = sys.getsizeof(key) + self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            self._entries[key] = (expires_at, value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self.bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict:
+        """Get size and counter report."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+def approximate_size(value) -> int:
+    """Rough memory footprint of a cached value in bytes, following tuples and dataclass fields."""
+    size = sys.getsizeof(value)
+    if isinstance(value, tuple):
+        size += sum(approximate_size(item) for item in value)
+    elif hasattr(value, "__dataclass_fields__"):
+        size += sum(sys.getsizeof(getattr(value, name)) for name in value.__dataclass_fields__)
+    return size
+
+
+def default_cache_path() -> Path:
+    """Location of the persistent classification cache in the user's data dir."""
+    data_home = os.getenv("XDG_DATA_HOME") or os.path.join(Path.home(), ".local", "share")
+    return Path(data_home) / "intelligent-rag" / "classifications.db"
+
+
+class SQLiteCache:
+    """
+    Persistent classification cache in a SQLite database.
+    
+    Entries are keyed by normalized query plus a model name and prompt
+    version, so changing either never serves stale answers. The model is the
+    one the caller names: LLMQueryClassifier uses its primary model, so an
+    answer from a fallback model is kept under the primary's name. The
+    database is opened in WAL mode with a busy timeout, so server threads and
+    separate worker processes can read and write it concurrently. Expired
+    entries and the oldest entries beyond ``max_entries`` are removed every
+    ``EVICT_EVERY`` writes.
+    """
+    
+    EVICT_EVERY = 100
+    
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = 30 * 86400,
+                 max_entries: int = 100000):
+        self.path = Path(path) if path else default_cache_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS classifications ("
+                " key TEXT NOT NULL, model TEXT NOT NULL, prompt_version TEXT NOT NULL,"
+                " value TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (key, model, prompt_version)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS classifications_created ON classifications (created)")
+    
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection; reopened after a fork so processes never share one."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    @staticmethod
+    def _key(query: str) -> str:
+        return hashlib.sha1(normalize_query(query).encode("utf-8", "surrogatepass")).hexdigest()
+    
+    def get(self, query: str, model: str, prompt_version: str) -> Optional[QueryClassification]:
+        """Return the stored classification for ``query``, or None if missing or expired."""
+        row = self._connection().execute(
+            "SELECT value, created FROM classifications WHERE key = ? AND model = ? AND prompt_version = ?",
+            (self._key(query), model, prompt_version)
+        ).fetchone()
+        hit = row is not None and not (self.ttl and row[1] < time.time() - self.ttl)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not hit:
+            return None
+        data = json.loads(row[0])
+        data["query_type"] = QueryType(data["query_type"])
+        return QueryClassification(**data)
+    
+    def put(self, query: str, classification: QueryClassification, model: str, prompt_version: str):
+        """Store a classification, occasionally evicting expired and surplus entries."""
+        value = asdict(classification)
+        value["query_type"] = classification.query_type.value
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, ?)",
+                (self._key(query), model, prompt_version, json.dumps(value), time.time())
+            )
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.EVICT_EVERY == 0
+        if evict:
+            self.evict()
+    
+    def evict(self):
+        """Delete expired entries and the oldest entries beyond ``max_entries``."""
+        conn = self._connection()
+        with conn:
+            removed = 0
+            if self.ttl:
+                removed += conn.execute(
+                    "DELETE FROM classifications WHERE created < ?", (time.time() - self.ttl,)
+                ).rowcount
+            if self.max_entries > 0:
+                removed += conn.execute(
+                    "DELETE FROM classifications WHERE created < (SELECT created FROM classifications"
+                    " ORDER BY created DESC LIMIT 1 OFFSET ?)", (self.max_entries - 1,)
+                ).rowcount
+        with self._lock:
+            self.evictions += removed
+    
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM classifications")
+    
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+    
+    def stats(self) -> Dict:
+        """Get size and counter report; counters are for this process only."""
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+class FlightAbandoned(Exception):
+    """The owner of an in-flight key was cancelled before it finished."""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent work on the same key into one execution.
+    
+    The first caller for a key owns the work; callers arriving while it is in
+    flight wait on the owner's Future and get the same result, or the same
+    exception. If an async owner is cancelled, its waiters are not: the key
+    is released and one of them takes the work over. Nothing is kept once
+    the work finishes, so this is not a cache.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+    
+    def claim(self, keys: List[str]) -> Tuple[List[str], Dict[str, Future]]:
+        """
+        Claim distinct ``keys``.
+        
+        Returns:
+            Tuple of (keys the caller now owns and must resolve or fail,
+            Futures of keys already in flight elsewhere)
+        """
+        owned, waiting = [], {}
+        with self._lock:
+            for key in keys:
+                future = self._calls.get(key)
+                if future is None:
+                    self._calls[key] = Future()
+                    owned.append(key)
+                else:
+                    waiting[key] = future
+                    self.coalesced += 1
+        return owned, waiting
+    
+    def resolve(self, key: str, value):
+        with self._lock:
+            future = self._calls.pop(key)
+        future.set_result(value)
+    
+    def fail(self, key: str, error: BaseException):
+        with self._lock:
+            future = self._calls.pop(key)
+        future.set_exception(error)
+    
+    def do(self, key: str, func, *args):
+        """Run ``func(*args)`` unless the same key is in flight, in which case share its outcome."""
+        while True:
+            owned, waiting = self.claim([key])
+            if owned:
+                break
+            try:
+                return waiting[key].result()
+            except FlightAbandoned:
+                continue  # Its owner was cancelled; claim the key again
+        try:
+            result = func(*args)
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.resolve(key, result)
+        return result
+    
+    async def do_async(self, key: str, func, *args):
+        """Async ``do``: ``func(*args)`` returns an awaitable; waiting does not block the loop."""
+        while True:
+            owned, waiting = self.claim([key])
+            if owned:
+                break
+            try:
+                # Shielded: cancelling this waiter must not cancel the shared Future
+                return await asyncio.shield(asyncio.wrap_future(waiting[key]))
+            except FlightAbandoned:
+                continue  # Its owner was cancelled; claim the key again
+        try:
+            result = await func(*args)
+        except asyncio.CancelledError:
+            # A cancellation is this caller's, not an outcome to share
+            self.fail(key, FlightAbandoned(key))
+            raise
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.resolve(key, result)
+        return result
+    
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._calls), "coalesced": self.coalesced}
+
+
+def dumps_json(data, pretty: bool = False) -> bytes:
+    """
+    Serialize ``data`` to UTF-8 JSON bytes.
+    
+    Output is compact unless ``pretty`` is set. Uses orjson when it is
+    installed and falls back to the standard library for anything it rejects.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        try:
+            return orjson.dumps(data, option=option)
+        except TypeError:
+            pass
+    if pretty:
+        return json.dumps(data, indent=2).encode()
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus bucket layout."""
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def render(self, name: str, labels: str = "") -> List[str]:
+        """Render ``_bucket``, ``_sum`` and ``_count`` sample lines."""
+        prefix = labels + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class ServerMetrics:
+    """Request, latency and tier counters for the /metrics endpoint."""
+    
+    PREFIX = "intelligent_rag"
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.request_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.classification_latency = Histogram()
+        self.serialization_latency = Histogram()
+        self.tiers: Dict[int, int] = defaultdict(int)
+        self.in_flight = 0
+    
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+    
+    def request_finished(self, endpoint: Optional[str], method: str, status: Optional[int], seconds: float):
+        """Record a finished request; ``status`` is None if no response was sent."""
+        with self._lock:
+            self.in_flight -= 1
+            if endpoint is not None and status is not None:
+                self.requests[(endpoint, method, status)] += 1
+                self.request_latency[endpoint].observe(seconds)
+    
+    def observe_classification(self, seconds: float):
+        with self._lock:
+            self.classification_latency.observe(seconds)
+    
+    def observe_serialization(self, seconds: float):
+        with self._lock:
+            self.serialization_latency.observe(seconds)
+    
+    def count_tiers(self, tiers: List[int]):
+        with self._lock:
+            for tier in tiers:
+                self.tiers[tier] += 1
+    
+    def render(self, cache_stats: Dict, classifier_cache_stats: Optional[Dict] = None) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+        
+        Args:
+            cache_stats: LRUCache.stats() of the server's response cache
+            classifier_cache_stats: LRUCache.stats() of the classifier's own cache, if it has one
+        """
+        p = self.PREFIX
+        lines = []
+        
+        def header(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+        
+        with self._lock:
+            header("requests_total", "counter", "HTTP requests by endpoint, method and status.")
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'{p}_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+            
+            header("request_duration_seconds", "histogram", "Time to handle an HTTP request.")
+            for endpoint, histogram in sorted(self.request_latency.items()):
+                lines.extend(histogram.render(f"{p}_request_duration_seconds", f'endpoint="{endpoint}"'))
+            
+            header("classification_duration_seconds", "histogram",
+                   "Time spent classifying queries that missed the cache, per request.")
+            lines.extend(self.classification_latency.render(f"{p}_classification_duration_seconds"))
+            
+            header("serialization_duration_seconds", "histogram", "Time spent building classify response bodies.")
+            lines.extend(self.serialization_latency.render(f"{p}_serialization_duration_seconds"))
+            
+            header("requests_in_flight", "gauge", "HTTP requests currently being handled.")
+            lines.append(f"{p}_requests_in_flight {self.in_flight}")
+            
+            header("classifications_total", "counter", "Classification results served, by recommended tier.")
+            for tier in sorted(set(TIER_CONFIGS) | set(self.tiers)):
+                lines.append(f'{p}_classifications_total{{tier="{tier}"}} {self.tiers[tier]}')
+        
+        caches = [("cache", "Classification cache", cache_stats)]
+        if classifier_cache_stats is not None:
+            caches.append(("classifier_cache", "Classifier result cache", classifier_cache_stats))
+        for name, description, stats in caches:
+            for counter in ("hits", "misses", "evictions", "expirations"):
+                header(f"{name}_{counter}_total", "counter", f"{description} {counter}.")
+                lines.append(f"{p}_{name}_{counter}_total {stats[counter]}")
+            header(f"{name}_entries", "gauge", f"Entries in the {description.lower()}.")
+            lines.append(f"{p}_{name}_entries {stats['size']}")
+            header(f"{name}_bytes", "gauge", f"Approximate memory used by the {description.lower()}.")
+            lines.append(f"{p}_{name}_bytes {stats['bytes']}")
+            header(f"{name}_hit_ratio", "gauge", "Fraction of cache lookups that hit.")
+            lines.append(f"{p}_{name}_hit_ratio {stats['hit_ratio']}")
+        
+        return "\n".join(lines) + "\n"
+
+
+class DeadlineSocketReader(io.RawIOBase):
+    """
+    Raw reader over a socket that enforces an overall ``deadline``.
+    
+    A socket timeout only bounds each ``recv``, so a client trickling one
+    byte at a time could hold a worker indefinitely. Every read here is
+    limited to the time left before ``deadline`` (a ``time.monotonic()``
+    value) and raises ``socket.timeout`` once it has passed. With no deadline
+    set, reads use the socket's own timeout.
+    """
+    
+    def __init__(self, sock: socket.socket):
+        super().__init__()
+        self.sock = sock
+        self.deadline: Optional[float] = None
+    
+    def readable(self) -> bool:
+        return True
+    
+    # settimeout costs system calls, so it is only shrunk once it is this far off
+    SLACK = 0.01
+    
+    def readinto(self, buffer) -> int:
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("request deadline exceeded")
+            current = self.sock.gettimeout()
+            # None is a blocking socket, which would wait past the deadline
+            if current is None or remaining < current - self.SLACK:
+                self.sock.settimeout(remaining)
+        return self.sock.recv_into(buffer)
+
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """
+    TCP server that handles connections on a bounded pool of worker threads.
+    
+    When every worker is busy the accept loop waits for a free one, so excess
+    connections queue in the kernel listen backlog instead of piling up in
+    memory. With ``reuse_port`` several processes can bind the same port and
+    the kernel spreads connections between them (SO_REUSEPORT).
+    """
+    
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, max_workers: int = 16,
+                 backlog: int = 128, reuse_port: bool = False):
+        self.request_queue_size = backlog
+        self.reuse_port = reuse_port
+        self.max_workers = max_workers
+        self.busy_workers = 0
+        self._busy_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-worker")
+        self._slots = threading.BoundedSemaphore(max_workers)
+        super().__init__(server_address, handler_class)
+    
+    def saturated(self) -> bool:
+        """True when every worker thread is occupied by a connection."""
+        return self.busy_workers >= self.max_workers
+    
+    def server_bind(self):
+        if self.reuse_port:
+            if not hasattr(socket, "SO_REUSEPORT"):
+                raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+    
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        self._executor.submit(self._process_request_worker, request, client_address)
+    
+    def _process_request_worker(self, request, client_address):
+        with self._busy_lock:
+            self.busy_workers += 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._busy_lock:
+                self.busy_workers -= 1
+            self._slots.release()
+    
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
 class IntelligentRAGServer:
     """HTTP server for Intelligent RAG classification service."""
     
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    # Paths reported as their own endpoint label in /metrics; others are "other"
+    ENDPOINTS = ("/health", "/classify", "/classify/batch", "/tiers", "/stats", "/metrics", "/check-response")
+    # Queries longer than this are cached under a digest instead of in full
+    HASH_KEYS_OVER = 256
+    # Streamed batches are classified and written this many queries at a time
+    STREAM_CHUNK = 32
+    
+    def __init__(self, host: str = "localhost", port: int = 8765, max_batch_size: int = 1000,
+                 max_scan_chars: Optional[int] = None,
+                 threads: int = 16, backlog: int = 128, request_timeout: float = 30.0,
+                 idle_timeout: float = 5.0, reuse_port: bool = False,
+                 cache_size: int = 10000, cache_ttl: float = 3600.0, cache_mb: float = 64.0,
+                 access_log: bool = True,
+                 classifier=None, persistent_cache: Optional[SQLiteCache] = None):
         self.host = host
         self.port = port
-        self.classifier = QueryClassifier()
+        self.max_batch_size = max_batch_size
+        self.threads = threads
+        self.backlog = backlog
+        self.request_timeout = request_timeout
+        self.idle_timeout = idle_timeout
+        self.reuse_port = reuse_port
+        self.access_log = access_log
+        # Any classifier with classify_many() and get_system_prompt_addition(),
+        # e.g. intelligent_rag_llm.HybridClassifier; keywords only by default
+        self.classifier = classifier or QueryClassifier(max_scan_chars=max_scan_chars)
+        # Shared on-disk cache the classifier persists LLM results to, reported in /stats
+        self.persistent_cache = persistent_cache
         self.handler = RAGResponseHandler()
+        # Normalized query -> (tier, classification JSON, system prompt addition JSON);
+        # bounded by bytes too, so pasted documents cannot grow it without limit
+        self.cache = LRUCache(
+            max_entries=cache_size,
+            ttl=cache_ttl,
+            max_bytes=int(cache_mb * 1024 * 1024) if cache_mb > 0 else None,
+            hash_keys_over=self.HASH_KEYS_OVER
+        )
+        # Normalized queries being classified right now, shared by concurrent requests
+        self.in_flight = SingleFlight()
+        self.metrics = ServerMetrics()
+        
+        # Static responses are serialized once
+        self.health_body = dumps_json({"status": "healthy", "service": "intelligent-rag"})
+        self.tiers_body = dumps_json({
+            tier_num: {
+                "name": config.name,
+                "query_type": config.query_type.value,
+                "rag_full_context": config.rag_full_context,
+                "top_k": config.top_k,
+                "description": config.description
+            }
+            for tier_num, config in TIER_CONFIGS.items()
+        })
+    
+    @property
+    def llm_classifier(self):
+        """The classifier's LLM client (LLMQueryClassifier), or None for keyword classification."""
+        llm = getattr(self.classifier, "llm_classifier", self.classifier)
+        return llm if hasattr(llm, "telemetry") else None
+    
+    def health(self) -> bytes:
+        """
+        /health body: static for keyword classification, with per-model
+        circuit breaker state when the classifier calls an LLM.
+        """
+        llm = self.llm_classifier
+        if llm is None:
+            return self.health_body
+        return dumps_json({"status": "healthy", "service": "intelligent-rag", "llm": llm.health()})
+    
+    def classifier_cache_stats(self) -> Optional[Dict]:
+        """Stats of the classifier's own result cache (HybridClassifier has one), if any."""
+        # Duck-typed: when run as a script this module is __main__, so the
+        # classifier's LRUCache is a different class object than ours
+        cache = getattr(self.classifier, "cache", None)
+        return cache.stats() if hasattr(cache, "stats") else None
     
-    def start(self):
-        """Start the HTTP server."""
+    def _serialize_classification(self, classification: QueryClassification) -> Tuple[int, bytes, bytes]:
+        """Serialize the cacheable parts of a /classify response."""
+        classification_json = dumps_json({
+            "type": classification.query_type.value,
+            "confidence": classification.confidence,
+            "reasoning": classification.reasoning,
+            "recommended_tier": classification.recommended_tier,
+            "rag_full_context": classification.rag_full_context,
+            "top_k": classification.top_k
+        })
+        prompt_json = dumps_json(self.classifier.get_system_prompt_addition(classification))
+        return classification.recommended_tier, classification_json, prompt_json
+    
+    def classification_bodies(self, queries: List[str], include_prompt: bool = True) -> List[bytes]:
+        """
+        Build /classify response bodies, classifying only queries not in the cache.
+        
+        Queries are cached under their normalized form, so every spelling
+        that normalizes to the same key gets the same answer. The first raw
+        spelling of each key is what gets classified: normalizing collapses
+        newlines, which long-input mode needs to find pasted code. A query
+        another request is already classifying is waited for rather than
+        classified again, so a burst of identical prompts costs one
+        classification.
+        
+        Args:
+            queries: Raw query strings, echoed back in each body
+            include_prompt: Include the tier's system_prompt_addition
+            
+        Returns:
+            One serialized JSON object per query, in input order
+        """
+        keys = [normalize_query(query) for query in queries]
+        parts = {}
+        raw = {}
+        for query, key in zip(queries, keys):
+            if key not in parts:
+                parts[key] = self.cache.get(key)
+                raw[key] = query
+        
+        misses, in_flight = self.in_flight.claim([key for key, cached in parts.items() if cached is None])
+        try:
+            classified = []
+            if misses:
+                started = time.perf_counter()
+                classified = self.classifier.classify_many([raw[key] for key in misses])
+                self.metrics.observe_classification(time.perf_counter() - started)
+            
+            started = time.perf_counter()
+            for key, classification in zip(misses, classified):
+                parts[key] = self._serialize_classification(classification)
+                # A better answer may be on its way; let the classifier's own cache serve it
+                if not getattr(classification, "provisional", False):
+                    self.cache.put(key, parts[key])
+                self.in_flight.resolve(key, parts[key])
+            serialization_time = time.perf_counter() - started
+        except BaseException as e:
+            # Requests waiting on our keys get the same error instead of hanging
+            for key in misses:
+                if parts[key] is None:
+                    self.in_flight.fail(key, e)
+            raise
+        
+        for key, future in in_flight.items():
+            parts[key] = future.result()
+        
+        started = time.perf_counter()
+        bodies = []
+        tiers = []
+        for query, key in zip(queries, keys):
+            tier, classification_json, prompt_json = parts[key]
+            body = b'{"query":' + dumps_json(query) + b',"classification":' + classification_json
+            if include_prompt:
+                body += b',"system_prompt_addition":' + prompt_json
+            bodies.append(body + b"}")
+            tiers.append(tier)
+        self.metrics.observe_serialization(serialization_time + time.perf_counter() - started)
+        self.metrics.count_tiers(tiers)
+        return bodies
+    
+    def streamed_classification_bodies(self, queries: List[str]) -> Iterator[bytes]:
+        """
+        ``classification_bodies`` for a streamed batch: bodies are yielded as
+        each ``STREAM_CHUNK`` queries are classified, so the first rows go out
+        before the rest of the batch is done.
+        """
+        for start in range(0, len(queries), self.STREAM_CHUNK):
+            yield from self.classification_bodies(queries[start:start + self.STREAM_CHUNK])
+    
+    def make_http_server(self) -> PooledHTTPServer:
+        """Bind the HTTP server without serving; call ``serve_forever()`` on the result."""
         
         class RequestHandler(http.server.BaseHTTPRequestHandler):
             server_instance = self
+            # Persistent connections; every response carries Content-Length
+            protocol_version = "HTTP/1.1"
+            # Time a client has to send a whole request, headers and body
+            timeout = self.request_timeout
+            # Headers and body go out as separate writes; don't let Nagle delay the body
+            disable_nagle_algorithm = True
+            
+            def setup(self):
+                super().setup()
+                # Reads go through a deadline-aware reader; see wait_for_request
+                self.rfile.close()
+                self.reader = DeadlineSocketReader(self.connection)
+                self.rfile = io.BufferedReader(self.reader)
+            
+            def handle(self):
+                """Serve requests on this connection until it closes or idles out."""
+                self.close_connection = False
+                while not self.close_connection:
+                    if not self.wait_for_request():
+                        break
+                    self.handle_one_request()
+                    if self.server.saturated():
+                        # Release the worker so queued connections get served
+                        self.close_connection = True
+            
+            def handle_one_request(self):
+                """Handle one request and record it in the server metrics."""
+                metrics = self.server_instance.metrics
+                self.status_code = None
+                started = time.perf_counter()
+                metrics.request_started()
+                try:
+                    super().handle_one_request()
+                finally:
+                    path = urlparse(getattr(self, "path", "")).path
+                    endpoint = path if path in self.server_instance.ENDPOINTS else "other"
+                    metrics.request_finished(endpoint, self.command or "", self.status_code,
+                                             time.perf_counter() - started)
+            
+            def send_response(self, code, message=None):
+                self.status_code = code
+                # The request has been read; writes get the plain socket timeout
+                self.reader.deadline = None
+                self.connection.settimeout(self.timeout)
+                super().send_response(code, message)
+            
+            def wait_for_request(self) -> bool:
+                """
+                Wait up to the idle timeout for the next request to start
+                arriving, then give it ``request_timeout`` seconds in total.
+                """
+                self.reader.deadline = None
+                self.connection.settimeout(self.server_instance.idle_timeout)
+                try:
+                    if not self.rfile.peek(1):
+                        return False
+                except (socket.timeout, ConnectionError):
+                    return False
+                finally:
+                    self.connection.settimeout(self.timeout)
+                # A request_timeout of None leaves requests unbounded
+                self.reader.deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+                return True
             
             def log_message(self, format, *args):
                 # Custom logging
                 print(f"[{datetime.now().isoformat()}] {args[0]}")
             
+            def log_request(self, code='-', size='-'):
+                if self.server_instance.access_log:
+                    super().log_request(code, size)
+            
             def do_GET(self):
                 parsed = urlparse(self.path)
                 path = parsed.path
                 query_params = parse_qs(parsed.query)
                 
                 if path == "/health":
-                    self.send_json({"status": "healthy", "service": "intelligent-rag"})
+                    self.send_bytes(self.server_instance.health())
                 
                 elif path == "/classify":
                     query = query_params.get("q", [""])[0]
@@ -289,30 +1391,31 @@ class IntelligentRAGServer:
                         self.send_error(400, "Missing query parameter 'q'")
                         return
                     
-                    classification = self.server_instance.classifier.classify(query)
-                    self.send_json({
-                        "query": query,
-                        "classification": {
-                            "type": classification.query_type.value,
-                            "confidence": classification.confidence,
-                            "reasoning": classification.reasoning,
-                            "recommended_tier": classification.recommended_tier,
-                            "rag_full_context": classification.rag_full_context,
-                            "top_k": classification.top_k
-                        }
-                    })
+                    body, = self.server_instance.classification_bodies([query], include_prompt=False)
+                    self.send_bytes(body)
+                
+                elif path == "/stats":
+                    server = self.server_instance
+                    stats = {"cache": server.cache.stats(), "in_flight": server.in_flight.stats()}
+                    classifier_cache = server.classifier_cache_stats()
+                    if classifier_cache is not None:
+                        stats["classifier_cache"] = classifier_cache
+                    if server.persistent_cache is not None:
+                        stats["persistent_cache"] = server.persistent_cache.stats()
+                    if server.llm_classifier is not None:
+                        stats["llm"] = server.llm_classifier.telemetry.snapshot()
+                    self.send_json(stats)
+                
+                elif path == "/metrics":
+                    server = self.server_instance
+                    text = server.metrics.render(server.cache.stats(), server.classifier_cache_stats())
+                    if server.llm_classifier is not None:
+                        text += server.llm_classifier.telemetry.render(ServerMetrics.PREFIX)
+                    body = text.encode()
+                    self.send_bytes(body, content_type="text/plain; version=0.0.4; charset=utf-8")
                 
                 elif path == "/tiers":
-                    tiers = {}
-                    for tier_num, config in TIER_CONFIGS.items():
-                        tiers[tier_num] = {
-                            "name": config.name,
-                            "query_type": config.query_type.value,
-                            "rag_full_context": config.rag_full_context,
-                            "top_k": config.top_k,
-                            "description": config.description
-                        }
-                    self.send_json(tiers)
+                    self.send_bytes(self.server_instance.tiers_body)
                 
                 else:
                     self.send_error(404, "Not found")
@@ -322,33 +1425,52 @@ class IntelligentRAGServer:
                 path = parsed.path
                 
                 content_length = int(self.headers.get('Content-Length', 0))
-                body = self.rfile.read(content_length).decode('utf-8')
+                try:
+                    body = self.rfile.read(content_length).decode('utf-8')
+                except socket.timeout:
+                    self.send_error(408, "Request body not received in time")
+                    return
                 
                 try:
                     data = json.loads(body) if body else {}
                 except json.JSONDecodeError:
                     self.send_error(400, "Invalid JSON")
                     return
+                if not isinstance(data, dict):
+                    self.send_error(400, "Request body must be a JSON object")
+                    return
                 
                 if path == "/classify":
                     query = data.get("query", "")
                     if not query:
                         self.send_error(400, "Missing 'query' field")
                         return
+                    if not isinstance(query, str):
+                        self.send_error(400, "'query' must be a non-empty string")
+                        return
+                    
+                    body, = self.server_instance.classification_bodies([query])
+                    self.send_bytes(body)
+                
+                elif path == "/classify/batch":
+                    queries = data.get("queries")
+                    if not isinstance(queries, list) or not queries:
+                        self.send_error(400, "'queries' must be a non-empty list")
+                        return
+                    if len(queries) > self.server_instance.max_batch_size:
+                        self.send_error(413, f"Batch exceeds {self.server_instance.max_batch_size} queries")
+                        return
+                    for i, query in enumerate(queries):
+                        if not isinstance(query, str) or not query:
+                            self.send_error(400, f"Entry {i} in 'queries' must be a non-empty string")
+                            return
                     
-                    classification = self.server_instance.classifier.classify(query)
-                    self.send_json({
-                        "query": query,
-                        "classification": {
-                            "type": classification.query_type.value,
-                            "confidence": classification.confidence,
-                            "reasoning": classification.reasoning,
-                            "recommended_tier": classification.recommended_tier,
-                            "rag_full_context": classification.rag_full_context,
-                            "top_k": classification.top_k
-                        },
-                        "system_prompt_addition": self.server_instance.classifier.get_system_prompt_addition(classification)
-                    })
+                    stream = data.get("stream") or "application/x-ndjson" in self.headers.get("Accept", "")
+                    if stream:
+                        self.send_ndjson(self.server_instance.streamed_classification_bodies(queries))
+                    else:
+                        results = self.server_instance.classification_bodies(queries)
+                        self.send_bytes(b'{"results":[' + b",".join(results) + b"]}")
                 
                 elif path == "/check-response":
                     response = data.get("response", "")
@@ -371,39 +1493,118 @@ class IntelligentRAGServer:
                     self.send_error(404, "Not found")
             
             def send_json(self, data: Dict):
+                self.send_bytes(dumps_json(data))
+            
+            def wants_pretty(self) -> bool:
+                """True if the request asked for indented JSON with ?pretty=1."""
+                query = urlparse(self.path).query
+                return "pretty" in query and parse_qs(query).get("pretty", ["0"])[0].lower() in ("1", "true", "yes")
+            
+            def send_bytes(self, body: bytes, content_type: str = 'application/json'):
+                """Send an already-serialized body."""
+                if content_type == 'application/json' and self.wants_pretty():
+                    body = dumps_json(json.loads(body), pretty=True)
                 self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.end_headers()
-                self.wfile.write(json.dumps(data, indent=2).encode())
+                self.wfile.write(body)
             
-            def send_error(self, code: int, message: str):
+            def send_ndjson(self, rows: Iterable[bytes]):
+                """Stream one serialized JSON document per line, each written as ``rows`` yields it."""
+                # The length is unknown up front: chunk for HTTP/1.1, else close
+                chunked = self.request_version == "HTTP/1.1"
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                if chunked:
+                    self.send_header('Transfer-Encoding', 'chunked')
+                else:
+                    self.send_header('Connection', 'close')
+                    self.close_connection = True
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                for row in rows:
+                    line = row + b"\n"
+                    if chunked:
+                        line = b"%X\r\n%s\r\n" % (len(line), line)
+                    self.wfile.write(line)
+                if chunked:
+                    self.wfile.write(b"0\r\n\r\n")
+            
+            def send_error(self, code: int, message: Optional[str] = None, explain: Optional[str] = None):
+                # Also called by BaseHTTPRequestHandler for malformed requests
+                if message is None:
+                    message = self.responses.get(code, ("Error",))[0]
+                if code >= 500 or code in (408, 414, 431):
+                    # Malformed or unsupported requests may leave unread bytes behind
+                    self.close_connection = True
+                body = dumps_json({"error": message})
                 self.send_response(code)
                 self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
                 self.send_header('Access-Control-Allow-Origin', '*')
+                if self.close_connection:
+                    self.send_header('Connection', 'close')
                 self.end_headers()
-                self.wfile.write(json.dumps({"error": message}).encode())
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
             
             def do_OPTIONS(self):
                 self.send_response(200)
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
                 self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+                self.send_header('Content-Length', '0')
                 self.end_headers()
         
-        with socketserver.TCPServer((self.host, self.port), RequestHandler) as httpd:
-            print(f"🚀 Intelligent RAG Server running at http://{self.host}:{self.port}")
+        return PooledHTTPServer((self.host, self.port), RequestHandler, max_workers=self.threads,
+                                backlog=self.backlog, reuse_port=self.reuse_port)
+    
+    def start(self, processes: int = 1):
+        """
+        Start the HTTP server.
+        
+        Args:
+            processes: Number of server processes sharing the port. Values
+                above 1 bind with SO_REUSEPORT and fork extra workers.
+        
+        Raises:
+            RuntimeError: if processes > 1 where fork is unavailable (Windows)
+        """
+        if processes > 1:
+            # Forked explicitly: spawn and forkserver, the defaults on macOS and
+            # from Python 3.14, would have to pickle the server and its locks
+            if "fork" not in multiprocessing.get_all_start_methods():
+                raise RuntimeError("Multiple server processes need the fork start method, "
+                                   "which this platform does not support")
+            context = multiprocessing.get_context("fork")
+            self.reuse_port = True
+            for _ in range(processes - 1):
+                context.Process(target=self.start, daemon=True).start()
+            # Exit through the normal shutdown path so daemon workers are reaped
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        
+        with self.make_http_server() as httpd:
+            print(f"🚀 Intelligent RAG Server running at http://{self.host}:{self.port} "
+                  f"(pid {os.getpid()}, {self.threads} threads)")
             print("   Endpoints:")
             print(f"   - GET  /health")
             print(f"   - GET  /classify?q=<query>")
             print(f"   - GET  /tiers")
+            print(f"   - GET  /stats")
+            print(f"   - GET  /metrics (Prometheus)")
             print(f"   - POST /classify (JSON body: {{\"query\": \"...\"}})")
+            print(f"   - POST /classify/batch (JSON body: {{\"queries\": [\"...\"], \"stream\": false}})")
             print(f"   - POST /check-response (JSON body: {{\"response\": \"...\", \"rag_config\": {{...}}}})")
             print("\n   Press Ctrl+C to stop")
             try:
                 httpd.serve_forever()
             except KeyboardInterrupt:
                 print("\n👋 Server stopped")
+            finally:
+                if hasattr(self.classifier, "close"):
+                    self.classifier.close()
 
 
 def print_classification(classification: QueryClassification, query: str):
@@ -477,6 +1678,12 @@ Examples:
     # Start server
     python intelligent_rag.py server --port 8765
     
+    # Benchmark and save a baseline
+    python intelligent_rag.py bench --save bench-baseline.json
+    
+    # Train the local classifier tier from logged LLM classifications
+    python intelligent_rag.py distill --labels default --output default
+    
     # Check response for full context request
     python intelligent_rag.py --check-response "[REQUEST_FULL_CONTEXT] Need more docs"
         """
@@ -497,6 +1704,85 @@ Examples:
                               help='Host to bind to (default: localhost)')
     server_parser.add_argument('--port', '-p', type=int, default=8765,
                               help='Port to listen on (default: 8765)')
+    server_parser.add_argument('--threads', type=int, default=16,
+                              help='Worker threads per process (default: 16)')
+    server_parser.add_argument('--backlog', type=int, default=128,
+                              help='Listen backlog for pending connections (default: 128)')
+    server_parser.add_argument('--request-timeout', type=float, default=30.0,
+                              help='Seconds to wait for a client to send a request (default: 30)')
+    server_parser.add_argument('--idle-timeout', type=float, default=5.0,
+                              help='Seconds an idle keep-alive connection stays open (default: 5)')
+    server_parser.add_argument('--max-scan-chars', type=int, default=QueryClassifier.MAX_SCAN_CHARS,
+                              help='Longer queries are classified from head/tail windows with code '
+                                   f'removed; 0 scans everything (default: {QueryClassifier.MAX_SCAN_CHARS})')
+    server_parser.add_argument('--cache-size', type=int, default=10000,
+                              help='Classification results to cache, 0 to disable (default: 10000)')
+    server_parser.add_argument('--cache-ttl', type=float, default=3600.0,
+                              help='Seconds a cached classification stays valid (default: 3600)')
+    server_parser.add_argument('--cache-mb', type=float, default=64.0,
+                              help='Approximate memory the classification cache may use, '
+                                   '0 for no limit (default: 64)')
+    server_parser.add_argument('--classifier', choices=['keyword', 'hybrid'], default='keyword',
+                              help='keyword, or hybrid to ask an LLM about low-confidence queries '
+                                   '(needs intelligent_rag_llm.py and OPENROUTER_API_KEY; default: keyword)')
+    server_parser.add_argument('--cache-db', metavar='PATH',
+                              help='Persist LLM classifications in this SQLite file, shared by all '
+                                   'processes; "default" uses the user data dir (hybrid only)')
+    server_parser.add_argument('--cache-db-ttl', type=float, default=30 * 86400,
+                              help='Seconds a persisted classification stays valid (default: 30 days)')
+    server_parser.add_argument('--cache-db-size', type=int, default=100000,
+                              help='Persisted classifications to keep (default: 100000)')
+    server_parser.add_argument('--no-access-log', dest='access_log', action='store_false',
+                              help='Do not print a log line per request')
+    server_parser.add_argument('--processes', type=int, default=1,
+                              help='Server processes sharing the port via SO_REUSEPORT (default: 1)')
+    server_parser.add_argument('--reuse-port', action='store_true',
+                              help='Bind with SO_REUSEPORT so separately started servers can share the port')
+    
+    # Benchmark command
+    bench_parser = subparsers.add_parser('bench', help='Benchmark classifier throughput and latency')
+    bench_parser.add_argument('--size', type=int, default=2000,
+                             help='Number of queries in the generated corpus (default: 2000)')
+    bench_parser.add_argument('--seed', type=int, default=7,
+                             help='Corpus random seed (default: 7)')
+    bench_parser.add_argument('--long-min-kb', type=int, default=2,
+                             help='Smallest pasted stack trace in KB (default: 2)')
+    bench_parser.add_argument('--long-max-kb', type=int, default=40,
+                             help='Largest pasted stack trace in KB (default: 40)')
+    bench_parser.add_argument('--concurrency', type=int, default=4,
+                             help='Concurrent HTTP connections (default: 4)')
+    bench_parser.add_argument('--batch-size', type=int, default=100,
+                             help='Queries per /classify/batch request (default: 100)')
+    bench_parser.add_argument('--skip-http', action='store_true',
+                             help='Skip the HTTP server benchmarks')
+    bench_parser.add_argument('--skip-hybrid', action='store_true',
+                             help='Skip the HybridClassifier benchmark')
+    bench_parser.add_argument('--save', metavar='PATH',
+                             help='Write results as a JSON baseline')
+    bench_parser.add_argument('--compare', metavar='PATH',
+                             help='Compare against a saved JSON baseline')
+    bench_parser.add_argument('--max-regression', type=float, metavar='PCT',
+                             help='With --compare, exit 1 if throughput drops or p95 rises by more than PCT%%')
+    
+    # Distill command
+    distill_parser = subparsers.add_parser('distill', help='Train a local classifier from logged LLM classifications')
+    distill_parser.add_argument('--labels', default='default', metavar='PATH',
+                               help='Label log written by the LLM classifier (LLM_LABEL_LOG); '
+                                    '"default" uses the user data dir (default: default)')
+    distill_parser.add_argument('--output', default='default', metavar='PATH',
+                               help='Where to write the model, for DISTILLED_MODEL (default: default)')
+    distill_parser.add_argument('--epochs', type=int, default=10,
+                               help='Training passes over the labels (default: 10)')
+    distill_parser.add_argument('--bits', type=int, default=18,
+                               help='Hash features into 2^BITS buckets (default: 18)')
+    distill_parser.add_argument('--holdout', type=float, default=0.1,
+                               help='Share of labels held out to report accuracy (default: 0.1)')
+    distill_parser.add_argument('--confidence', type=float, default=0.9,
+                               help='Threshold to report coverage at; match DISTILLED_CONFIDENCE (default: 0.9)')
+    distill_parser.add_argument('--min-examples', type=int, default=100,
+                               help='Refuse to train on fewer labelled queries (default: 100)')
+    distill_parser.add_argument('--seed', type=int, default=0,
+                               help='Shuffle seed (default: 0)')
     
     args = parser.parse_args()
     
@@ -521,9 +1807,54 @@ Examples:
     elif args.interactive:
         interactive_mode(classifier)
     
+    elif args.command == 'bench':
+        try:
+            from intelligent_rag_bench import run_bench
+        except ImportError:
+            print(f"❌ bench needs intelligent_rag_bench.py next to {os.path.abspath(__file__)}")
+            sys.exit(1)
+        sys.exit(run_bench(args))
+    
+    elif args.command == 'distill':
+        try:
+            from intelligent_rag_distill import run_distill
+        except ImportError:
+            print(f"❌ distill needs intelligent_rag_distill.py next to {os.path.abspath(__file__)}")
+            sys.exit(1)
+        sys.exit(run_distill(args))
+    
     elif args.command == 'server':
-        server = IntelligentRAGServer(args.host, args.port)
-        server.start()
+        logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                            format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+        persistent_cache = None
+        server_classifier = None
+        if args.processes > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            parser.error("--processes needs the fork start method, which this platform does not support")
+        if args.cache_db:
+            if args.classifier != 'hybrid':
+                parser.error("--cache-db needs --classifier hybrid; keyword results are cheaper to recompute")
+            persistent_cache = SQLiteCache(None if args.cache_db == 'default' else args.cache_db,
+                                           ttl=args.cache_db_ttl, max_entries=args.cache_db_size)
+        if args.classifier == 'hybrid':
+            from intelligent_rag_llm import HybridClassifier
+            server_classifier = HybridClassifier(persistent_cache=persistent_cache,
+                                                 max_scan_chars=args.max_scan_chars)
+        server = IntelligentRAGServer(
+            args.host, args.port,
+            max_scan_chars=args.max_scan_chars,
+            threads=args.threads,
+            backlog=args.backlog,
+            request_timeout=args.request_timeout,
+            idle_timeout=args.idle_timeout,
+            reuse_port=args.reuse_port,
+            cache_size=args.cache_size,
+            cache_ttl=args.cache_ttl,
+            cache_mb=args.cache_mb,
+            access_log=args.access_log,
+            classifier=server_classifier,
+            persistent_cache=persistent_cache
+        )
+        server.start(processes=args.processes)
     
     else:
         # Default to interactive mode if no args
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Intelligent RAG Classifier Benchmarks
+
+Measures classification throughput and latency for the keyword classifier,
+the hybrid classifier and the HTTP server, using a generated corpus of
+short lookups, analysis questions, creative prompts and long pasted stack
+traces. Results can be saved as a JSON baseline and compared on later runs.
+
+Usage:
+    python intelligent_rag.py bench
+    python intelligent_rag.py bench --size 5000 --save bench-baseline.json
+    python intelligent_rag.py bench --compare bench-baseline.json --max-regression 10
+"""
+
+import http.client
+import json
+import os
+import platform
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from intelligent_rag import IntelligentRAGServer, QueryClassifier
+
+
+# Share of each query kind in the generated corpus
+CORPUS_MIX = {
+    "lookup": 0.55,
+    "analysis": 0.2,
+    "creative": 0.15,
+    "stack_trace": 0.1,
+}
+
+_SUBJECTS = [
+    "auth", "billing", "user", "session", "search", "upload", "webhook",
+    "notification", "tenant", "invoice", "report", "audit log", "gateway",
+]
+_SERVICES = [
+    "the orchestrator", "the dashboard", "the CLI", "the evidence vault",
+    "the intent store", "Qdrant", "Leantime", "Open WebUI", "n8n",
+]
+_LOOKUP_TEMPLATES = [
+    "What's the {subject} endpoint?",
+    "How do I configure the {subject} service?",
+    "Where is the {subject} timeout setting?",
+    "What is the function signature for create_{slug}?",
+    "Why is the {subject} API returning 500?",
+    "How can I run the {subject} tests locally?",
+    "what version of the {subject} package do we use",
+    "Show me an example of calling the {subject} route",
+]
+_ANALYSIS_TEMPLATES = [
+    "Review the {subject} architecture",
+    "How does {service} connect to {other}?",
+    "Give me an overview of the {subject} data flow and security model",
+    "Assess the scalability of {service} under heavy {subject} load",
+    "What is the relationship between {service} and {other}?",
+]
+_CREATIVE_TEMPLATES = [
+    "Create a diagram of how {service} talks to {other}",
+    "Generate a report on the {subject} integration",
+    "Design a system for {subject} retries across {service}",
+    "Draw the architecture of {service}",
+    "Build a presentation about the {subject} workflow",
+    "Write the complete documentation for {service}",
+]
+_EXCEPTIONS = [
+    ("ConnectionRefusedError", "[Errno 111] Connection refused"),
+    ("KeyError", "'tenant_id'"),
+    ("TimeoutError", "timed out after 30s"),
+    ("ValueError", "invalid literal for int() with base 10: 'abc'"),
+]
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    subject = rng.choice(_SUBJECTS)
+    service, other = rng.sample(_SERVICES, 2)
+    return template.format(subject=subject, slug=subject.replace(" ", "_"), service=service, other=other)
+
+
+def _stack_trace(rng: random.Random, min_kb: int, max_kb: int) -> str:
+    """A question followed by a pasted traceback of roughly min_kb..max_kb kilobytes."""
+    target = rng.randint(min_kb * 1024, max_kb * 1024)
+    subject = rng.choice(_SUBJECTS)
+    lines = [f"Why does the {subject} job fail with this error?", "```", "Traceback (most recent call last):"]
+    size = sum(len(line) + 1 for line in lines)
+    while size < target:
+        module = rng.choice(_SUBJECTS).replace(" ", "_")
+        frame = (f'  File "/app/services/{module}/handlers.py", line {rng.randint(1, 900)}, '
+                 f'in handle_{module}\n    result = self.client.request(payload, retries={rng.randint(0, 5)})')
+        lines.append(frame)
+        size += len(frame) + 1
+    exc, message = rng.choice(_EXCEPTIONS)
+    lines.extend([f"{exc}: {message}", "```"])
+    return "\n".join(lines)
+
+
+def generate_corpus(size: int = 2000, seed: int = 7, long_kb: Tuple[int, int] = (2, 40)) -> List[Tuple[str, str]]:
+    """
+    Generate a reproducible benchmark corpus.
+
+    Args:
+        size: Number of queries
+        seed: Random seed, so runs with the same arguments are comparable
+        long_kb: Size range of pasted stack traces in kilobytes
+
+    Returns:
+        List of (kind, query) tuples, with kinds mixed per CORPUS_MIX
+    """
+    rng = random.Random(seed)
+    kinds = list(CORPUS_MIX)
+    weights = [CORPUS_MIX[kind] for kind in kinds]
+    corpus = []
+    for _ in range(size):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "lookup":
+            query = _fill(rng.choice(_LOOKUP_TEMPLATES), rng)
+        elif kind == "analysis":
+            query = _fill(rng.choice(_ANALYSIS_TEMPLATES), rng)
+        elif kind == "creative":
+            query = _fill(rng.choice(_CREATIVE_TEMPLATES), rng)
+        else:
+            query = _stack_trace(rng, *long_kb)
+        corpus.append((kind, query))
+    return corpus
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: List[float], elapsed: float, items: Optional[int] = None) -> Dict:
+    """
+    Summarize per-call latencies (seconds) into throughput and percentiles.
+
+    ``items`` is the number of classifications done, when a call covers more than one.
+    """
+    ordered = sorted(latencies)
+    count = items if items is not None else len(latencies)
+    return {
+        "count": count,
+        "classifications_per_sec": count / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(ordered, 50) * 1000,
+        "p95_ms": _percentile(ordered, 95) * 1000,
+        "p99_ms": _percentile(ordered, 99) * 1000,
+        "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+def time_calls(func: Callable[[str], object], queries: List[str], warmup: int = 50) -> Dict:
+    """Time ``func`` once per query, after a short warm-up."""
+    for query in queries[:warmup]:
+        func(query)
+    latencies = []
+    started = time.perf_counter()
+    for query in queries:
+        call_started = time.perf_counter()
+        func(query)
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def bench_in_process(corpus: List[Tuple[str, str]], include_hybrid: bool = True) -> Dict[str, Dict]:
+    """Benchmark QueryClassifier (overall and per query kind) and HybridClassifier."""
+    results = {}
+    queries = [query for _, query in corpus]
+
+    classifier = QueryClassifier()
+    results["keyword"] = time_calls(classifier.classify, queries)
+    for kind in CORPUS_MIX:
+        subset = [query for k, query in corpus if k == kind]
+        if subset:
+            results[f"keyword/{kind}"] = time_calls(classifier.classify, subset, warmup=0)
+
+    if include_hybrid:
+        try:
+            from intelligent_rag_llm import HybridClassifier
+        except ImportError as e:
+            print(f"   Skipping hybrid benchmark: {e}")
+        else:
+            # A persistent cache from CLASSIFIER_CACHE_DB is left out: its rows
+            # would make the numbers depend on earlier runs
+            cache_db = os.environ.pop("CLASSIFIER_CACHE_DB", None)
+            try:
+                hybrid = HybridClassifier()
+            finally:
+                if cache_db is not None:
+                    os.environ["CLASSIFIER_CACHE_DB"] = cache_db
+            # Never spend money on LLM calls while benchmarking
+            hybrid.llm_classifier.use_llm = False
+            try:
+                # Each query once, so the hybrid's own cache never answers
+                results["hybrid"] = time_calls(hybrid.classify, list(dict.fromkeys(queries)), warmup=0)
+            finally:
+                hybrid.close()
+
+    return results
+
+
+def _http_worker(port: int, requests: List[Tuple[str, str, Optional[bytes]]], latencies: List[float]):
+    """Send requests over one keep-alive connection, recording each latency."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        for method, path, body in requests:
+            started = time.perf_counter()
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - started)
+            if response.status != 200:
+                raise RuntimeError(f"{method} {path} returned {response.status}")
+    finally:
+        conn.close()
+
+
+def _run_http(port: int, requests: List[Tuple[str, str, Optional[bytes]]], concurrency: int) -> Tuple[List[float], float]:
+    shards = [requests[i::concurrency] for i in range(concurrency)]
+    latencies: List[List[float]] = [[] for _ in shards]
+    threads = [
+        threading.Thread(target=_http_worker, args=(port, shard, shard_latencies))
+        for shard, shard_latencies in zip(shards, latencies)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return [latency for shard in latencies for latency in shard], elapsed
+
+
+def bench_http(corpus: List[Tuple[str, str]], concurrency: int = 4, batch_size: int = 100,
+               cache_size: int = 0) -> Dict[str, Dict]:
+    """
+    Benchmark a locally started IntelligentRAGServer over keep-alive connections.
+
+    The server's result cache is disabled by default so every request is classified.
+    """
+    server = IntelligentRAGServer("127.0.0.1", 0, threads=max(concurrency, 1) * 2,
+                                  cache_size=cache_size, access_log=False)
+    httpd = server.make_http_server()
+    port = httpd.server_address[1]
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    queries = [query for _, query in corpus]
+    results = {}
+    try:
+        _run_http(port, [("GET", "/health", None)] * concurrency, concurrency)
+
+        single = [("POST", "/classify", json.dumps({"query": query}).encode()) for query in queries]
+        latencies, elapsed = _run_http(port, single, concurrency)
+        results["http/classify"] = summarize(latencies, elapsed)
+
+        batches = [
+            ("POST", "/classify/batch", json.dumps({"queries": queries[i:i + batch_size]}).encode())
+            for i in range(0, len(queries), batch_size)
+        ]
+        latencies, elapsed = _run_http(port, batches, concurrency)
+        results["http/batch"] = summarize(latencies, elapsed, items=len(queries))
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], max_regression: Optional[float] = None) -> bool:
+    """
+    Print throughput and p95 changes against a baseline.
+
+    Returns:
+        False if any benchmark regressed by more than ``max_regression`` percent
+    """
+    ok = True
+    print(f"\n{'Benchmark':<24} {'ops/s':>12} {'Δ ops/s':>9} {'p95 ms':>10} {'Δ p95':>9}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            print(f"{name:<24} {current['classifications_per_sec']:>12.1f} {'new':>9}")
+            continue
+        ops_change = _pct_change(previous["classifications_per_sec"], current["classifications_per_sec"])
+        p95_change = _pct_change(previous["p95_ms"], current["p95_ms"])
+        flag = ""
+        if max_regression is not None and (ops_change < -max_regression or p95_change > max_regression):
+            flag = "  ❌ regression"
+            ok = False
+        print(f"{name:<24} {current['classifications_per_sec']:>12.1f} {ops_change:>+8.1f}% "
+              f"{current['p95_ms']:>10.3f} {p95_change:>+8.1f}%{flag}")
+    return ok
+
+
+def _pct_change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def print_results(results: Dict[str, Dict]):
+    print(f"\n{'Benchmark':<24} {'count':>7} {'ops/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<24} {r['count']:>7} {r['classifications_per_sec']:>12.1f} "
+              f"{r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f}")
+
+
+def run_bench(args) -> int:
+    """Entry point for ``intelligent_rag.py bench``; returns the process exit code."""
+    long_kb = (args.long_min_kb, args.long_max_kb)
+    corpus = generate_corpus(args.size, args.seed, long_kb)
+    print(f"📏 Benchmarking {len(corpus)} queries (seed {args.seed})")
+
+    results = bench_in_process(corpus, include_hybrid=not args.skip_hybrid)
+    if not args.skip_http:
+        results.update(bench_http(corpus, concurrency=args.concurrency, batch_size=args.batch_size))
+    print_results(results)
+
+    report = {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {"size": args.size, "seed": args.seed, "long_kb": list(long_kb), "mix": CORPUS_MIX},
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("corpus", {}).get("size") != args.size or baseline.get("corpus", {}).get("seed") != args.seed:
+            print("⚠️  Baseline was recorded with a different corpus; numbers may not be comparable")
+        if not compare(results, baseline.get("results", {}), args.max_regression):
+            return 1
+    return 0
+
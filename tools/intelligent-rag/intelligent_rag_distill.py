@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Distilled Intelligent RAG Classifier
+
+Learns the LLM classifier's tier decisions so most queries can be answered
+locally. LLMQueryClassifier appends every fresh LLM answer to a label log;
+``intelligent_rag.py distill`` trains a logistic regression over hashed word
+and character n-grams from that log, and HybridClassifier consults the
+trained model before asking the LLM, escalating only when it is unsure.
+
+Environment Variables:
+    LLM_LABEL_LOG - JSON lines file LLM answers are appended to, or "default"
+                    for the user's data dir (default: disabled)
+    DISTILLED_MODEL - Trained model HybridClassifier loads, or "default" (default: disabled)
+    DISTILLED_CONFIDENCE - Probability at which the distilled model's answer is
+                           used instead of asking the LLM (default: 0.9)
+
+Usage:
+    python intelligent_rag.py distill --labels default --output default
+"""
+
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from intelligent_rag import QueryClassification, TIER_CONFIGS, default_cache_path, normalize_query
+
+logger = logging.getLogger("intelligent_rag.distill")
+
+
+def label_log_path(path: str) -> Path:
+    """``path``, or the label log in the user's data dir for "default"."""
+    return default_cache_path().with_name("labels.jsonl") if path == "default" else Path(path)
+
+
+def distilled_model_path(path: str) -> Path:
+    """``path``, or the distilled model in the user's data dir for "default"."""
+    return default_cache_path().with_name("distilled.json") if path == "default" else Path(path)
+
+
+class LabelLog:
+    """
+    Append-only JSON lines log of (query, tier, confidence) from the LLM.
+
+    Lines are written with one ``write`` call on a file opened for appending,
+    so processes sharing the log do not interleave partial lines.
+    """
+
+    def __init__(self, path: str):
+        self.path = label_log_path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def add(self, query: str, classification: QueryClassification):
+        line = json.dumps({
+            "query": query,
+            "tier": classification.recommended_tier,
+            "confidence": classification.confidence,
+            "created": time.time()
+        }, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.written += 1
+
+    def read(self) -> List[Tuple[str, int, float]]:
+        """
+        Labelled examples, the latest label winning for repeated queries.
+
+        Returns:
+            List of (query, tier, confidence)
+        """
+        examples: Dict[str, Tuple[str, int, float]] = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    tier = int(record["tier"])
+                    query = record["query"]
+                except (ValueError, KeyError, TypeError):
+                    continue  # A torn line from a crash mid-write
+                if tier in TIER_CONFIGS and isinstance(query, str):
+                    examples[normalize_query(query)] = (query, tier, float(record.get("confidence", 1.0)))
+        return list(examples.values())
+
+
+def label_log_from_env() -> Optional[LabelLog]:
+    """Open the label log configured by LLM_LABEL_LOG, if any."""
+    path = os.getenv("LLM_LABEL_LOG", "")
+    return LabelLog(path) if path else None
+
+
+class DistilledClassifier:
+    """
+    Multinomial logistic regression over hashed n-gram features.
+
+    Features are words, word pairs and character trigrams of each word,
+    hashed into ``dim`` buckets with CRC32 (stable across processes, unlike
+    ``hash``) and scaled to unit length. Only buckets with weights are stored,
+    so prediction touches a few dozen numbers per tier.
+    """
+
+    VERSION = 1
+    TOKEN = re.compile(r"[a-z0-9_]+")
+    # Pasted material past this adds features but no signal
+    MAX_TOKENS = 200
+
+    def __init__(self, dim: int = 1 << 18, weights: Optional[Dict[int, List[float]]] = None,
+                 metadata: Optional[Dict] = None):
+        self.dim = dim
+        self.tiers = sorted(TIER_CONFIGS)
+        # feature bucket -> weight per tier; bucket -1 is the bias
+        self.weights: Dict[int, List[float]] = weights if weights is not None else {}
+        self.metadata = metadata or {}
+
+    def features(self, text: str) -> Dict[int, float]:
+        tokens = self.TOKEN.findall(text.lower())[:self.MAX_TOKENS]
+        grams = [f"w:{token}" for token in tokens]
+        grams += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for token in tokens:
+            padded = f"<{token}>"
+            grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        counts: Dict[int, float] = defaultdict(float)
+        for gram in grams:
+            counts[zlib.crc32(gram.encode()) % self.dim] += 1.0
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        features = {bucket: value / norm for bucket, value in counts.items()}
+        features[-1] = 1.0
+        return features
+
+    def _probabilities(self, features: Dict[int, float]) -> List[float]:
+        scores = [0.0] * len(self.tiers)
+        for bucket, value in features.items():
+            weights = self.weights.get(bucket)
+            if weights is not None:
+                for k, weight in enumerate(weights):
+                    scores[k] += weight * value
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict(self, text: str) -> Tuple[int, float]:
+        """
+        Returns:
+            Tuple of (most likely tier, its probability)
+        """
+        probabilities = self._probabilities(self.features(text))
+        best = max(range(len(self.tiers)), key=probabilities.__getitem__)
+        return self.tiers[best], probabilities[best]
+
+    def classify(self, text: str) -> QueryClassification:
+        tier, probability = self.predict(text)
+        config = TIER_CONFIGS[tier]
+        return QueryClassification(
+            query_type=config.query_type,
+            confidence=probability,
+            reasoning=f"[Distilled] Tier {tier} at p={probability:.2f}, "
+                      f"learned from {self.metadata.get('examples', 0)} LLM classifications",
+            recommended_tier=tier,
+            rag_full_context=config.rag_full_context,
+            top_k=config.top_k
+        )
+
+    def fit(self, examples: Iterable[Tuple[str, int, float]], epochs: int = 10,
+            learning_rate: float = 0.5, l2: float = 1e-5, seed: int = 0) -> "DistilledClassifier":
+        """
+        Train with stochastic gradient descent; each example is weighted by the
+        LLM's confidence in its label.
+        """
+        data = [(self.features(query), self.tiers.index(tier), weight) for query, tier, weight in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch)
+            for features, label, weight in data:
+                probabilities = self._probabilities(features)
+                for bucket, value in features.items():
+                    weights = self.weights.setdefault(bucket, [0.0] * len(self.tiers))
+                    for k in range(len(self.tiers)):
+                        gradient = (probabilities[k] - (1.0 if k == label else 0.0)) * value * weight
+                        weights[k] -= rate * (gradient + l2 * weights[k])
+        return self
+
+    def evaluate(self, examples: List[Tuple[str, int, float]], threshold: float) -> Dict:
+        """Accuracy overall, and coverage and accuracy of answers at or above ``threshold``."""
+        correct = confident = confident_correct = 0
+        for query, tier, _ in examples:
+            predicted, probability = self.predict(query)
+            correct += predicted == tier
+            if probability >= threshold:
+                confident += 1
+                confident_correct += predicted == tier
+        total = len(examples)
+        return {
+            "examples": total,
+            "accuracy": correct / total if total else None,
+            "threshold": threshold,
+            "coverage": confident / total if total else None,
+            "confident_accuracy": confident_correct / confident if confident else None
+        }
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        model = {
+            "version": self.VERSION,
+            "dim": self.dim,
+            "tiers": self.tiers,
+            "metadata": self.metadata,
+            "weights": {str(bucket): [round(w, 6) for w in weights]
+                        for bucket, weights in self.weights.items() if any(abs(w) >= 1e-6 for w in weights)}
+        }
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        temporary.write_text(json.dumps(model, separators=(",", ":")))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "DistilledClassifier":
+        """
+        Raises:
+            ValueError: if the file is not a model this version can read
+        """
+        model = json.loads(Path(path).read_text())
+        if model.get("version") != cls.VERSION or model.get("tiers") != sorted(TIER_CONFIGS):
+            raise ValueError(f"{path} is not a version {cls.VERSION} distilled model for these tiers")
+        weights = {int(bucket): weights for bucket, weights in model["weights"].items()}
+        return cls(dim=model["dim"], weights=weights, metadata=model.get("metadata"))
+
+
+def distilled_from_env() -> Optional[DistilledClassifier]:
+    """Load the model named by DISTILLED_MODEL, if set and readable."""
+    path = os.getenv("DISTILLED_MODEL", "")
+    if not path:
+        return None
+    try:
+        return DistilledClassifier.load(distilled_model_path(path))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Not using distilled model %s: %s", path, e)
+        return None
+
+
+def run_distill(args) -> int:
+    """Entry point for ``intelligent_rag.py distill``; returns the process exit code."""
+    log = LabelLog(args.labels)
+    if not log.path.exists():
+        print(f"❌ No label log at {log.path}; set LLM_LABEL_LOG on the classifier to collect one")
+        return 1
+    examples = log.read()
+    tiers = {tier for _, tier, _ in examples}
+    if len(examples) < args.min_examples or len(tiers) < 2:
+        print(f"❌ {len(examples)} labelled queries over {len(tiers)} tier(s); "
+              f"need at least {args.min_examples} over two tiers")
+        return 1
+
+    rng = random.Random(args.seed)
+    rng.shuffle(examples)
+    held_out = int(len(examples) * args.holdout)
+    test, train = examples[:held_out], examples[held_out:]
+    print(f"📚 Training on {len(train)} LLM classifications, holding out {len(test)}")
+
+    started = time.perf_counter()
+    model = DistilledClassifier(dim=1 << args.bits).fit(train, epochs=args.epochs, seed=args.seed)
+    print(f"   Trained in {time.perf_counter() - started:.1f}s")
+    if test:
+        report = model.evaluate(test, args.confidence)
+        print(f"   Held-out accuracy: {report['accuracy']:.1%}")
+        print(f"   At p >= {args.confidence}: {report['coverage']:.1%} answered locally, "
+              + (f"{report['confident_accuracy']:.1%} of them correct"
+                 if report['confident_accuracy'] is not None else "none confident"))
+
+    model.metadata = {"examples": len(train), "trained": datetime.now().isoformat(), "source": str(log.path)}
+    output = distilled_model_path(args.output)
+    model.save(output)
+    print(f"💾 Model written to {output}; set DISTILLED_MODEL={args.output} for the hybrid classifier")
+    return 0
@@ -9,21 +9,795 @@ Environment Variables:
     OPENROUTER_API_KEY - Your OpenRouter API key
     CLASSIFIER_MODEL - Model to use (default: google/gemini-flash-1.5)
     USE_LLM_CLASSIFIER - Enable LLM classification (default: true)
+    LLM_TIMEOUT - Seconds to wait for each model (default: 5)
+    LLM_POOL_SIZE - Keep-alive connections kept open to OpenRouter (default: 10)
+    LLM_HEDGE - Race backup models instead of trying them in turn (default: false)
+    LLM_HEDGE_DELAY - Seconds before firing the next backup model (default: 1.5)
+    LLM_DEADLINE - Hard limit in seconds for a hedged classification (default: 8)
+    CLASSIFIER_CACHE_DB - SQLite file for persistent LLM classifications, or
+                          "default" for the user's data dir (default: disabled)
+    CLASSIFIER_CACHE_TTL - Seconds a persisted classification stays valid (default: 30 days)
+    CLASSIFIER_CACHE_SIZE - Persisted classifications to keep (default: 100000)
+    HYBRID_CACHE_SIZE - Classifications HybridClassifier keeps in memory (default: 10000)
+    HYBRID_CACHE_MB - Memory limit of that cache, keys included; 0 for none (default: 16)
+    HYBRID_LATENCY_BUDGET_MS - Speculative mode: wait at most this long for the LLM,
+                               then answer with keywords (default: off)
+    NEAR_DUPLICATE_THRESHOLD - Token similarity (0-1) at which an earlier LLM
+                               classification is reused; 0 disables (default: 0.8)
+    NEAR_DUPLICATE_SIZE - LLM classifications kept for near-duplicate lookup (default: 10000)
+    LLM_BREAKER_WINDOW - Recent calls per model the circuit breaker looks at (default: 20)
+    LLM_BREAKER_FAILURE_RATE - Share of failed calls that opens a model's breaker (default: 0.5)
+    LLM_BREAKER_COOLDOWN - Seconds an open breaker skips its model before a probe (default: 30)
+    LLM_BREAKER_SLOW_SECONDS - Calls slower than this count as failures (default: off)
+    LLM_MAX_CONCURRENCY - Async API: classifications in flight per event loop (default: 100)
+    LLM_BATCH_SIZE - Classify up to this many concurrent queries in one call; 1 disables (default: 1)
+    LLM_BATCH_WINDOW_MS - How long a batch waits for more queries (default: 20)
+    LLM_PROMPT_MODE - "json" for full answers with reasoning, "compact" for a
+                      tier digit and confidence letter only (default: json)
+    LLM_ROUTING - "static" tries models in declared order, "adaptive" fastest
+                  expected first (default: static)
+    LLM_ROUTER_ALPHA - Weight of the newest call in the router's averages (default: 0.2)
+    LLM_ROUTER_EXPLORATION - Share of calls that try another model first (default: 0.05)
+    LLM_ROUTER_STATE - JSON file the router's estimates persist to, or "default"
+                       for the user's data dir (default: not persisted)
+    LLM_LABEL_LOG, DISTILLED_MODEL, DISTILLED_CONFIDENCE - Local distilled
+                       classifier tier; see intelligent_rag_distill.py
+    LOG_RATE_LIMIT - Log lines with the same message let through per minute (default: 10)
 """
 
 import os
 import json
+import asyncio
+import hashlib
+import logging
+import math
+import random
+import re
+import threading
+import time
+import weakref
+import zlib
 import requests
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from collections import OrderedDict, defaultdict, deque
+from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, replace
 from enum import Enum
 
-from intelligent_rag import QueryClassifier, QueryType, QueryClassification, TIER_CONFIGS
+try:
+    import aiohttp  # Optional: non-blocking HTTP for the async classification API
+except ImportError:
+    aiohttp = None
+
+from intelligent_rag import (
+    Histogram, LRUCache, QueryClassifier, QueryType, QueryClassification, SingleFlight, SQLiteCache,
+    TIER_CONFIGS, default_cache_path, normalize_query
+)
+
+if TYPE_CHECKING:
+    from intelligent_rag_distill import DistilledClassifier, LabelLog
+
+
+def label_log_from_env() -> Optional["LabelLog"]:
+    """The label log named by LLM_LABEL_LOG; intelligent_rag_distill is only needed when one is set."""
+    if not os.getenv("LLM_LABEL_LOG"):
+        return None
+    from intelligent_rag_distill import label_log_from_env as open_label_log
+    return open_label_log()
+
+
+def distilled_from_env() -> Optional["DistilledClassifier"]:
+    """The model named by DISTILLED_MODEL; intelligent_rag_distill is only needed when one is set."""
+    if not os.getenv("DISTILLED_MODEL"):
+        return None
+    from intelligent_rag_distill import distilled_from_env as load_distilled
+    return load_distilled()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most ``burst`` records with the same level and message template
+    through per ``interval`` seconds, so a failing upstream cannot flood the
+    log with one line per query. The first record let through afterwards
+    says how many were dropped.
+    """
+    
+    def __init__(self, burst: int = 10, interval: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        # (level, template) -> [window start, records let through, records dropped]
+        self._windows: Dict[Tuple[int, str], List] = {}
+        self._lock = threading.Lock()
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if window is not None and window[2]:
+                    record.msg = f"{record.msg} ({window[2]} similar messages suppressed)"
+                window = self._windows[key] = [now, 0, 0]
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+            return True
+
+
+logger = logging.getLogger("intelligent_rag.llm")
+logger.addFilter(RateLimitFilter(burst=int(os.getenv("LOG_RATE_LIMIT", "10"))))
+
+
+# LLM calls take far longer than keyword classification
+LLM_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0, 30.0)
+
+
+class LLMTelemetry:
+    """
+    Per-model call, failure, timeout and token counters with latency histograms.
+    
+    ``classify`` latency is end to end for classifications that reached the
+    models, including fallbacks and hedging. Exported by the server on
+    /metrics (``render``) and /stats (``snapshot``).
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.models: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            "calls": 0, "failures": 0, "timeouts": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "estimated_cost_usd": 0.0,
+            "repaired_responses": 0, "rejected_responses": 0
+        })
+        self.call_latency: Dict[str, Histogram] = defaultdict(lambda: Histogram(LLM_LATENCY_BUCKETS))
+        self.classify_latency = Histogram(LLM_LATENCY_BUCKETS)
+        # How classify_with_llm answered: llm, cached, near_duplicate or failed;
+        # distilled counts queries HybridClassifier's distilled model kept from it
+        self.outcomes: Dict[str, int] = defaultdict(int)
+        # Speculative hybrid classifications answered by keywords because the LLM was late
+        self.budget_exceeded = 0
+    
+    def record_call(self, model: str, seconds: float, error: Optional[BaseException] = None):
+        """Record one request to ``model``; ``error`` is what it raised, if anything."""
+        with self._lock:
+            counters = self.models[model]
+            counters["calls"] += 1
+            if error is not None:
+                counters["failures"] += 1
+                if isinstance(error, (requests.Timeout, TimeoutError, asyncio.TimeoutError)):
+                    counters["timeouts"] += 1
+            self.call_latency[model].observe(seconds)
+    
+    def record_usage(self, model: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        with self._lock:
+            counters = self.models[model]
+            counters["prompt_tokens"] += prompt_tokens
+            counters["completion_tokens"] += completion_tokens
+            counters["estimated_cost_usd"] += cost
+    
+    def record_response(self, model: str, repaired: bool = False, rejected: bool = False):
+        """Count an answer from ``model`` that needed JSON repair, or could not be salvaged."""
+        with self._lock:
+            counters = self.models[model]
+            if rejected:
+                counters["rejected_responses"] += 1
+            elif repaired:
+                counters["repaired_responses"] += 1
+    
+    def record_classification(self, outcome: str, seconds: Optional[float] = None):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if seconds is not None:
+                self.classify_latency.observe(seconds)
+    
+    def record_budget_exceeded(self):
+        with self._lock:
+            self.budget_exceeded += 1
+    
+    def snapshot(self) -> Dict:
+        """JSON-friendly totals, with average latency and cost per call for each model."""
+        with self._lock:
+            models = {}
+            for model, counters in self.models.items():
+                latency = self.call_latency[model]
+                calls = counters["calls"]
+                models[model] = {
+                    **counters,
+                    "error_rate": counters["failures"] / calls if calls else 0.0,
+                    "avg_latency_ms": latency.sum / latency.count * 1000 if latency.count else None,
+                    "cost_per_call_usd": counters["estimated_cost_usd"] / calls if calls else 0.0
+                }
+            classify = self.classify_latency
+            return {
+                "models": models,
+                "classifications": dict(self.outcomes),
+                "budget_exceeded": self.budget_exceeded,
+                "avg_classify_latency_ms": classify.sum / classify.count * 1000 if classify.count else None
+            }
+    
+    def render(self, prefix: str) -> str:
+        """Render in the Prometheus text exposition format, metric names under ``prefix``."""
+        p = f"{prefix}_llm"
+        lines = []
+        
+        def header(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+        
+        with self._lock:
+            for name, key, help_text in (
+                ("calls_total", "calls", "Requests sent to each model."),
+                ("failures_total", "failures", "Requests that failed, timeouts included."),
+                ("timeouts_total", "timeouts", "Requests that timed out."),
+                ("prompt_tokens_total", "prompt_tokens", "Prompt tokens billed."),
+                ("completion_tokens_total", "completion_tokens", "Completion tokens billed."),
+                ("estimated_cost_usd_total", "estimated_cost_usd", "Estimated spend in US dollars."),
+                ("repaired_responses_total", "repaired_responses", "Malformed answers salvaged by JSON repair."),
+                ("rejected_responses_total", "rejected_responses", "Answers that could not be parsed even after repair."),
+            ):
+                header(name, "counter", help_text)
+                for model, counters in sorted(self.models.items()):
+                    lines.append(f'{p}_{name}{{model="{model}"}} {counters[key]}')
+            
+            header("call_duration_seconds", "histogram", "Time for one request to a model.")
+            for model, histogram in sorted(self.call_latency.items()):
+                lines.extend(histogram.render(f"{p}_call_duration_seconds", f'model="{model}"'))
+            
+            header("classify_duration_seconds", "histogram",
+                   "Time to classify a query with the LLM, including fallbacks.")
+            lines.extend(self.classify_latency.render(f"{p}_classify_duration_seconds"))
+            
+            header("classifications_total", "counter", "LLM classifications by how they were answered.")
+            for outcome, count in sorted(self.outcomes.items()):
+                lines.append(f'{p}_classifications_total{{outcome="{outcome}"}} {count}')
+            
+            header("budget_exceeded_total", "counter",
+                   "Speculative classifications answered by keywords because the LLM missed the latency budget.")
+            lines.append(f"{p}_budget_exceeded_total {self.budget_exceeded}")
+        
+        return "\n".join(lines) + "\n"
+
+
+def persistent_cache_from_env() -> Optional[SQLiteCache]:
+    """Open the SQLite classification cache configured by CLASSIFIER_CACHE_DB, if any."""
+    path = os.getenv("CLASSIFIER_CACHE_DB", "")
+    if not path:
+        return None
+    return SQLiteCache(
+        None if path == "default" else path,
+        ttl=float(os.getenv("CLASSIFIER_CACHE_TTL", str(30 * 86400))),
+        max_entries=int(os.getenv("CLASSIFIER_CACHE_SIZE", "100000"))
+    )
+
+
+_CODE_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_FIRST_INT = re.compile(r"-?\d+(?:\.\d+)?")
+# Tier of each query type, for answers that name a type but no tier
+_TIERS_BY_TYPE = {config.query_type.value: tier for tier, config in TIER_CONFIGS.items()}
+
+
+def parse_llm_json(content: str) -> Tuple[object, bool]:
+    """
+    Parse a model's JSON answer, salvaging the usual near misses: code fences,
+    prose around the object and trailing commas.
+    
+    Returns:
+        Tuple of (parsed value, whether it needed repair)
+    
+    Raises:
+        ValueError: if no JSON object can be recovered
+    """
+    try:
+        return json.loads(content), False
+    except (TypeError, ValueError):
+        pass
+    if not isinstance(content, str):
+        raise ValueError(f"answer is {type(content).__name__}, not text")
+    
+    fenced = _CODE_FENCE.search(content)
+    candidates = [fenced.group(1)] if fenced else []
+    candidates.append(content)
+    decoder = json.JSONDecoder()
+    for text in candidates:
+        for attempt in (text, _TRAILING_COMMA.sub(r"\1", text)):
+            start = attempt.find("{")
+            while start != -1:
+                try:
+                    return decoder.raw_decode(attempt, start)[0], True
+                except ValueError:
+                    start = attempt.find("{", start + 1)
+    raise ValueError("no JSON object in answer")
+
+
+def repair_classification(result: Dict) -> Tuple[Dict, bool]:
+    """
+    Coerce one parsed classification to the expected types: the tier to an int
+    clamped to the known tiers, confidence to a finite float in [0, 1] and the
+    full-context flag to a bool. A missing tier is taken from a recognisable
+    type, or defaults to 1. The type is the repaired tier's, so an answer can
+    never pair one tier with another tier's type.
+    
+    Returns:
+        Tuple of (cleaned result, whether anything had to change)
+    
+    Raises:
+        ValueError: if the answer is not an object or its tier is not a number
+    """
+    if not isinstance(result, dict):
+        raise ValueError(f"answer is a {type(result).__name__}, not an object")
+    cleaned = dict(result)
+    
+    tier = result.get("tier")
+    if tier is None:
+        # Without a tier, a recognisable type still says which tier was meant
+        tier = _TIERS_BY_TYPE.get(re.sub(r"[\s-]+", "_", str(result.get("type", "")).strip().lower()), 1)
+    if not isinstance(tier, int) or isinstance(tier, bool):
+        number = _FIRST_INT.search(str(tier)) if not isinstance(tier, bool) else None
+        if number is None:
+            raise ValueError(f"tier {tier!r} is not a number")
+        tier = round(float(number.group()))
+    cleaned["tier"] = min(max(tier, min(TIER_CONFIGS)), max(TIER_CONFIGS))
+    
+    confidence = result.get("confidence", 0.8)
+    if not isinstance(confidence, (int, float)):
+        try:
+            confidence = float(str(confidence).strip().rstrip("%"))
+        except ValueError:
+            confidence = 0.8
+    if not math.isfinite(confidence):
+        confidence = 0.8  # NaN and Infinity parse as JSON but order against nothing
+    if 1 < confidence <= 100:
+        confidence /= 100  # A percentage
+    cleaned["confidence"] = min(max(float(confidence), 0.0), 1.0)
+    
+    # A missing, unknown or contradicting type is replaced, and counts as a repair
+    cleaned["type"] = TIER_CONFIGS[cleaned["tier"]].query_type.value
+    
+    full_context = result.get("suggests_full_context", False)
+    if isinstance(full_context, str):
+        full_context = full_context.strip().lower() in ("true", "yes", "1")
+    cleaned["suggests_full_context"] = bool(full_context)
+    
+    repaired = result.get("tier") is None or cleaned["type"] != result.get("type") or any(
+        cleaned[field] != result.get(field, cleaned[field])
+        for field in ("tier", "confidence", "suggests_full_context"))
+    return cleaned, repaired
+
+
+def router_from_env(models: List[str]) -> Optional["ModelRouter"]:
+    """Build the adaptive ModelRouter when LLM_ROUTING is "adaptive"."""
+    if os.getenv("LLM_ROUTING", "static").lower() != "adaptive":
+        return None
+    state_path = os.getenv("LLM_ROUTER_STATE", "")
+    if state_path == "default":
+        state_path = str(default_cache_path().with_name("router.json"))
+    return ModelRouter(
+        models,
+        alpha=float(os.getenv("LLM_ROUTER_ALPHA", "0.2")),
+        exploration=float(os.getenv("LLM_ROUTER_EXPLORATION", "0.05")),
+        state_path=state_path or None
+    )
+
+
+class NearDuplicateIndex:
+    """
+    Finds earlier classifications of near-duplicate queries.
+    
+    Queries are reduced to sets of content tokens, with punctuation and
+    filler words dropped, so "What's the auth endpoint?" and "what is the auth
+    endpoint" share one entry. MinHash signatures split into bands find
+    candidate matches without scanning every entry; a candidate is only reused
+    when the Jaccard similarity of the token sets reaches ``threshold``.
+    """
+    
+    NUM_HASHES = 16
+    BAND_ROWS = 2
+    # Too few tokens to judge similarity; too many means a pasted log, not a paraphrase
+    MIN_TOKENS = 2
+    MAX_TOKENS = 64
+    STOPWORDS = frozenset({
+        "a", "an", "the", "is", "are", "was", "were", "be", "what", "s", "do", "does",
+        "did", "i", "me", "my", "we", "our", "you", "your", "please", "can", "could",
+        "would", "to", "of", "for", "in", "on", "at", "it", "this", "that",
+    })
+    TOKEN = re.compile(r"[a-z0-9_]+")
+    _PRIME = (1 << 61) - 1
+    
+    def __init__(self, threshold: float = 0.8, max_entries: int = 10000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        rng = random.Random(0)
+        self._hashes = [(rng.randrange(1, self._PRIME), rng.randrange(self._PRIME))
+                        for _ in range(self.NUM_HASHES)]
+        # token set -> (classification, band keys)
+        self._entries: "OrderedDict[frozenset, Tuple[QueryClassification, List[Tuple]]]" = OrderedDict()
+        self._bands: Dict[Tuple, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def tokens(self, query: str) -> Optional[frozenset]:
+        """Content tokens of ``query``, or None if it is too short or long to match on."""
+        tokens = frozenset(t for t in self.TOKEN.findall(query.lower()) if t not in self.STOPWORDS)
+        if not self.MIN_TOKENS <= len(tokens) <= self.MAX_TOKENS:
+            return None
+        return tokens
+    
+    def _band_keys(self, tokens: frozenset) -> List[Tuple]:
+        bases = [zlib.crc32(token.encode()) for token in tokens]
+        signature = [min((a * base + b) % self._PRIME for base in bases) for a, b in self._hashes]
+        return [(band, tuple(signature[band:band + self.BAND_ROWS]))
+                for band in range(0, self.NUM_HASHES, self.BAND_ROWS)]
+    
+    def get(self, query: str) -> Optional[QueryClassification]:
+        """Return the classification of the most similar earlier query at or above the threshold."""
+        tokens = self.tokens(query)
+        if tokens is None:
+            return None
+        with self._lock:
+            best, best_similarity = None, self.threshold
+            if tokens in self._entries:
+                best = tokens
+            else:
+                candidates = set()
+                for key in self._band_keys(tokens):
+                    candidates |= self._bands.get(key, set())
+                for candidate in candidates:
+                    similarity = len(tokens & candidate) / len(tokens | candidate)
+                    if similarity >= best_similarity:
+                        best, best_similarity = candidate, similarity
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best][0]
+    
+    def add(self, query: str, classification: QueryClassification):
+        """Remember a classification, evicting the least recently used entries."""
+        tokens = self.tokens(query)
+        if tokens is None or self.max_entries <= 0:
+            return
+        band_keys = self._band_keys(tokens)
+        with self._lock:
+            if tokens not in self._entries:
+                for key in band_keys:
+                    self._bands.setdefault(key, set()).add(tokens)
+            self._entries[tokens] = (classification, band_keys)
+            self._entries.move_to_end(tokens)
+            while len(self._entries) > self.max_entries:
+                evicted, (_, evicted_keys) = self._entries.popitem(last=False)
+                for key in evicted_keys:
+                    bucket = self._bands[key]
+                    bucket.discard(evicted)
+                    if not bucket:
+                        del self._bands[key]
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker for one upstream model.
+    
+    - closed: calls go through and the last ``window`` outcomes are kept. Once
+      ``min_calls`` are recorded and ``failure_rate`` of them failed (or took
+      at least ``slow_call_seconds``), the breaker opens.
+    - open: calls are skipped until ``cooldown`` seconds have passed.
+    - half_open: a single probe call goes through; success closes the breaker,
+      failure opens it for another cooldown.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, window: int = 20, min_calls: int = 5, failure_rate: float = 0.5,
+                 cooldown: float = 30.0, slow_call_seconds: Optional[float] = None):
+        self.min_calls = min(min_calls, window)
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.slow_call_seconds = slow_call_seconds
+        self.state = self.CLOSED
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        # (failed, latency in seconds) of recent calls
+        self._outcomes: deque = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """Whether a call may be made now; in half_open this claims the probe."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+            return True
+    
+    def record(self, success: bool, latency: float, error: Optional[str] = None):
+        """Record the outcome of a call that allow() let through."""
+        failed = not success or (self.slow_call_seconds is not None and latency >= self.slow_call_seconds)
+        with self._lock:
+            if error:
+                self.last_error = error
+            self._outcomes.append((failed, latency))
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+            elif self.state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for f, _ in self._outcomes if f)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+    
+    def cancel(self):
+        """Give back a claimed half_open probe whose call was cancelled before finishing."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+    
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+    
+    def snapshot(self) -> Dict:
+        """State, rolling error rate and latency, for health reporting."""
+        with self._lock:
+            calls = len(self._outcomes)
+            latencies = sorted(latency for _, latency in self._outcomes)
+            snapshot = {
+                "state": self.state,
+                "recent_calls": calls,
+                "error_rate": sum(1 for f, _ in self._outcomes if f) / calls if calls else 0.0,
+                "avg_latency_ms": round(sum(latencies) / calls * 1000, 1) if calls else None,
+                "max_latency_ms": round(latencies[-1] * 1000, 1) if calls else None,
+                "rejected": self.rejected,
+                "last_error": self.last_error
+            }
+            if self.state == self.OPEN:
+                snapshot["retry_in_seconds"] = round(max(self.cooldown - (time.monotonic() - self._opened_at), 0), 1)
+            return snapshot
+
+
+class ModelRouter:
+    """
+    Orders models by expected time to a valid answer.
+    
+    Each model keeps an exponentially weighted average of its call latency and
+    of its success rate; a model is expected to take ``latency / success_rate``
+    to produce a usable answer. Models without samples keep their declared
+    order behind the measured ones. With probability ``exploration`` a random
+    other model is tried first, so a model that has become faster is noticed.
+    Estimates are saved to ``state_path`` (at most every SAVE_INTERVAL seconds
+    and on ``save()``) and loaded from it at start-up.
+    """
+    
+    SAVE_INTERVAL = 30.0
+    # Keeps a model that failed every recent call rankable rather than infinite
+    MIN_SUCCESS_RATE = 0.02
+    
+    def __init__(self, models: List[str], alpha: float = 0.2, exploration: float = 0.05,
+                 state_path: Optional[str] = None):
+        self.models = list(dict.fromkeys(models))
+        self.alpha = alpha
+        self.exploration = exploration
+        self.state_path = Path(state_path) if state_path else None
+        self.explored = 0
+        # model -> {"latency": EWMA seconds or None, "success_rate": EWMA, "calls": count}
+        self._estimates: Dict[str, Dict] = {
+            model: {"latency": None, "success_rate": 1.0, "calls": 0} for model in self.models
+        }
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._saved_at = time.monotonic()
+        self._dirty = False
+        self._load()
+    
+    def expected_seconds(self, model: str) -> Optional[float]:
+        estimate = self._estimates[model]
+        if estimate["latency"] is None:
+            return None
+        return estimate["latency"] / max(estimate["success_rate"], self.MIN_SUCCESS_RATE)
+    
+    def _ranked(self) -> List[str]:
+        def rank(model: str) -> Tuple:
+            expected = self.expected_seconds(model)
+            return (expected is None, expected or 0.0, self.models.index(model))
+        return sorted(self.models, key=rank)
+    
+    def order(self) -> List[str]:
+        """Models to try, fastest expected first."""
+        with self._lock:
+            models = self._ranked()
+            if len(models) > 1 and self._random.random() < self.exploration:
+                models.insert(0, models.pop(self._random.randrange(1, len(models))))
+                self.explored += 1
+        return models
+    
+    def record(self, model: str, seconds: float, success: bool):
+        """Fold one finished call into the model's estimates."""
+        with self._lock:
+            estimate = self._estimates.get(model)
+            if estimate is None:
+                return
+            if estimate["latency"] is None:
+                estimate["latency"] = seconds
+            else:
+                estimate["latency"] += self.alpha * (seconds - estimate["latency"])
+            estimate["success_rate"] += self.alpha * ((1.0 if success else 0.0) - estimate["success_rate"])
+            estimate["calls"] += 1
+            self._dirty = True
+            due = self.state_path is not None and time.monotonic() - self._saved_at >= self.SAVE_INTERVAL
+        if due:
+            self.save()
+    
+    def _load(self):
+        if self.state_path is None or not self.state_path.exists():
+            return
+        try:
+            saved = json.loads(self.state_path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable router state %s: %s", self.state_path, e)
+            return
+        for model, estimate in saved.get("models", {}).items():
+            if model in self._estimates and isinstance(estimate, dict):
+                self._estimates[model].update(
+                    (key, estimate[key]) for key in ("latency", "success_rate", "calls") if key in estimate
+                )
+    
+    def save(self):
+        """Write the estimates to ``state_path``, if set and changed since the last save."""
+        if self.state_path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {"saved_at": time.time(), "models": {m: dict(e) for m, e in self._estimates.items()}}
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            # Written aside and renamed, so a crash or another process never sees half a file
+            temporary = self.state_path.with_name(f"{self.state_path.name}.{os.getpid()}.tmp")
+            temporary.write_text(json.dumps(state, indent=2))
+            os.replace(temporary, self.state_path)
+        except OSError as e:
+            logger.warning("Could not save router state to %s: %s", self.state_path, e)
+    
+    def snapshot(self) -> Dict:
+        """Current order and per-model estimates, for health reporting."""
+        with self._lock:
+            models = {}
+            for model, estimate in self._estimates.items():
+                expected = self.expected_seconds(model)
+                models[model] = {
+                    "expected_ms": round(expected * 1000, 1) if expected is not None else None,
+                    "latency_ms": round(estimate["latency"] * 1000, 1) if estimate["latency"] is not None else None,
+                    "success_rate": round(estimate["success_rate"], 3),
+                    "calls": estimate["calls"]
+                }
+            return {"order": self._ranked(), "explored": self.explored, "models": models}
+
+
+class MicroBatcher:
+    """
+    Groups queries arriving at about the same time into one batched call.
+    
+    The first query opens a batch. It is sent when ``max_size`` queries have
+    joined or ``window`` seconds after it opened, whichever comes first, on a
+    short-lived thread of its own. Callers get a Future for their result.
+    
+    ``send_batch`` may answer some queries with a Future of their own (e.g. a
+    retry still running); each caller is resolved as its own answer arrives.
+    """
+    
+    def __init__(self, send_batch: Callable[[List[str]], List[Optional[QueryClassification]]],
+                 max_size: int = 8, window: float = 0.02):
+        self.send_batch = send_batch
+        self.max_size = max_size
+        self.window = window
+        self.batches = 0
+        self.queries = 0
+        self._pending: List[Tuple[str, Future]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+    
+    def submit(self, query: str) -> Future:
+        future = Future()
+        with self._lock:
+            self._pending.append((query, future))
+            if len(self._pending) >= self.max_size:
+                batch = self._take()
+            else:
+                batch = None
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch:
+            threading.Thread(target=self._run, args=(batch,), daemon=True).start()
+        return future
+    
+    def _take(self) -> List[Tuple[str, Future]]:
+        """Detach the pending batch; call with the lock held."""
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.batches += 1 if batch else 0
+        self.queries += len(batch)
+        return batch
+    
+    def _flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._run(batch)
+    
+    def _run(self, batch: List[Tuple[str, Future]]):
+        # Callers that gave up before the batch went out are left out of it; the
+        # rest can no longer be cancelled, so resolving them below cannot fail
+        batch = [(query, future) for query, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self.send_batch([query for query, _ in batch])
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Future):
+                result.add_done_callback(lambda done, future=future: self._forward(done, future))
+            else:
+                future.set_result(result)
+    
+    @staticmethod
+    def _forward(done: Future, future: Future):
+        if done.cancelled():
+            future.set_exception(CancelledError())
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
 
 
 class LLMQueryClassifier(QueryClassifier):
     """Enhanced classifier that uses LLM for accurate query classification."""
     
+    API_URL = "https://openrouter.ai/api/v1/chat/completions"
+    
     # Cheap, fast models good for classification
     DEFAULT_MODEL = "x-ai/grok-4.1-fast"
     FALLBACK_MODELS = [
@@ -69,17 +843,203 @@ Respond in this exact JSON format:
 
 Be decisive. Most queries are Tier 1. Only choose Tier 3 for explicit creation/generation requests."""
 
-    def __init__(self):
-        super().__init__()
+    # Same instructions as CLASSIFICATION_PROMPT, for several queries at once.
+    # response_format json_object needs an object, so the array is wrapped.
+    BATCH_PROMPT = CLASSIFICATION_PROMPT.split("User Query:")[0] + """User Queries (JSON array; classify each one on its own):
+{queries}
+
+Respond in this exact JSON format, with one result per query in the same order:
+{{
+    "results": [
+        {{
+            "id": 0,
+            "tier": 1|2|3,
+            "type": "specific_lookup"|"comprehensive_analysis"|"creative_synthesis",
+            "confidence": 0.0-1.0,
+            "reasoning": "brief explanation of why this tier was chosen",
+            "suggests_full_context": true|false
+        }}
+    ]
+}}
+
+Be decisive. Most queries are Tier 1. Only choose Tier 3 for explicit creation/generation requests."""
+
+    # Compact mode: a few prompt tokens and two answer tokens. Reasoning is
+    # filled in locally by the keyword classifier.
+    COMPACT_PROMPT = """Classify a query to a RAG system.
+1: specific lookup (facts, code, APIs, config, debugging) - most queries
+2: comprehensive analysis (architecture, how parts connect, reviews, audits)
+3: creative synthesis (create diagrams, docs or proposals from the whole knowledge base)
+Query: "{query}"
+Answer only the tier digit and your confidence h, m or l, like 1h."""
+
+    COMPACT_BATCH_PROMPT = COMPACT_PROMPT.split("Query:")[0] + """Queries (JSON array):
+{queries}
+Answer one line per query, in order, each only the tier digit and your confidence h, m or l, like 1h."""
+
+    COMPACT_ANSWER = re.compile(r"(?<![0-9])([1-3])(?![0-9])\s*([hml])?", re.IGNORECASE)
+    COMPACT_CONFIDENCE = {"h": 0.9, "m": 0.7, "l": 0.5}
+
+    def __init__(self, persistent_cache: Optional[SQLiteCache] = None, max_scan_chars: Optional[int] = None):
+        # Also bounds what the LLM is sent and what the label log keeps
+        super().__init__(max_scan_chars=max_scan_chars)
+        self.persistent_cache = persistent_cache if persistent_cache is not None else persistent_cache_from_env()
+        near_duplicate_threshold = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+        self.near_duplicates = NearDuplicateIndex(
+            threshold=near_duplicate_threshold,
+            max_entries=int(os.getenv("NEAR_DUPLICATE_SIZE", "10000"))
+        ) if near_duplicate_threshold > 0 else None
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         self.model = os.getenv("CLASSIFIER_MODEL", self.DEFAULT_MODEL)
         self.use_llm = os.getenv("USE_LLM_CLASSIFIER", "true").lower() == "true"
         self.llm_timeout = int(os.getenv("LLM_TIMEOUT", "5"))
+        self.pool_size = int(os.getenv("LLM_POOL_SIZE", "10"))
+        self.hedge = os.getenv("LLM_HEDGE", "false").lower() == "true"
+        self.hedge_delay = float(os.getenv("LLM_HEDGE_DELAY", "1.5"))
+        self.llm_deadline = float(os.getenv("LLM_DEADLINE", "8"))
+        self.compact = os.getenv("LLM_PROMPT_MODE", "json").lower() == "compact"
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        slow_call_seconds = os.getenv("LLM_BREAKER_SLOW_SECONDS")
+        self.breaker_config = {
+            "window": int(os.getenv("LLM_BREAKER_WINDOW", "20")),
+            "failure_rate": float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5")),
+            "cooldown": float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+            "slow_call_seconds": float(slow_call_seconds) if slow_call_seconds else None
+        }
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        # Async API: a concurrency limiter and aiohttp session per event loop
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "100"))
+        self._loop_state: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        batch_size = int(os.getenv("LLM_BATCH_SIZE", "1"))
+        self.batcher = MicroBatcher(
+            self._classify_batch,
+            max_size=batch_size,
+            window=float(os.getenv("LLM_BATCH_WINDOW_MS", "20")) / 1000
+        ) if batch_size > 1 else None
         self.cost_tracking = {
             "total_calls": 0,
             "total_tokens": 0,
             "estimated_cost_usd": 0.0
         }
+        self._cost_lock = threading.Lock()
+        self.telemetry = LLMTelemetry()
+        self.router = router_from_env([self.model] + self.FALLBACK_MODELS)
+        # Fresh LLM answers, kept as training data for the distilled classifier
+        self.label_log = label_log_from_env()
+        # One connection pool shared by every thread and every model in the
+        # fallback chain, so calls reuse warm TLS connections to OpenRouter.
+        # urllib3's pool is thread-safe; Session objects are kept per thread.
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self._local = threading.local()
+        self._headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://github.com/thalamus-ai/sophia-code",
+            "X-Title": "Intelligent RAG Classifier"
+        }
+    
+    @property
+    def session(self) -> requests.Session:
+        """This thread's session, backed by the shared keep-alive connection pool."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            session.headers.update(self._headers)
+            self._local.session = session
+        return session
+    
+    def close(self):
+        """Close pooled connections to OpenRouter."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.router is not None:
+            self.router.save()
+        self._adapter.close()
+    
+    async def aclose(self):
+        """
+        Close the running event loop's aiohttp session, if the async API opened one.
+        
+        Sessions belong to the loop that opened them and are not closed when it
+        shuts down, so call this (or use ``async with classifier:``) before the
+        loop ends. The classifier stays usable and opens a new session on next use.
+        """
+        with self._breakers_lock:
+            state = self._loop_state.pop(asyncio.get_running_loop(), None)
+        if state is not None and state[1] is not None:
+            await state[1].close()
+    
+    async def __aenter__(self) -> "LLMQueryClassifier":
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+    
+    def _async_state(self) -> Tuple[asyncio.Semaphore, Optional["aiohttp.ClientSession"]]:
+        """This event loop's concurrency limiter and aiohttp session, created on first use."""
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.get(loop)
+        if state is None:
+            session = None
+            if aiohttp is not None:
+                session = aiohttp.ClientSession(
+                    headers=self._headers,
+                    connector=aiohttp.TCPConnector(limit=self.max_concurrency)
+                )
+            state = (asyncio.Semaphore(self.max_concurrency), session)
+            with self._breakers_lock:
+                self._loop_state[loop] = state
+        return state
+    
+    def breaker(self, model: str) -> CircuitBreaker:
+        """The circuit breaker for ``model``, created on first use."""
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            with self._breakers_lock:
+                breaker = self.breakers.setdefault(model, CircuitBreaker(**self.breaker_config))
+        return breaker
+    
+    def health(self) -> Dict:
+        """
+        Circuit breaker state of every model in the chain.
+        
+        Status is "ok" when the primary model is usable, "degraded" when only
+        fallbacks are, and "unavailable" when every breaker is open (queries
+        then fall back to keyword classification).
+        """
+        models = {model: self.breaker(model).snapshot() for model in [self.model] + self.FALLBACK_MODELS}
+        usable = [model for model, snapshot in models.items() if snapshot["state"] != CircuitBreaker.OPEN]
+        if not self.api_key or not self.use_llm:
+            status = "disabled"
+        elif self.model in usable:
+            status = "ok"
+        else:
+            status = "degraded" if usable else "unavailable"
+        health = {"status": status, "models": models}
+        if self.router is not None:
+            health["routing"] = self.router.snapshot()
+        return health
+    
+    @property
+    def prompt_version(self) -> str:
+        """Fingerprint of the prompt, part of the persistent cache key."""
+        prompt = self.COMPACT_PROMPT if self.compact else self.CLASSIFICATION_PROMPT
+        return hashlib.sha1(prompt.encode()).hexdigest()[:12]
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Worker threads for hedged calls (and async calls without aiohttp), started on first use."""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=max(self.pool_size, 1), thread_name_prefix="llm-hedge"
+                    )
+        return self._executor
     
     def classify_with_llm(self, query: str) -> Optional[QueryClassification]:
         """
@@ -90,52 +1050,479 @@ Be decisive. Most queries are Tier 1. Only choose Tier 3 for explicit creation/g
         if not self.api_key or not self.use_llm:
             return None
         
-        models_to_try = [self.model] + self.FALLBACK_MODELS
+        cached = self._cached(query)
+        if cached is not None:
+            return cached
+        
+        started = time.monotonic()
+        result = self._classify_uncached(query)
+        self.telemetry.record_classification("llm" if result else "failed", time.monotonic() - started)
+        self._remember(query, result)
+        return result
+    
+    async def classify_with_llm_async(self, query: str) -> Optional[QueryClassification]:
+        """
+        Non-blocking classify_with_llm for asyncio callers.
+        
+        At most ``max_concurrency`` classifications per event loop wait on
+        OpenRouter at once; the rest queue. Cancelling the calling task cancels
+        its requests. Without aiohttp installed, calls run in worker threads.
+        
+        Returns None if LLM classification fails.
+        """
+        if not self.api_key or not self.use_llm:
+            return None
+        
+        cached = self._cached(query)
+        if cached is not None:
+            return cached
+        
+        limiter, _ = self._async_state()
+        async with limiter:
+            started = time.monotonic()
+            result = await self._classify_uncached_async(query)
+        self.telemetry.record_classification("llm" if result else "failed", time.monotonic() - started)
+        self._remember(query, result)
+        return result
+    
+    def _cached(self, query: str) -> Optional[QueryClassification]:
+        """An earlier LLM answer for this query, from disk or for a near-duplicate."""
+        if self.persistent_cache is not None:
+            cached = self.persistent_cache.get(query, self.model, self.prompt_version)
+            if cached is not None:
+                if self.near_duplicates is not None:
+                    self.near_duplicates.add(query, cached)
+                self.telemetry.record_classification("cached")
+                return cached
+        
+        # A paraphrase of a query the LLM already classified gets the same answer
+        if self.near_duplicates is not None:
+            similar = self.near_duplicates.get(query)
+            if similar is not None:
+                self.telemetry.record_classification("near_duplicate")
+            return similar
+        return None
+    
+    def _remember(self, query: str, result: Optional[QueryClassification]):
+        if result:
+            # Kept per classifier, under the primary model, whichever model in the chain answered
+            if self.persistent_cache is not None:
+                self.persistent_cache.put(query, result, self.model, self.prompt_version)
+            if self.near_duplicates is not None:
+                self.near_duplicates.add(query, result)
+            if self.label_log is not None:
+                try:
+                    self.label_log.add(self.bounded_text(query), result)
+                except OSError as e:
+                    logger.warning("Could not log LLM label: %s", e)
+    
+    def _classify_uncached(self, query: str) -> Optional[QueryClassification]:
+        """Classify with the LLM, batched with concurrent queries when batching is on."""
+        if self.batcher is None:
+            return self._classify_single(query)
+        try:
+            return self.batcher.submit(query).result(timeout=self._batch_wait_limit())
+        except Exception as e:
+            logger.warning("Batched classification failed: %s", e)
+            return None
+    
+    def _batch_wait_limit(self) -> float:
+        """Longest a caller waits for a batched answer: never longer than trying every model in turn."""
+        return self.batcher.window + self.llm_timeout * (len(self.FALLBACK_MODELS) + 2)
+    
+    def _classify_batch(self, queries: List[str]) -> List:
+        """
+        Classify several queries with one call to the first usable model.
+        
+        Queries missing from a failed or malformed batch answer are retried
+        concurrently on the worker pool, each through the model chain in turn
+        (hedging them as well would have them wait on the pool they occupy);
+        their place in the answer is the retry's Future.
+        """
+        if len(queries) == 1:
+            return [self._classify_single(queries[0])]
+        results: List[Optional[QueryClassification]] = [None] * len(queries)
+        for model in self._models():
+            breaker = self.breaker(model)
+            if not breaker.allow():
+                continue
+            started = time.monotonic()
+            try:
+                results = self._call_llm_batch(queries, model)
+            except Exception as e:
+                self._record_call(model, breaker, time.monotonic() - started, error=e)
+                logger.warning("Batch of %d failed on %s: %s", len(queries), model, e)
+            else:
+                self._record_call(model, breaker, time.monotonic() - started)
+            break
         
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            logger.info("Retrying %d of %d batched queries one by one", len(missing), len(queries))
+        for i in missing:
+            results[i] = self.executor.submit(self._classify_in_turn, queries[i], self._models())
+        return results
+    
+    def _models(self) -> List[str]:
+        """Models in the order to try them: as declared, or ranked by the adaptive router."""
+        if self.router is not None:
+            return self.router.order()
+        return [self.model] + self.FALLBACK_MODELS
+    
+    def _classify_single(self, query: str) -> Optional[QueryClassification]:
+        """Ask the primary model, then the fallbacks, in turn or hedged."""
+        models_to_try = self._models()
+        
+        if self.hedge:
+            return self._classify_hedged(query, models_to_try)
+        return self._classify_in_turn(query, models_to_try)
+    
+    def _classify_in_turn(self, query: str, models_to_try: List[str]) -> Optional[QueryClassification]:
+        """Ask each model in turn until one gives a valid answer."""
         for model in models_to_try:
             try:
-                result = self._call_llm(query, model)
+                result = self._call_model(query, model)
                 if result:
                     return result
+            except CircuitOpenError:
+                continue
             except Exception as e:
-                print(f"[LLMClassifier] {model} failed: {e}")
+                logger.warning("%s failed: %s", model, e)
                 continue
         
         return None
     
-    def _call_llm(self, query: str, model: str) -> Optional[QueryClassification]:
-        """Call OpenRouter API for classification."""
+    async def _classify_uncached_async(self, query: str) -> Optional[QueryClassification]:
+        """Async counterpart of _classify_uncached."""
+        if self.batcher is not None:
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(self.batcher.submit(query)),
+                                              self._batch_wait_limit())
+            except Exception as e:
+                logger.warning("Batched classification failed: %s", e)
+                return None
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://github.com/thalamus-ai/sophia-code",
-            "X-Title": "Intelligent RAG Classifier"
-        }
+        models_to_try = self._models()
+        
+        if self.hedge:
+            return await self._classify_hedged_async(query, models_to_try)
         
-        payload = {
+        for model in models_to_try:
+            try:
+                result = await self._call_model_async(query, model)
+                if result:
+                    return result
+            except CircuitOpenError:
+                continue
+            except Exception as e:
+                logger.warning("%s failed: %s", model, e)
+                continue
+        
+        return None
+    
+    async def _classify_hedged_async(self, query: str, models: List[str]) -> Optional[QueryClassification]:
+        """Async counterpart of _classify_hedged; losing calls are cancelled outright."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.llm_deadline
+        in_flight = {}
+        next_model = 0
+        next_hedge = 0.0
+        
+        try:
+            while True:
+                now = loop.time()
+                remaining = deadline - now
+                if remaining <= 0:
+                    logger.warning("Hedged classification hit the %ss deadline", self.llm_deadline)
+                    return None
+                
+                if next_model < len(models) and (now >= next_hedge or not in_flight):
+                    model = models[next_model]
+                    timeout = min(self.llm_timeout, remaining)
+                    in_flight[asyncio.ensure_future(self._call_model_async(query, model, timeout))] = model
+                    next_model += 1
+                    next_hedge = now + self.hedge_delay
+                
+                if not in_flight:
+                    return None
+                
+                wait_for = remaining if next_model >= len(models) else min(remaining, next_hedge - now)
+                done, _ = await asyncio.wait(in_flight, timeout=max(wait_for, 0), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    model = in_flight.pop(task)
+                    try:
+                        result = task.result()
+                    except CircuitOpenError:
+                        continue
+                    except Exception as e:
+                        logger.warning("%s failed: %s", model, e)
+                        continue
+                    if result:
+                        return result
+        finally:
+            for task in in_flight:
+                task.cancel()
+    
+    async def _call_model_async(self, query: str, model: str,
+                                timeout: Optional[float] = None) -> Optional[QueryClassification]:
+        """Async counterpart of _call_model; a cancelled call is not counted against the model."""
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise CircuitOpenError(model)
+        started = time.monotonic()
+        try:
+            result = await self._call_llm_async(query, model, timeout)
+        except asyncio.CancelledError:
+            breaker.cancel()
+            raise
+        except Exception as e:
+            self._record_call(model, breaker, time.monotonic() - started, error=e)
+            raise
+        self._record_call(model, breaker, time.monotonic() - started, success=result is not None)
+        return result
+    
+    def _call_model(self, query: str, model: str, timeout: Optional[float] = None) -> Optional[QueryClassification]:
+        """
+        Call ``model`` through its circuit breaker, recording success and latency.
+        
+        Raises:
+            CircuitOpenError: if the breaker is open and the model was not called
+        """
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise CircuitOpenError(model)
+        started = time.monotonic()
+        try:
+            result = self._call_llm(query, model, timeout)
+        except Exception as e:
+            self._record_call(model, breaker, time.monotonic() - started, error=e)
+            raise
+        self._record_call(model, breaker, time.monotonic() - started, success=result is not None)
+        return result
+    
+    def _record_call(self, model: str, breaker: CircuitBreaker, seconds: float,
+                     error: Optional[BaseException] = None, success: bool = True):
+        """Feed a finished call to the model's circuit breaker, telemetry and router."""
+        if error is not None:
+            breaker.record(False, seconds, f"{type(error).__name__}: {error}")
+        else:
+            breaker.record(success, seconds)
+        self.telemetry.record_call(model, seconds, error)
+        if self.router is not None:
+            self.router.record(model, seconds, error is None and success)
+    
+    def _classify_hedged(self, query: str, models: List[str]) -> Optional[QueryClassification]:
+        """
+        Race models against each other under an overall deadline.
+        
+        The primary model fires first. The next model fires when no answer has
+        arrived within ``hedge_delay`` seconds, or straight away when every call
+        in flight has failed. The first valid classification wins; calls still
+        queued are cancelled and calls in flight are left to finish in the
+        background (their per-call timeout is capped by the deadline).
+        
+        Returns None if every model fails or the deadline passes.
+        """
+        deadline = time.monotonic() + self.llm_deadline
+        in_flight = {}
+        next_model = 0
+        next_hedge = 0.0
+        
+        try:
+            while True:
+                now = time.monotonic()
+                remaining = deadline - now
+                if remaining <= 0:
+                    logger.warning("Hedged classification hit the %ss deadline", self.llm_deadline)
+                    return None
+                
+                if next_model < len(models) and (now >= next_hedge or not in_flight):
+                    model = models[next_model]
+                    timeout = min(self.llm_timeout, remaining)
+                    in_flight[self.executor.submit(self._call_model, query, model, timeout)] = model
+                    next_model += 1
+                    next_hedge = now + self.hedge_delay
+                
+                if not in_flight:
+                    return None
+                
+                wait_for = remaining if next_model >= len(models) else min(remaining, next_hedge - now)
+                done, _ = wait(in_flight, timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+                for future in done:
+                    model = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except CircuitOpenError:
+                        continue
+                    except Exception as e:
+                        logger.warning("%s failed: %s", model, e)
+                        continue
+                    if result:
+                        return result
+        finally:
+            for future in in_flight:
+                future.cancel()
+    
+    def _call_llm(self, query: str, model: str, timeout: Optional[float] = None) -> Optional[QueryClassification]:
+        """Call OpenRouter API for classification."""
+        response = self.session.post(
+            self.API_URL,
+            json=self._payload(query, model),
+            timeout=timeout or self.llm_timeout
+        )
+        response.raise_for_status()
+        return self._parse_response(response.json(), model, query)
+    
+    async def _call_llm_async(self, query: str, model: str,
+                              timeout: Optional[float] = None) -> Optional[QueryClassification]:
+        """Call OpenRouter API for classification without blocking the event loop."""
+        timeout = timeout or self.llm_timeout
+        _, session = self._async_state()
+        if session is None:
+            # No aiohttp: run the blocking call on the pooled worker threads
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._call_llm, query, model, timeout)
+        async with session.post(self.API_URL, json=self._payload(query, model),
+                                timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        return self._parse_response(data, model, query)
+    
+    def _payload(self, query: str, model: str) -> Dict:
+        """Chat completion request body for classifying ``query`` with ``model``."""
+        if self.compact:
+            return {
+                "model": model,
+                "messages": [{"role": "user", "content": self.COMPACT_PROMPT.format(query=self.bounded_text(query))}],
+                "temperature": 0,
+                "max_tokens": 4
+            }
+        return {
             "model": model,
             "messages": [
                 {
                     "role": "user",
-                    "content": self.CLASSIFICATION_PROMPT.format(query=query)
+                    # Long pastes are cut down the same way as for keyword classification
+                    "content": self.CLASSIFICATION_PROMPT.format(query=self.bounded_text(query))
                 }
             ],
             "temperature": 0.1,  # Low temperature for consistent classification
             "max_tokens": 200,
             "response_format": {"type": "json_object"}
         }
+    
+    def _call_llm_batch(self, queries: List[str], model: str) -> List[Optional[QueryClassification]]:
+        """
+        Classify several queries in one OpenRouter call.
         
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=self.llm_timeout
-        )
-        response.raise_for_status()
+        Returns:
+            One classification per query, None where the answer had no valid entry
         
+        Raises:
+            ValueError: if the answer is not a JSON object with a results list
+        """
+        queries_json = json.dumps([self.bounded_text(query) for query in queries], ensure_ascii=False, indent=0)
+        if self.compact:
+            payload = {
+                "model": model,
+                "messages": [{"role": "user", "content": self.COMPACT_BATCH_PROMPT.format(queries=queries_json)}],
+                "temperature": 0,
+                "max_tokens": 4 * len(queries)
+            }
+        else:
+            payload = {
+                "model": model,
+                "messages": [{"role": "user", "content": self.BATCH_PROMPT.format(queries=queries_json)}],
+                "temperature": 0.1,
+                "max_tokens": 150 * len(queries),
+                "response_format": {"type": "json_object"}
+            }
+        response = self.session.post(self.API_URL, json=payload, timeout=self.llm_timeout)
+        response.raise_for_status()
         data = response.json()
+        self._track_cost(data, model)
         
+        if self.compact:
+            answers = self.COMPACT_ANSWER.findall(data["choices"][0]["message"]["content"] or "")
+            # Without ids a short answer cannot be matched up, so it is rejected whole
+            if len(answers) != len(queries):
+                self.telemetry.record_response(model, rejected=True)
+                raise ValueError(f"compact batch answer has {len(answers)} results for {len(queries)} queries")
+            self.telemetry.record_response(model)
+            return [self._classification_from_result(self._compact_result(answer, query))
+                    for answer, query in zip(answers, queries)]
+        
+        try:
+            answer, repaired = parse_llm_json(data["choices"][0]["message"]["content"])
+            items = answer.get("results") if isinstance(answer, dict) else answer
+            if not isinstance(items, list):
+                raise ValueError("batch answer has no results list")
+        except ValueError:
+            self.telemetry.record_response(model, rejected=True)
+            raise
+        
+        results: List[Optional[QueryClassification]] = [None] * len(queries)
+        for position, item in enumerate(items):
+            if not isinstance(item, dict) or "tier" not in item:
+                continue
+            index = item.get("id", position)
+            if isinstance(index, str) and index.isdigit():
+                index = int(index)
+            if not isinstance(index, int) or not 0 <= index < len(queries):
+                continue
+            try:
+                item, fixed = repair_classification(item)
+            except ValueError:
+                continue
+            repaired = repaired or fixed
+            results[index] = self._classification_from_result(item)
+        self.telemetry.record_response(model, repaired=repaired)
+        return results
+    
+    def _parse_response(self, data: Dict, model: str, query: str) -> Optional[QueryClassification]:
+        """Track the call's cost and turn the completion into a QueryClassification."""
+        self._track_cost(data, model)
+        content = data["choices"][0]["message"]["content"]
+        if self.compact:
+            answer = self.COMPACT_ANSWER.search(content or "")
+            if answer is None:
+                self.telemetry.record_response(model, rejected=True)
+                raise ValueError(f"no tier in compact answer {content!r}")
+            self.telemetry.record_response(model)
+            return self._classification_from_result(self._compact_result(answer.groups(), query))
+        try:
+            answer, repaired = parse_llm_json(content)
+            result, fixed = repair_classification(answer)
+        except ValueError:
+            self.telemetry.record_response(model, rejected=True)
+            raise
+        self.telemetry.record_response(model, repaired=repaired or fixed)
+        return self._classification_from_result(result)
+    
+    def _compact_result(self, answer: Tuple[str, str], query: str) -> Dict:
+        """
+        Expand a compact (tier digit, confidence letter) answer to a full
+        result. The reasoning describes the LLM's tier and lists the keywords
+        found in the query; the keyword classifier's own verdict could
+        contradict the tier.
+        """
+        tier = int(answer[0])
+        terms, _ = self._scan(self.bounded_text(query).lower())
+        keywords = sorted(terms & (self._comprehensive_terms | self._specific_terms))
+        reasoning = f"Tier {tier}: {TIER_CONFIGS[tier].description}"
+        if keywords:
+            reasoning += f" (keywords: {', '.join(keywords)})"
+        return {
+            "tier": tier,
+            "type": TIER_CONFIGS[tier].query_type.value,
+            # A missing confidence letter counts as medium
+            "confidence": self.COMPACT_CONFIDENCE.get((answer[1] or "m").lower(), 0.7),
+            "reasoning": reasoning,
+            "suggests_full_context": tier == 3
+        }
+    
+    def _track_cost(self, data: Dict, model: str):
+        """Add an OpenRouter response's token usage to cost_tracking and telemetry."""
         # Track costs (approximate)
         usage = data.get("usage", {})
         prompt_tokens = usage.get("prompt_tokens", 0)
@@ -146,14 +1533,14 @@ Be decisive. Most queries are Tier 1. Only choose Tier 3 for explicit creation/g
         cost_per_1k = 0.00015  # Average for flash/mini models
         estimated_cost = (total_tokens / 1000) * cost_per_1k
         
-        self.cost_tracking["total_calls"] += 1
-        self.cost_tracking["total_tokens"] += total_tokens
-        self.cost_tracking["estimated_cost_usd"] += estimated_cost
-        
-        # Parse response
-        content = data["choices"][0]["message"]["content"]
-        result = json.loads(content)
-        
+        with self._cost_lock:
+            self.cost_tracking["total_calls"] += 1
+            self.cost_tracking["total_tokens"] += total_tokens
+            self.cost_tracking["estimated_cost_usd"] += estimated_cost
+        self.telemetry.record_usage(model, prompt_tokens, completion_tokens, estimated_cost)
+    
+    def _classification_from_result(self, result: Dict) -> QueryClassification:
+        """Build a QueryClassification from one LLM answer cleaned by repair_classification."""
         tier = result.get("tier", 1)
         query_type_str = result.get("type", "specific_lookup")
         
@@ -185,13 +1572,20 @@ Be decisive. Most queries are Tier 1. Only choose Tier 3 for explicit creation/g
         llm_result = self.classify_with_llm(query)
         
         if llm_result:
-            print(f"[LLMClassifier] Used LLM for classification")
-            print(f"[LLMClassifier] Total calls: {self.cost_tracking['total_calls']}, "
-                  f"Est. cost: ${self.cost_tracking['estimated_cost_usd']:.4f}")
+            logger.debug("Used LLM for classification (total calls: %d, est. cost: $%.4f)",
+                         self.cost_tracking["total_calls"], self.cost_tracking["estimated_cost_usd"])
             return llm_result
         
         # Fall back to keyword-based classification
-        print(f"[LLMClassifier] Falling back to keyword classification")
+        logger.info("LLM classification failed, falling back to keywords")
+        return super().classify(query)
+    
+    async def classify_async(self, query: str) -> QueryClassification:
+        """Async classify: LLM first, keyword-based if it fails."""
+        llm_result = await self.classify_with_llm_async(query)
+        if llm_result:
+            return llm_result
+        logger.info("LLM classification failed, falling back to keywords")
         return super().classify(query)
     
     def get_cost_report(self) -> Dict:
@@ -211,43 +1605,247 @@ class HybridClassifier:
     Strategy:
     - Use keyword for obvious cases (high confidence)
     - Use LLM for ambiguous cases (medium confidence)
-    - Cache results to avoid repeated LLM calls
+    - Cache results to avoid repeated LLM calls; LLM results can also be
+      persisted across restarts with a shared SQLiteCache
+    - With a latency budget, answer with keywords when the LLM is late and
+      cache its answer for next time when it arrives
+    - With a distilled model, answer locally when it is confident and only
+      ask the LLM about the rest
     """
     
-    def __init__(self):
-        self.keyword_classifier = QueryClassifier()
-        self.llm_classifier = LLMQueryClassifier()
-        self.cache: Dict[str, QueryClassification] = {}
+    # Queries longer than this are cached under a digest instead of in full
+    HASH_KEYS_OVER = 256
+    
+    def __init__(self, persistent_cache: Optional[SQLiteCache] = None, max_scan_chars: Optional[int] = None,
+                 latency_budget: Optional[float] = None, distilled: Optional["DistilledClassifier"] = None):
+        self.keyword_classifier = QueryClassifier(max_scan_chars=max_scan_chars)
+        self.llm_classifier = LLMQueryClassifier(persistent_cache=persistent_cache, max_scan_chars=max_scan_chars)
+        # Trained on earlier LLM answers; consulted between keywords and the LLM
+        self.distilled = distilled if distilled is not None else distilled_from_env()
+        self.distilled_threshold = float(os.getenv("DISTILLED_CONFIDENCE", "0.9"))
+        # Bounded by entries and by bytes, so pasted logs cannot grow it without limit
+        cache_mb = float(os.getenv("HYBRID_CACHE_MB", "16"))
+        self.cache = LRUCache(
+            max_entries=int(os.getenv("HYBRID_CACHE_SIZE", "10000")),
+            max_bytes=int(cache_mb * 1024 * 1024) if cache_mb > 0 else None,
+            hash_keys_over=self.HASH_KEYS_OVER
+        )
+        # LLM calls in flight by normalized query, so concurrent duplicates share one
+        self.in_flight = SingleFlight()
         self.llm_threshold = float(os.getenv("LLM_CONFIDENCE_THRESHOLD", "0.7"))
+        # Seconds classify waits for the LLM before answering with keywords; None waits for it
+        if latency_budget is None and os.getenv("HYBRID_LATENCY_BUDGET_MS"):
+            latency_budget = float(os.getenv("HYBRID_LATENCY_BUDGET_MS")) / 1000
+        self.latency_budget = latency_budget or None
+        self._speculations: Optional[ThreadPoolExecutor] = None
+        self._speculations_lock = threading.Lock()
+        # Async speculations still running after their caller gave up on them
+        self._late_tasks = set()
     
     def classify(self, query: str) -> QueryClassification:
         """Classify with smart method selection."""
+        started = time.monotonic()
+        result, keyword_result = self._classify_without_llm(query)
+        if result is not None:
+            return result
+        if self.latency_budget is not None:
+            return self._classify_speculative(query, keyword_result, started)
+        llm_result = self.in_flight.do(normalize_query(query), self.llm_classifier.classify_with_llm, query)
+        return self._finish(query, keyword_result, llm_result)
+    
+    async def classify_async(self, query: str) -> QueryClassification:
+        """Async classify; only the LLM call, if one is needed, is awaited."""
+        started = time.monotonic()
+        result, keyword_result = self._classify_without_llm(query)
+        if result is not None:
+            return result
+        call = self.in_flight.do_async(normalize_query(query), self._speculate_async, query, keyword_result)
+        if self.latency_budget is None:
+            return await call or self._fallback(keyword_result)
         
+        task = asyncio.ensure_future(call)
+        remaining = self.latency_budget - (time.monotonic() - started)
+        try:
+            # Shielded so that running out of budget leaves the call running to fill the cache
+            llm_result = await asyncio.wait_for(asyncio.shield(task), max(remaining, 0))
+        except asyncio.TimeoutError:
+            self._late_tasks.add(task)
+            task.add_done_callback(self._late_task_done)
+            return self._over_budget(keyword_result)
+        return llm_result or self._fallback(keyword_result)
+    
+    def _classify_speculative(self, query: str, keyword_result: QueryClassification,
+                              started: float) -> QueryClassification:
+        """
+        Ask the LLM in the background and wait for it until the latency budget
+        runs out. A late answer is cached by the background call when it lands.
+        """
+        key = normalize_query(query)
+        owned, waiting = self.in_flight.claim([key])
+        if owned:
+            future = self._speculation_executor().submit(self._speculate, key, query, keyword_result)
+        else:
+            future = waiting[key]
+        remaining = self.latency_budget - (time.monotonic() - started)
+        try:
+            llm_result = future.result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            return self._over_budget(keyword_result)
+        except Exception:
+            llm_result = None
+        return llm_result or self._fallback(keyword_result)
+    
+    def _speculation_executor(self) -> ThreadPoolExecutor:
+        """Threads running speculative LLM calls, started on first use."""
+        if self._speculations is None:
+            with self._speculations_lock:
+                if self._speculations is None:
+                    self._speculations = ThreadPoolExecutor(
+                        max_workers=max(self.llm_classifier.pool_size, 1), thread_name_prefix="llm-speculate"
+                    )
+        return self._speculations
+    
+    def _speculate(self, key: str, query: str,
+                   keyword_result: QueryClassification) -> Optional[QueryClassification]:
+        """Owner side of a claimed in-flight key: classify, cache, then release waiters."""
+        try:
+            llm_result = self.llm_classifier.classify_with_llm(query)
+        except BaseException as e:
+            self.in_flight.fail(key, e)
+            raise
+        self._finish(query, keyword_result, llm_result)
+        self.in_flight.resolve(key, llm_result)
+        return llm_result
+    
+    async def _speculate_async(self, query: str,
+                               keyword_result: QueryClassification) -> Optional[QueryClassification]:
+        llm_result = await self.llm_classifier.classify_with_llm_async(query)
+        self._finish(query, keyword_result, llm_result)
+        return llm_result
+    
+    def _late_task_done(self, task: asyncio.Future):
+        self._late_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Late LLM classification failed: %s", task.exception())
+    
+    def _over_budget(self, keyword_result: QueryClassification) -> QueryClassification:
+        logger.debug("LLM missed the %.0fms latency budget, using keyword classification",
+                     self.latency_budget * 1000)
+        self.llm_classifier.telemetry.record_budget_exceeded()
+        return self._fallback(keyword_result)
+    
+    @staticmethod
+    def _fallback(keyword_result: QueryClassification) -> QueryClassification:
+        """The keyword answer given in place of the LLM's, marked so callers do not cache it."""
+        return replace(keyword_result, provisional=True)
+    
+    def _classify_without_llm(self, query: str) -> Tuple[Optional[QueryClassification], QueryClassification]:
+        """
+        Answer from the cache or from confident keyword matching.
+        
+        Returns:
+            Tuple of (final result or None if the LLM should be asked, keyword result)
+        """
         # Check cache
-        if query in self.cache:
-            print(f"[HybridClassifier] Cache hit")
-            return self.cache[query]
+        cached = self.cache.get(query)
+        if cached is not None:
+            logger.debug("Hybrid cache hit")
+            return cached, cached
         
         # First, try keyword classification
         keyword_result = self.keyword_classifier.classify(query)
         
         # If keyword confidence is high, use it (saves money)
         if keyword_result.confidence >= self.llm_threshold:
-            print(f"[HybridClassifier] Using keyword classification (confidence: {keyword_result.confidence:.2f})")
-            self.cache[query] = keyword_result
-            return keyword_result
+            logger.debug("Using keyword classification (confidence: %.2f)", keyword_result.confidence)
+            self.cache.put(query, keyword_result)
+            return keyword_result, keyword_result
         
-        # Otherwise, use LLM for better accuracy
-        print(f"[HybridClassifier] Keyword confidence low ({keyword_result.confidence:.2f}), using LLM")
-        llm_result = self.llm_classifier.classify_with_llm(query)
+        # Then the model distilled from earlier LLM answers, if it is sure
+        if self.distilled is not None:
+            distilled_result = self.distilled.classify(self.keyword_classifier.bounded_text(query))
+            if distilled_result.confidence >= self.distilled_threshold:
+                logger.debug("Using distilled classification (confidence: %.2f)", distilled_result.confidence)
+                self.llm_classifier.telemetry.record_classification("distilled")
+                self.cache.put(query, distilled_result)
+                return distilled_result, keyword_result
         
+        # Otherwise, use LLM for better accuracy
+        logger.debug("Keyword confidence low (%.2f), using LLM", keyword_result.confidence)
+        return None, keyword_result
+    
+    def _finish(self, query: str, keyword_result: QueryClassification,
+                llm_result: Optional[QueryClassification]) -> QueryClassification:
         if llm_result:
-            self.cache[query] = llm_result
+            self.cache.put(query, llm_result)
             return llm_result
         
         # Fall back to keyword if LLM fails
-        self.cache[query] = keyword_result
+        keyword_result = self._fallback(keyword_result)
+        self.cache.put(query, keyword_result)
         return keyword_result
+    
+    def classify_many(self, queries: List[str]) -> List[QueryClassification]:
+        """
+        Classify several queries, classifying each distinct query once.
+        
+        The queries that need the LLM are asked concurrently, so with
+        micro-batching on they share batched calls instead of each waiting out
+        a batch window alone. The latency budget, if any, covers them all.
+        """
+        started = time.monotonic()
+        results: Dict[str, QueryClassification] = {}
+        # Queries for the LLM -> (in-flight key, keyword result)
+        asking: Dict[str, Tuple[str, QueryClassification]] = {}
+        for query in queries:
+            if query in results or query in asking:
+                continue
+            result, keyword_result = self._classify_without_llm(query)
+            if result is not None:
+                results[query] = result
+            else:
+                asking[query] = (normalize_query(query), keyword_result)
+        
+        if asking:
+            owners: Dict[str, Tuple[str, QueryClassification]] = {}
+            for query, (key, keyword_result) in asking.items():
+                owners.setdefault(key, (query, keyword_result))
+            owned, futures = self.in_flight.claim(list(owners))
+            for key in owned:
+                futures[key] = self._speculation_executor().submit(self._speculate, key, *owners[key])
+            
+            timeout = None
+            if self.latency_budget is not None:
+                timeout = max(self.latency_budget - (time.monotonic() - started), 0)
+            wait(futures.values(), timeout=timeout)
+            for query, (key, keyword_result) in asking.items():
+                future = futures[key]
+                if not future.done():
+                    results[query] = self._over_budget(keyword_result)
+                elif future.exception() is not None:
+                    results[query] = self._fallback(keyword_result)
+                else:
+                    results[query] = self._finish(query, keyword_result, future.result())
+        return [results[query] for query in queries]
+    
+    def get_system_prompt_addition(self, classification: QueryClassification) -> str:
+        return self.keyword_classifier.get_system_prompt_addition(classification)
+    
+    def close(self):
+        """Stop the speculation threads and close the LLM classifier's connections."""
+        if self._speculations is not None:
+            self._speculations.shutdown(wait=False, cancel_futures=True)
+        self.llm_classifier.close()
+    
+    async def aclose(self):
+        """Close the running event loop's aiohttp session; see LLMQueryClassifier.aclose."""
+        await self.llm_classifier.aclose()
+    
+    async def __aenter__(self) -> "HybridClassifier":
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
 
 
 # Standalone test
@@ -0,0 +1,72 @@
+import http.client
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intelligent_rag import IntelligentRAGServer  # noqa: E402
+
+# Settings that would make LLM classifier tests depend on the environment
+LLM_ENV = ("CLASSIFIER_CACHE_DB", "LLM_LABEL_LOG", "DISTILLED_MODEL", "LLM_ROUTING", "LLM_HEDGE",
+           "LLM_BATCH_SIZE", "LLM_PROMPT_MODE", "HYBRID_LATENCY_BUDGET_MS", "HYBRID_CACHE_MB")
+
+
+@pytest.fixture
+def start_server():
+    """Start IntelligentRAGServer instances on free ports; returns (server, port)."""
+    started = []
+
+    def start(**kwargs):
+        kwargs.setdefault("access_log", False)
+        server = IntelligentRAGServer("127.0.0.1", 0, **kwargs)
+        httpd = server.make_http_server()
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        started.append(httpd)
+        return server, httpd.server_address[1]
+
+    yield start
+    for httpd in started:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def make_llm_classifier(monkeypatch):
+    """Build LLMQueryClassifiers with an API key, no caches and the given environment."""
+    from intelligent_rag_llm import LLMQueryClassifier
+    for name in LLM_ENV:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    monkeypatch.setenv("NEAR_DUPLICATE_THRESHOLD", "0")
+    made = []
+
+    def make(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        classifier = LLMQueryClassifier()
+        made.append(classifier)
+        return classifier
+
+    yield make
+    for classifier in made:
+        classifier.close()
+
+
+def request(port, method, path, body=None, timeout=10):
+    """Send one request; returns (status, decoded JSON body or raw bytes)."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        payload = json.dumps(body).encode() if body is not None else None
+        conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        data = response.read()
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, data
+    finally:
+        conn.close()
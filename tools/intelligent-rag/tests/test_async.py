@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from intelligent_rag import QueryClassification, QueryType
+from intelligent_rag_llm import CircuitBreaker, HybridClassifier
+
+
+def tier_two(query, model="test"):
+    return QueryClassification(
+        query_type=QueryType.COMPREHENSIVE_ANALYSIS, confidence=0.9, reasoning=f"[LLM: {model}] {query}",
+        recommended_tier=2, rag_full_context=False, top_k=20
+    )
+
+
+def test_concurrency_is_limited_per_loop(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier(LLM_MAX_CONCURRENCY=2)
+    running = []
+    peak = []
+
+    async def call_llm_async(query, model, timeout=None):
+        running.append(query)
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(query)
+        return tier_two(query, model)
+
+    monkeypatch.setattr(classifier, "_call_llm_async", call_llm_async)
+
+    async def main():
+        async with classifier:
+            return await asyncio.gather(*(classifier.classify_with_llm_async(f"query {i}") for i in range(6)))
+
+    results = asyncio.run(main())
+    assert [result.reasoning for result in results] == [f"[LLM: {classifier.model}] query {i}" for i in range(6)]
+    assert max(peak) == 2
+
+
+def test_cancel_in_flight_does_not_trip_the_breaker(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier(LLM_MAX_CONCURRENCY=1)
+    calls = []
+
+    async def call_llm_async(query, model, timeout=None):
+        calls.append(query)
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(classifier, "_call_llm_async", call_llm_async)
+
+    async def main():
+        for i in range(6):
+            task = asyncio.ensure_future(classifier.classify_with_llm_async(f"query {i}"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        # The limiter slot was given back
+        limiter, _ = classifier._async_state()
+        assert not limiter.locked()
+        await classifier.aclose()
+
+    asyncio.run(main())
+    assert len(calls) == 6
+    snapshot = classifier.breaker(classifier.model).snapshot()
+    assert snapshot["state"] == CircuitBreaker.CLOSED and snapshot["recent_calls"] == 0
+    assert classifier.telemetry.snapshot()["classifications"].get("failed", 0) == 0
+
+
+def test_cancelled_half_open_probe_is_given_back(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier()
+    breaker = classifier.breaker(classifier.model)
+    breaker.state = CircuitBreaker.HALF_OPEN
+
+    async def call_llm_async(query, model, timeout=None):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(classifier, "_call_llm_async", call_llm_async)
+
+    async def main():
+        task = asyncio.ensure_future(classifier._call_model_async("query", classifier.model))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert breaker.allow()  # The probe can be claimed again
+
+
+def test_context_manager_closes_each_loops_session(monkeypatch):
+    pytest.importorskip("aiohttp")
+    monkeypatch.delenv("CLASSIFIER_CACHE_DB", raising=False)
+    classifier = HybridClassifier()
+    sessions = []
+
+    async def main():
+        async with classifier:
+            _, session = classifier.llm_classifier._async_state()
+            sessions.append(session)
+
+    asyncio.run(main())
+    asyncio.run(main())
+    assert len(sessions) == 2 and sessions[0] is not sessions[1]
+    assert all(session.closed for session in sessions)
+    assert len(classifier.llm_classifier._loop_state) == 0
+    classifier.close()
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+from intelligent_rag import QueryClassification, QueryType
+from intelligent_rag_llm import MicroBatcher
+
+
+def classification(query):
+    return QueryClassification(query_type=QueryType.COMPREHENSIVE_ANALYSIS, confidence=0.9,
+                               reasoning=f"[LLM] {query}", recommended_tier=2, rag_full_context=False, top_k=20)
+
+
+def echo_batcher(sent, delay=0.0, window=0.05):
+    def send_batch(queries):
+        sent.append(list(queries))
+        time.sleep(delay)
+        return [f"answer {query}" for query in queries]
+
+    return MicroBatcher(send_batch, max_size=8, window=window)
+
+
+def test_caller_cancelled_before_send_is_left_out_of_the_batch():
+    sent = []
+    batcher = echo_batcher(sent)
+
+    async def main():
+        first = asyncio.ensure_future(asyncio.wrap_future(batcher.submit("first")))
+        second = asyncio.wrap_future(batcher.submit("second"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await asyncio.wait_for(second, 2)
+
+    assert asyncio.run(main()) == "answer second"
+    assert sent == [["second"]]
+
+
+def test_caller_cancelled_mid_batch_does_not_strand_the_rest():
+    sent = []
+    batcher = echo_batcher(sent, delay=0.2)
+    errors = []
+    threading.excepthook, hook = (lambda args: errors.append(args.exc_value)), threading.excepthook
+
+    async def main():
+        first = asyncio.ensure_future(asyncio.wrap_future(batcher.submit("first")))
+        second = asyncio.wrap_future(batcher.submit("second"))
+        await asyncio.sleep(0.1)  # The batch is on its way
+        first.cancel()
+        return await asyncio.wait_for(second, 2)
+
+    try:
+        assert asyncio.run(main()) == "answer second"
+    finally:
+        threading.excepthook = hook
+    assert sent == [["first", "second"]]
+    assert errors == []
+
+
+def test_callers_answered_by_a_future_resolve_as_it_arrives():
+    retry = Future()
+    batcher = MicroBatcher(lambda queries: ["answer first", retry], max_size=2)
+    first, second = batcher.submit("first"), batcher.submit("second")
+
+    assert first.result(timeout=2) == "answer first"
+    assert not second.done()
+    retry.set_result("answer second")
+    assert second.result(timeout=2) == "answer second"
+
+
+def test_short_batch_answer_is_retried_concurrently(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier(LLM_BATCH_SIZE=4)
+    queries = [f"review the architecture of service {i}" for i in range(4)]
+
+    def call_llm_batch(queries, model):
+        # Only the first query was answered
+        return [classification(queries[0])] + [None] * (len(queries) - 1)
+
+    def call_llm(query, model, timeout=None):
+        time.sleep(0.5)
+        return classification(query)
+
+    monkeypatch.setattr(classifier, "_call_llm_batch", call_llm_batch)
+    monkeypatch.setattr(classifier, "_call_llm", call_llm)
+    elapsed = {}
+
+    def classify(query):
+        started = time.monotonic()
+        assert classifier.classify_with_llm(query).reasoning == f"[LLM] {query}"
+        elapsed[query] = time.monotonic() - started
+
+    threads = [threading.Thread(target=classify, args=(query,)) for query in queries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The answered query did not wait for the retries, which ran side by side
+    assert elapsed[queries[0]] < 0.3
+    assert all(0.5 <= elapsed[query] < 1.0 for query in queries[1:])
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+from intelligent_rag_bench import bench_in_process, generate_corpus
+
+TOOL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_hybrid_case_ignores_the_persistent_cache(monkeypatch, tmp_path):
+    cache_db = tmp_path / "cache.db"
+    monkeypatch.setenv("CLASSIFIER_CACHE_DB", str(cache_db))
+    corpus = generate_corpus(60, seed=3, long_kb=(1, 2))
+
+    results = bench_in_process(corpus)
+    # Repeated queries are timed once each
+    assert results["hybrid"]["count"] == len({query for _, query in corpus}) < len(corpus)
+    assert not cache_db.exists()
+    assert os.environ["CLASSIFIER_CACHE_DB"] == str(cache_db)
+
+
+def test_bench_command_smoke(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    command = [sys.executable, os.path.join(TOOL_DIR, "intelligent_rag.py"), "bench", "--size", "40",
+               "--long-min-kb", "1", "--long-max-kb", "2", "--concurrency", "2", "--batch-size", "10"]
+    env = {k: v for k, v in os.environ.items() if k != "OPENROUTER_API_KEY"}
+
+    subprocess.run(command + ["--save", str(baseline)], cwd=tmp_path, env=env, check=True, capture_output=True)
+    report = json.loads(baseline.read_text())
+    assert report["corpus"]["size"] == 40
+    assert {"keyword", "hybrid"} <= set(report["results"])
+    assert all(result["count"] > 0 for result in report["results"].values())
+
+    # A generous threshold, so only a broken comparison fails
+    compared = subprocess.run(command + ["--compare", str(baseline), "--max-regression", "100000"],
+                              cwd=tmp_path, env=env, capture_output=True, text=True)
+    assert compared.returncode == 0, compared.stdout + compared.stderr
@@ -0,0 +1,98 @@
+import time
+
+from intelligent_rag import QueryClassification, QueryType
+from intelligent_rag_llm import CircuitBreaker
+
+
+def test_opens_at_the_failure_rate_once_min_calls_are_recorded():
+    breaker = CircuitBreaker(window=10, min_calls=4, failure_rate=0.5, cooldown=60)
+    for success in (False, False, False):
+        assert breaker.allow()
+        breaker.record(success, 0.1, "ConnectionError: down")
+    # Three failures are too few calls to judge
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record(True, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    snapshot = breaker.snapshot()
+    assert snapshot["rejected"] == 1 and snapshot["last_error"] == "ConnectionError: down"
+    assert 0 < snapshot["retry_in_seconds"] <= 60
+
+
+def test_stays_closed_below_the_failure_rate():
+    breaker = CircuitBreaker(window=10, min_calls=4, failure_rate=0.5)
+    for success in (False, True, True, True, False, True):
+        breaker.record(success, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(window=4, min_calls=4, failure_rate=0.5, slow_call_seconds=1.0)
+    for latency in (2.0, 0.1, 3.0, 0.1):
+        breaker.record(True, latency)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def open_breaker(cooldown):
+    breaker = CircuitBreaker(window=2, min_calls=2, failure_rate=0.5, cooldown=cooldown)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success():
+    breaker = open_breaker(cooldown=0.1)
+    time.sleep(0.15)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+
+    breaker.record(True, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["recent_calls"] == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_for_another_cooldown():
+    breaker = open_breaker(cooldown=0.1)
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    time.sleep(0.15)
+    assert breaker.allow()
+
+
+def test_cancelled_probe_is_given_back():
+    breaker = open_breaker(cooldown=0.1)
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.cancel()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_open_breaker_skips_the_model(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier(LLM_BREAKER_WINDOW=2, LLM_BREAKER_COOLDOWN=60)
+    calls = []
+
+    def call_llm(query, model, timeout=None):
+        calls.append(model)
+        if model == classifier.model:
+            raise ConnectionError("down")
+        return QueryClassification(query_type=QueryType.SPECIFIC_LOOKUP, confidence=0.9, reasoning="[LLM]",
+                                   recommended_tier=1, rag_full_context=False, top_k=15)
+
+    monkeypatch.setattr(classifier, "_call_llm", call_llm)
+    for i in range(3):
+        assert classifier.classify_with_llm(f"query {i}") is not None
+
+    fallback = classifier.FALLBACK_MODELS[0]
+    assert calls == [classifier.model, fallback, classifier.model, fallback, fallback]
+    health = classifier.health()
+    assert health["status"] == "degraded"
+    assert health["models"][classifier.model]["state"] == CircuitBreaker.OPEN
@@ -0,0 +1,87 @@
+import pytest
+
+from intelligent_rag import QueryClassifier, QueryType, TIER_CONFIGS
+
+
+def completion(content):
+    return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 60, "completion_tokens": 2}}
+
+
+class Response:
+    def __init__(self, content):
+        self.data = completion(content)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+@pytest.fixture
+def compact(make_llm_classifier):
+    return make_llm_classifier(LLM_PROMPT_MODE="compact")
+
+
+def test_payload_asks_for_a_few_tokens_of_plain_text(compact, make_llm_classifier):
+    payload = compact._payload("what is the auth endpoint", compact.model)
+    assert payload["max_tokens"] == 4 and payload["temperature"] == 0
+    assert "response_format" not in payload
+    assert '"what is the auth endpoint"' in payload["messages"][0]["content"]
+    # The prompt is part of the persistent cache key
+    assert compact.prompt_version != make_llm_classifier(LLM_PROMPT_MODE="json").prompt_version
+
+
+@pytest.mark.parametrize("content, tier, confidence", [
+    ("2h", 2, 0.9),
+    ("3 L", 3, 0.5),
+    ("Tier 1m.", 1, 0.7),
+    # A missing confidence letter counts as medium
+    ("2", 2, 0.7),
+])
+def test_answer_is_a_tier_digit_and_confidence_letter(compact, content, tier, confidence):
+    result = compact._parse_response(completion(content), compact.model, "what is the auth endpoint")
+    assert result.recommended_tier == tier and result.confidence == confidence
+    assert result.query_type == TIER_CONFIGS[tier].query_type
+
+
+@pytest.mark.parametrize("content", ["high", "tier 4h", "12h", ""])
+def test_answer_without_a_tier_digit_is_rejected(compact, content):
+    with pytest.raises(ValueError):
+        compact._parse_response(completion(content), compact.model, "what is the auth endpoint")
+    assert compact.telemetry.models[compact.model]["rejected_responses"] == 1
+
+
+def test_reasoning_follows_the_llm_tier(compact):
+    query = "What is the architecture overview of the auth endpoint design?"
+    # The keywords alone say tier 2; the LLM says tier 1
+    assert QueryClassifier().classify(query).recommended_tier == 2
+
+    result = compact._classification_from_result(compact._compact_result(("1", "h"), query))
+    assert result.recommended_tier == 1
+    assert result.query_type == QueryType.SPECIFIC_LOOKUP
+    assert TIER_CONFIGS[1].description in result.reasoning
+    assert "architecture" in result.reasoning
+    assert "Comprehensive keywords" not in result.reasoning
+
+
+def test_batch_answer_has_one_line_per_query(compact, monkeypatch):
+    queries = ["what is the auth endpoint", "review the architecture", "write a design proposal"]
+    payloads = []
+
+    def post(url, json=None, timeout=None):
+        payloads.append(json)
+        return Response("1h\n2m\n3l")
+
+    monkeypatch.setattr(compact.session, "post", post)
+    results = compact._call_llm_batch(queries, compact.model)
+    assert [result.recommended_tier for result in results] == [1, 2, 3]
+    assert payloads[0]["max_tokens"] == 4 * len(queries)
+
+
+@pytest.mark.parametrize("content", ["1h\n2m", "1h\n2m\n3l\n1h"])
+def test_batch_answer_with_the_wrong_count_is_rejected_whole(compact, monkeypatch, content):
+    monkeypatch.setattr(compact.session, "post", lambda url, json=None, timeout=None: Response(content))
+    with pytest.raises(ValueError, match="results for 3 queries"):
+        compact._call_llm_batch(["q one", "q two", "q three"], compact.model)
+    assert compact.telemetry.models[compact.model]["rejected_responses"] == 1
@@ -0,0 +1,118 @@
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import request
+from intelligent_rag import DeadlineSocketReader
+
+
+def test_slow_upload_gets_408_and_frees_the_worker(start_server):
+    _, port = start_server(threads=1, request_timeout=1.0)
+    slow = socket.create_connection(("127.0.0.1", port))
+    slow.sendall(b"POST /check-response HTTP/1.1\r\nHost: x\r\nContent-Length: 200\r\n\r\n")
+    stop = threading.Event()
+
+    def trickle():
+        # One byte every 0.3 s: each recv is quick, the request as a whole is not
+        while not stop.is_set():
+            try:
+                slow.sendall(b" ")
+            except OSError:
+                return
+            time.sleep(0.3)
+
+    threading.Thread(target=trickle, daemon=True).start()
+    try:
+        started = time.monotonic()
+        status, _ = request(port, "GET", "/health", timeout=10)
+        assert status == 200
+        assert time.monotonic() - started < 3
+
+        slow.settimeout(5)
+        assert slow.recv(1024).startswith(b"HTTP/1.1 408")
+    finally:
+        stop.set()
+        slow.close()
+
+
+def test_stalled_body_gets_408(start_server):
+    _, port = start_server(request_timeout=0.5)
+    with socket.create_connection(("127.0.0.1", port)) as stalled:
+        stalled.sendall(b"POST /classify HTTP/1.1\r\nHost: x\r\nContent-Length: 100\r\n\r\n{\"query\":")
+        stalled.settimeout(5)
+        started = time.monotonic()
+        assert stalled.recv(1024).startswith(b"HTTP/1.1 408")
+        assert time.monotonic() - started < 2
+
+
+def test_deadline_applies_to_a_blocking_socket():
+    server, client = socket.socketpair()
+    with server, client:
+        server.settimeout(None)
+        reader = DeadlineSocketReader(server)
+        reader.deadline = time.monotonic() + 0.2
+        started = time.monotonic()
+        with pytest.raises(socket.timeout):
+            reader.readinto(bytearray(16))
+        assert time.monotonic() - started < 2
+
+
+def test_idle_keep_alive_connection_is_closed(start_server):
+    _, port = start_server(idle_timeout=0.3)
+    with socket.create_connection(("127.0.0.1", port)) as idle:
+        idle.sendall(b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n")
+        idle.settimeout(5)
+        response = b""
+        while b"\r\n\r\n" not in response:
+            response += idle.recv(4096)
+        assert response.startswith(b"HTTP/1.1 200")
+        started = time.monotonic()
+        # Drain the rest of the response, then wait for the server to hang up
+        while idle.recv(4096):
+            pass
+        assert 0.2 < time.monotonic() - started < 3
+
+
+def test_keep_alive_connection_serves_several_requests(start_server):
+    _, port = start_server(request_timeout=1.0)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    for _ in range(3):
+        conn.request("GET", "/health")
+        assert conn.getresponse().read()
+        time.sleep(0.6)
+    conn.close()
+
+
+def test_processes_start_under_the_spawn_start_method():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    # spawn is the default on macOS; the server must not need pickling
+    script = ("import multiprocessing, sys; multiprocessing.set_start_method('spawn'); "
+              "import intelligent_rag; "
+              f"sys.argv = ['intelligent_rag.py', 'server', '--host', '127.0.0.1', '--port', '{port}', "
+              "'--processes', '2', '--no-access-log']; intelligent_rag.main()")
+    tool_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen([sys.executable, "-c", script], cwd=tool_dir,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                status, _ = request(port, "GET", "/health", timeout=1)
+                break
+            except OSError:
+                assert server.poll() is None, server.stderr.read().decode()
+                assert time.monotonic() < deadline
+                time.sleep(0.1)
+        assert status == 200
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=10)
@@ -0,0 +1,78 @@
+import json
+import threading
+
+import requests
+
+from intelligent_rag_llm import HybridClassifier
+
+ANSWER = '{"tier": 1, "type": "specific_lookup", "confidence": 0.9}'
+
+
+def record_sends(classifier, monkeypatch):
+    """Answer every request sent through the classifier's shared adapter; returns the adapters used."""
+    adapter = classifier._adapter
+    used = []
+
+    def send(request, **kwargs):
+        used.append(adapter)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"choices": [{"message": {"content": ANSWER}}]}).encode()
+        response.request = request
+        return response
+
+    monkeypatch.setattr(adapter, "send", send)
+    return used
+
+
+def test_threads_have_their_own_session_on_the_shared_adapter(make_llm_classifier):
+    classifier = make_llm_classifier()
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(classifier.session)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sessions.append(classifier.session)
+
+    assert classifier.session is sessions[-1]
+    assert len({id(session) for session in sessions}) == 4
+    for session in sessions:
+        assert session.get_adapter(classifier.API_URL) is classifier._adapter
+        assert session.headers["Authorization"] == "Bearer test"
+
+
+def test_repeated_calls_reuse_the_shared_adapter(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier()
+    used = record_sends(classifier, monkeypatch)
+    for model in [classifier.model, classifier.model] + classifier.FALLBACK_MODELS[:2]:
+        assert classifier._call_llm("what is the auth endpoint", model).recommended_tier == 1
+    thread = threading.Thread(target=classifier._call_llm, args=("what is the auth endpoint", classifier.model))
+    thread.start()
+    thread.join()
+
+    assert len(used) == 5 and all(adapter is classifier._adapter for adapter in used)
+
+
+def test_close_releases_the_adapter_and_the_executor(make_llm_classifier):
+    classifier = make_llm_classifier()
+    classifier._adapter.poolmanager.connection_from_url(classifier.API_URL)
+    executor = classifier.executor
+    assert len(classifier._adapter.poolmanager.pools) == 1
+
+    classifier.close()
+    assert len(classifier._adapter.poolmanager.pools) == 0
+    assert executor._shutdown
+
+
+def test_hybrid_close_stops_speculation_and_closes_the_llm_classifier(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    monkeypatch.delenv("CLASSIFIER_CACHE_DB", raising=False)
+    classifier = HybridClassifier(latency_budget=0.1)
+    speculations = classifier._speculation_executor()
+    executor = classifier.llm_classifier.executor
+    classifier.llm_classifier._adapter.poolmanager.connection_from_url(classifier.llm_classifier.API_URL)
+
+    classifier.close()
+    assert speculations._shutdown and executor._shutdown
+    assert len(classifier.llm_classifier._adapter.poolmanager.pools) == 0
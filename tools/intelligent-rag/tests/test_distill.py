@@ -0,0 +1,121 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from intelligent_rag import QueryClassification, QueryClassifier
+from intelligent_rag_distill import DistilledClassifier, LabelLog
+from intelligent_rag_llm import HybridClassifier
+
+LOOKUPS = ["where does the {} token live", "which port does {} listen on", "name of the {} env var",
+           "default timeout for {}", "who owns the {} repo"]
+ANALYSES = ["how does {} fit with billing and search", "tradeoffs between {} and the queue",
+            "why {} and auth drift apart over time", "what breaks if {} goes away",
+            "how {} and the gateway share load"]
+SUBJECTS = ["auth", "billing", "search", "ingest", "mailer", "scheduler", "gateway", "reports"]
+
+
+def examples():
+    return ([(text.format(subject), 1, 1.0) for text in LOOKUPS for subject in SUBJECTS]
+            + [(text.format(subject), 2, 1.0) for text in ANALYSES for subject in SUBJECTS])
+
+
+@pytest.fixture(scope="module")
+def model():
+    return DistilledClassifier(dim=1 << 12).fit(examples(), epochs=20)
+
+
+def test_fit_learns_the_labels(model):
+    assert model.evaluate(examples(), threshold=0.9)["accuracy"] == 1.0
+    assert model.predict("which port does the profile service listen on")[0] == 1
+    assert model.predict("how does the profile service fit with billing and search")[0] == 2
+
+
+def test_save_and_load_round_trip(model, tmp_path):
+    model.metadata = {"examples": 80}
+    path = tmp_path / "nested" / "distilled.json"
+    model.save(path)
+    loaded = DistilledClassifier.load(path)
+
+    assert loaded.dim == model.dim and loaded.metadata == {"examples": 80}
+    for query, _, _ in examples():
+        (tier, probability), (loaded_tier, loaded_probability) = model.predict(query), loaded.predict(query)
+        assert loaded_tier == tier and loaded_probability == pytest.approx(probability, abs=1e-4)
+    assert "learned from 80 LLM classifications" in loaded.classify("who owns the auth repo").reasoning
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_load_rejects_other_versions(model, tmp_path):
+    path = tmp_path / "distilled.json"
+    model.save(path)
+    path.write_text(path.read_text().replace('"version":1', '"version":99'))
+    with pytest.raises(ValueError):
+        DistilledClassifier.load(path)
+
+
+def classification(tier, confidence=0.9):
+    keyword = QueryClassifier().classify("what is the endpoint" if tier == 1 else "review the architecture")
+    return QueryClassification(query_type=keyword.query_type, confidence=confidence, reasoning="",
+                               recommended_tier=tier, rag_full_context=False, top_k=keyword.top_k)
+
+
+def test_label_log_keeps_the_latest_label(tmp_path):
+    log = LabelLog(str(tmp_path / "labels.jsonl"))
+    log.add("Who owns auth?", classification(1))
+    log.add("how does auth fit with billing", classification(2, 0.8))
+    log.add("who owns AUTH", classification(2))
+    with open(log.path, "a") as f:
+        f.write('{"query": "torn", "ti')
+
+    assert log.written == 3
+    assert sorted(log.read()) == [("how does auth fit with billing", 2, 0.8), ("who owns AUTH", 2, 0.9)]
+
+
+@pytest.fixture
+def hybrid(model, monkeypatch):
+    for name in ("CLASSIFIER_CACHE_DB", "DISTILLED_MODEL", "LLM_LABEL_LOG", "HYBRID_LATENCY_BUDGET_MS"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("NEAR_DUPLICATE_THRESHOLD", "0")
+    classifier = HybridClassifier(distilled=model)
+    calls = []
+    monkeypatch.setattr(classifier.llm_classifier, "classify_with_llm", lambda query: calls.append(query))
+    yield classifier, calls
+    classifier.close()
+
+
+def test_distilled_answers_low_confidence_queries(hybrid):
+    classifier, calls = hybrid
+    query = "how does the gateway fit with billing and search"
+    assert QueryClassifier().classify(query).confidence < classifier.llm_threshold
+
+    result = classifier.classify(query)
+    assert result.recommended_tier == 2 and result.reasoning.startswith("[Distilled]")
+    assert calls == []
+
+
+def test_distilled_is_skipped_for_confident_keywords(hybrid):
+    classifier, calls = hybrid
+    query = "What is the API endpoint, function and config example code?"
+    keyword = QueryClassifier().classify(query)
+    assert keyword.confidence >= classifier.llm_threshold
+    assert classifier.classify(query).reasoning == keyword.reasoning
+    assert calls == []
+
+
+def test_unsure_distilled_model_asks_the_llm(hybrid):
+    classifier, calls = hybrid
+    classifier.distilled_threshold = 1.01
+    result = classifier.classify("how does the profile service fit with billing and search")
+    assert calls == ["how does the profile service fit with billing and search"]
+    assert not result.reasoning.startswith("[Distilled]")
+
+
+def test_distill_command_without_the_module(tmp_path):
+    tool_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    shutil.copy(os.path.join(tool_dir, "intelligent_rag.py"), tmp_path)
+    result = subprocess.run([sys.executable, "intelligent_rag.py", "distill"], cwd=tmp_path,
+                            capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "distill needs intelligent_rag_distill.py" in result.stdout
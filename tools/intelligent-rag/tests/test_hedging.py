@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+
+from intelligent_rag import QueryClassification, QueryType
+
+
+def answer(model):
+    return QueryClassification(
+        query_type=QueryType.COMPREHENSIVE_ANALYSIS, confidence=0.9, reasoning=f"[LLM: {model}]",
+        recommended_tier=2, rag_full_context=False, top_k=20
+    )
+
+
+def scripted(classifier, monkeypatch, behaviour):
+    """Patch the sync and async model calls; ``behaviour[i]`` is (delay, outcome) for the i-th model."""
+    models = classifier._models()
+    calls = []
+    lock = threading.Lock()
+
+    def outcome(model):
+        _, result = behaviour.get(models.index(model), (0, "answer"))
+        if result == "error":
+            raise ConnectionError(f"{model} is down")
+        return answer(model) if result == "answer" else None
+
+    def call_llm(query, model, timeout=None):
+        with lock:
+            calls.append(model)
+        time.sleep(behaviour.get(models.index(model), (0, None))[0])
+        return outcome(model)
+
+    async def call_llm_async(query, model, timeout=None):
+        calls.append(model)
+        await asyncio.sleep(behaviour.get(models.index(model), (0, None))[0])
+        return outcome(model)
+
+    monkeypatch.setattr(classifier, "_call_llm", call_llm)
+    monkeypatch.setattr(classifier, "_call_llm_async", call_llm_async)
+    return models, calls
+
+
+def test_models_are_tried_in_fallback_order(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier()
+    models, calls = scripted(classifier, monkeypatch, {0: (0, "error"), 1: (0, None), 2: (0, "answer")})
+    assert models == [classifier.model] + classifier.FALLBACK_MODELS
+
+    result = classifier.classify_with_llm("query")
+    assert result.reasoning == f"[LLM: {models[2]}]"
+    assert calls == models[:3]
+
+
+def test_slow_primary_is_hedged_after_the_delay(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier(LLM_HEDGE="true", LLM_HEDGE_DELAY=0.1)
+    models, calls = scripted(classifier, monkeypatch, {0: (1.0, "answer"), 1: (0, "answer")})
+
+    started = time.monotonic()
+    result = classifier.classify_with_llm("query")
+    elapsed = time.monotonic() - started
+    assert result.reasoning == f"[LLM: {models[1]}]"
+    assert calls == models[:2]
+    assert 0.1 <= elapsed < 0.5
+
+
+def test_failed_call_fires_the_next_model_at_once(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier(LLM_HEDGE="true", LLM_HEDGE_DELAY=5)
+    models, calls = scripted(classifier, monkeypatch, {0: (0, "error"), 1: (0, None), 2: (0, "answer")})
+
+    started = time.monotonic()
+    result = classifier.classify_with_llm("query")
+    assert result.reasoning == f"[LLM: {models[2]}]"
+    assert calls == models[:3]
+    assert time.monotonic() - started < 1
+
+
+def test_hedging_gives_up_at_the_deadline(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier(LLM_HEDGE="true", LLM_HEDGE_DELAY=0.1, LLM_DEADLINE=0.35)
+    models, calls = scripted(classifier, monkeypatch, {i: (1.0, "answer") for i in range(5)})
+
+    started = time.monotonic()
+    assert classifier.classify_with_llm("query") is None
+    assert 0.35 <= time.monotonic() - started < 0.8
+    # One model per hedge delay until the deadline, in fallback order
+    assert calls == models[:len(calls)] and 3 <= len(calls) <= 4
+
+
+def test_async_hedging_cancels_the_losers(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier(LLM_HEDGE="true", LLM_HEDGE_DELAY=0.1, LLM_DEADLINE=2)
+    models, calls = scripted(classifier, monkeypatch, {0: (1.0, "answer"), 1: (0.05, "answer")})
+    breaker = classifier.breaker(models[0])
+
+    async def main():
+        async with classifier:
+            started = time.monotonic()
+            result = await classifier.classify_with_llm_async("query")
+            return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(main())
+    assert result.reasoning == f"[LLM: {models[1]}]"
+    assert calls == models[:2] and elapsed < 0.5
+    # The cancelled primary is not counted against it
+    assert breaker.snapshot()["recent_calls"] == 0
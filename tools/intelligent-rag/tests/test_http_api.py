@@ -0,0 +1,28 @@
+import pytest
+
+from conftest import request
+
+
+@pytest.mark.parametrize("query", [42, ["what is the endpoint"], {"text": "hi"}, True])
+def test_classify_rejects_a_non_string_query(start_server, query):
+    _, port = start_server()
+    status, body = request(port, "POST", "/classify", {"query": query})
+    assert status == 400
+    assert body == {"error": "'query' must be a non-empty string"}
+
+
+def test_classify_and_batch_reject_the_same_entry_alike(start_server):
+    _, port = start_server()
+    _, single = request(port, "POST", "/classify", {"query": 42})
+    status, batch = request(port, "POST", "/classify/batch", {"queries": [42]})
+    assert status == 400
+    assert batch == {"error": "Entry 0 in 'queries' must be a non-empty string"}
+    assert single["error"].endswith("must be a non-empty string")
+
+
+@pytest.mark.parametrize("path", ["/classify", "/classify/batch", "/check-response"])
+def test_non_object_body_is_rejected(start_server, path):
+    _, port = start_server()
+    status, body = request(port, "POST", path, ["what is the endpoint"])
+    assert status == 400
+    assert body == {"error": "Request body must be a JSON object"}
@@ -0,0 +1,102 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from intelligent_rag import QueryClassification, QueryType
+from intelligent_rag_llm import HybridClassifier
+
+QUERIES = ["tell me about the weather", "what about dogs", "the blue house", "cats and more"]
+
+
+@pytest.fixture
+def hybrid(monkeypatch):
+    for name in ("CLASSIFIER_CACHE_DB", "DISTILLED_MODEL", "LLM_LABEL_LOG", "HYBRID_LATENCY_BUDGET_MS"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    monkeypatch.setenv("NEAR_DUPLICATE_THRESHOLD", "0")
+    monkeypatch.setenv("LLM_BATCH_SIZE", "8")
+    monkeypatch.setenv("LLM_BATCH_WINDOW_MS", "200")
+    classifier = HybridClassifier()
+    yield classifier
+    classifier.close()
+
+
+def tier_two(query):
+    return QueryClassification(
+        query_type=QueryType.COMPREHENSIVE_ANALYSIS, confidence=0.9, reasoning=f"[LLM] {query}",
+        recommended_tier=2, rag_full_context=False, top_k=20
+    )
+
+
+def test_classify_many_shares_one_batch(hybrid, monkeypatch):
+    batches = []
+    lock = threading.Lock()
+
+    def call_llm_batch(queries, model):
+        with lock:
+            batches.append(list(queries))
+        return [tier_two(query) for query in queries]
+
+    monkeypatch.setattr(hybrid.llm_classifier, "_call_llm_batch", call_llm_batch)
+    started = time.monotonic()
+    results = hybrid.classify_many(QUERIES + QUERIES[:1])
+    elapsed = time.monotonic() - started
+
+    assert [result.recommended_tier for result in results] == [2] * 5
+    assert len(batches) == 1 and sorted(batches[0]) == sorted(QUERIES)
+    # One batch window, not one per query
+    assert elapsed < 0.6
+    # The answers were cached for the next call
+    assert hybrid.classify_many(QUERIES)[0].reasoning == f"[LLM] {QUERIES[0]}"
+    assert len(batches) == 1
+
+
+def test_classify_many_answers_late_queries_with_keywords(hybrid, monkeypatch):
+    def call_llm_batch(queries, model):
+        time.sleep(0.5)
+        return [tier_two(query) for query in queries]
+
+    monkeypatch.setattr(hybrid.llm_classifier, "_call_llm_batch", call_llm_batch)
+    hybrid.latency_budget = 0.1
+    started = time.monotonic()
+    results = hybrid.classify_many(QUERIES)
+    assert time.monotonic() - started < 0.4
+    assert all(result.recommended_tier == 1 for result in results)
+    # The late answers still land in the cache
+    time.sleep(0.8)
+    assert all(result.recommended_tier == 2 for result in hybrid.classify_many(QUERIES))
+
+
+def test_distill_module_is_only_imported_when_configured(tmp_path):
+    # Deployments may ship intelligent_rag_llm.py without intelligent_rag_distill.py
+    tool_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for name in ("intelligent_rag.py", "intelligent_rag_llm.py"):
+        shutil.copy(os.path.join(tool_dir, name), tmp_path)
+    env = {k: v for k, v in os.environ.items() if k not in ("DISTILLED_MODEL", "LLM_LABEL_LOG")}
+    script = ("from intelligent_rag_llm import HybridClassifier; "
+              "h = HybridClassifier(); assert h.distilled is None and h.llm_classifier.label_log is None")
+    subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env, check=True)
+
+
+@pytest.mark.parametrize("max_scan_chars", [0, 1000])
+def test_max_scan_chars_reaches_the_llm_classifier(hybrid, max_scan_chars):
+    classifier = HybridClassifier(max_scan_chars=max_scan_chars)
+    assert classifier.keyword_classifier.max_scan_chars == max_scan_chars
+    assert classifier.llm_classifier.max_scan_chars == max_scan_chars
+    classifier.close()
+
+
+@pytest.mark.parametrize("cache_mb, max_bytes", [("0", None), ("0.5", 512 * 1024)])
+def test_hybrid_cache_mb(monkeypatch, cache_mb, max_bytes):
+    monkeypatch.setenv("HYBRID_CACHE_MB", cache_mb)
+    classifier = HybridClassifier()
+    assert classifier.cache.max_bytes == max_bytes
+    # No byte limit still caches
+    classifier.cache.put("what is the endpoint", tier_two("what is the endpoint"))
+    assert classifier.cache.get("what is the endpoint") is not None
+    classifier.close()
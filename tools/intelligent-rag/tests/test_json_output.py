@@ -0,0 +1,62 @@
+import http.client
+import json
+
+import pytest
+
+import intelligent_rag
+from intelligent_rag import dumps_json
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    """Run with orjson when it is installed, and with the standard library fallback."""
+    if request.param == "orjson":
+        if intelligent_rag.orjson is None:
+            pytest.skip("orjson is not installed")
+    else:
+        monkeypatch.setattr(intelligent_rag, "orjson", None)
+    return request.param
+
+
+def fetch(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("GET", "/health", None),
+    ("GET", "/tiers", None),
+    ("GET", "/classify?q=what%20is%20the%20endpoint", None),
+    ("POST", "/classify", {"query": "review the architecture"}),
+    ("POST", "/classify/batch", {"queries": ["what is the endpoint", "create a diagram of the system"]}),
+])
+def test_compact_and_pretty_output(backend, start_server, method, path, body):
+    _, port = start_server()
+    status, compact = fetch(port, method, path, body)
+    assert status == 200
+    parsed = json.loads(compact)
+    assert compact == json.dumps(parsed, separators=(",", ":")).encode()
+
+    separator = "&" if "?" in path else "?"
+    status, pretty = fetch(port, method, f"{path}{separator}pretty=1", body)
+    assert status == 200
+    assert pretty == json.dumps(parsed, indent=2).encode()
+
+
+def test_pretty_off_values(start_server):
+    _, port = start_server()
+    _, default = fetch(port, "GET", "/health")
+    for flag in ("0", "no", "false"):
+        assert fetch(port, "GET", f"/health?pretty={flag}")[1] == default
+
+
+def test_values_orjson_rejects_fall_back_to_json(backend):
+    data = {"big": 2 ** 70, 1: "non-string key"}
+    assert json.loads(dumps_json(data)) == {"big": 2 ** 70, "1": "non-string key"}
+    assert dumps_json(data, pretty=True) == json.dumps(data, indent=2).encode()
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from intelligent_rag import QueryClassification, QueryClassifier, QueryType, TIER_CONFIGS
+
+
+def substring_classify(classifier, query):
+    """The per-keyword substring scoring the compiled matcher replaced."""
+    query_lower = query.lower()
+    creative_matches = sum(1 for pattern in classifier.creative_patterns if pattern.search(query))
+    if creative_matches > 0:
+        return QueryClassification(
+            query_type=QueryType.CREATIVE_SYNTHESIS,
+            confidence=min(0.7 + (creative_matches * 0.1), 0.95),
+            reasoning=f"Detected creative synthesis pattern ({creative_matches} matches). Query requires complete knowledge base context.",
+            recommended_tier=3,
+            rag_full_context=True,
+            top_k=TIER_CONFIGS[3].top_k
+        )
+    comp_score = sum(1 for k in classifier.COMPREHENSIVE_KEYWORDS if k in query_lower)
+    spec_score = sum(1 for k in classifier.SPECIFIC_KEYWORDS if k in query_lower)
+    arch_score = sum([
+        "architecture" in query_lower,
+        "design" in query_lower and "pattern" in query_lower,
+        "system" in query_lower and any(x in query_lower for x in ["flow", "diagram", "overview"]),
+        "how" in query_lower and any(x in query_lower for x in ["connect", "interact", "work together"])
+    ])
+    if comp_score > spec_score or arch_score >= 2:
+        return QueryClassification(
+            query_type=QueryType.COMPREHENSIVE_ANALYSIS,
+            confidence=min(0.6 + (comp_score * 0.05) + (arch_score * 0.1), 0.9),
+            reasoning=f"Comprehensive keywords ({comp_score}) > specific keywords ({spec_score}). Architecture indicators: {arch_score}. Query likely requires full document context.",
+            recommended_tier=2,
+            rag_full_context=False,
+            top_k=TIER_CONFIGS[2].top_k
+        )
+    return QueryClassification(
+        query_type=QueryType.SPECIFIC_LOOKUP,
+        confidence=min(0.6 + (spec_score * 0.05), 0.9),
+        reasoning=f"Specific keywords ({spec_score}) >= comprehensive ({comp_score}). Standard chunked RAG is sufficient.",
+        recommended_tier=1,
+        rag_full_context=False,
+        top_k=TIER_CONFIGS[1].top_k
+    )
+
+
+def random_queries(classifier, count, seed=1):
+    rng = random.Random(seed)
+    vocabulary = (classifier.COMPREHENSIVE_KEYWORDS + classifier.SPECIFIC_KEYWORDS
+                  + classifier.ARCH_INDICATOR_TERMS
+                  + ["a", "the", "an", "draw", "of", "x", "The", "DIAGRAM", "Create", "foo", "?"])
+    queries = []
+    for _ in range(count):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(1, 12))]
+        # Joining some words without a space builds overlapping terms
+        queries.append("".join(word + rng.choice([" ", " ", ""]) for word in words))
+    return queries
+
+
+OVERLAPPING = [
+    "Draw the flowchart for the login flow",
+    "make a flowchart",
+    "chart the data flow of the system",
+    "document the documentation process",
+    "where is the documentation for this document?",
+    "how does the cache connect to the workflow",
+    "system overview and full architecture",
+    "what's the configuration setting for the configure step",
+    "design pattern for a module component",
+    "Create A Diagram of the WHOLE system-wide interaction",
+    "how does.*connect",
+    "api endpoint path route",
+]
+
+
+@pytest.mark.parametrize("query", OVERLAPPING)
+def test_overlapping_terms_score_like_substring_search(query):
+    classifier = QueryClassifier()
+    assert classifier.classify(query) == substring_classify(classifier, query)
+
+
+def test_random_queries_score_like_substring_search():
+    classifier = QueryClassifier()
+    for query in random_queries(classifier, 2000):
+        assert classifier.classify(query) == substring_classify(classifier, query), query
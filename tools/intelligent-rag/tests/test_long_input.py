@@ -0,0 +1,45 @@
+from conftest import request
+from intelligent_rag import IntelligentRAGServer, QueryClassifier
+
+
+def long_paste_query():
+    code = "\n".join(
+        f"def handler_{i}(request):\n    value = fetch_config('endpoint_{i}')\n    return value"
+        for i in range(150)
+    )
+    return ("Review the overall architecture of this service and how its components "
+            "connect to each other:\n```python\n" + code + "\n```\n")
+
+
+def test_long_paste_classifies_the_same_over_http(start_server):
+    query = long_paste_query()
+    assert len(query) > QueryClassifier.MAX_SCAN_CHARS
+    expected = QueryClassifier().classify(query)
+
+    _, port = start_server()
+    status, body = request(port, "POST", "/classify", {"query": query})
+
+    assert status == 200
+    classification = body["classification"]
+    assert classification["recommended_tier"] == expected.recommended_tier
+    assert classification["reasoning"] == expected.reasoning
+
+
+def test_spellings_share_the_cached_classification(start_server):
+    _, port = start_server()
+    _, first = request(port, "POST", "/classify", {"query": "What's the auth endpoint?"})
+    _, second = request(port, "POST", "/classify", {"query": "  what's the AUTH endpoint "})
+    assert first["classification"] == second["classification"]
+
+
+def test_server_cache_is_bounded_by_bytes():
+    server = IntelligentRAGServer(cache_mb=0.05, access_log=False)
+    query = long_paste_query()
+    for i in range(200):
+        server.classification_bodies([f"{i} {query}"])
+
+    stats = server.cache.stats()
+    assert 0 < stats["size"] < 200 and stats["evictions"] > 0
+    assert stats["bytes"] <= 0.05 * 1024 * 1024
+    # Long queries are kept as digests, not in full
+    assert all(len(key) < 100 for key in server.cache._entries)
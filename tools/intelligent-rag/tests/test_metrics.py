@@ -0,0 +1,114 @@
+import http.client
+import re
+
+from conftest import LLM_ENV, request
+from intelligent_rag import Histogram
+from intelligent_rag_llm import HybridClassifier
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_]\w*="[^"]*",?)*\})? (\S+)$')
+
+
+def scrape(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request("GET", "/metrics")
+        response = conn.getresponse()
+        return response.status, response.getheader("Content-Type"), response.read().decode()
+    finally:
+        conn.close()
+
+
+def parse(text):
+    """Check the text exposition format; returns {(name, labels): value} and {family: type}."""
+    samples = {}
+    types = {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, family, kind = line.split(" ", 3)
+            assert family not in types, f"{family} declared twice"
+            types[family] = kind
+        elif line.startswith("# HELP "):
+            continue
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"not a sample line: {line!r}"
+            name, labels, value = match.groups()
+            family = re.sub(r"_(bucket|sum|count)$", "", name) if name not in types else name
+            assert family in types, f"{name} sampled before its TYPE"
+            samples[(name, labels or "")] = float(value)
+    return samples, types
+
+
+def test_metrics_exposition_format(start_server):
+    _, port = start_server()
+    for query in ["what is the endpoint", "review the architecture", "what is the endpoint"]:
+        request(port, "POST", "/classify", {"query": query})
+    request(port, "GET", "/nope")
+
+    status, content_type, text = scrape(port)
+    assert status == 200
+    assert content_type.startswith("text/plain; version=0.0.4")
+    assert text.endswith("\n")
+    samples, types = parse(text)
+
+    p = "intelligent_rag"
+    assert types[f"{p}_requests_total"] == "counter"
+    assert types[f"{p}_request_duration_seconds"] == "histogram"
+    assert samples[(f"{p}_requests_total", '{endpoint="/classify",method="POST",status="200"}')] == 3
+    assert samples[(f"{p}_requests_total", '{endpoint="other",method="GET",status="404"}')] == 1
+    assert samples[(f"{p}_classifications_total", '{tier="1"}')] == 2
+    assert samples[(f"{p}_classifications_total", '{tier="2"}')] == 1
+    assert samples[(f"{p}_classifications_total", '{tier="3"}')] == 0
+    assert samples[(f"{p}_cache_hits_total", "")] == 1
+    assert samples[(f"{p}_cache_entries", "")] == 2
+    # The scrape itself is in flight
+    assert samples[(f"{p}_requests_in_flight", "")] == 1
+
+    buckets = [value for (name, labels), value in samples.items()
+               if name == f"{p}_request_duration_seconds_bucket" and 'endpoint="/classify"' in labels]
+    assert buckets == sorted(buckets)
+    assert buckets[-1] == samples[(f"{p}_request_duration_seconds_count", '{endpoint="/classify"}')] == 3
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.render("latency", 'endpoint="/x"') == [
+        'latency_bucket{endpoint="/x",le="0.1"} 2',
+        'latency_bucket{endpoint="/x",le="1.0"} 3',
+        'latency_bucket{endpoint="/x",le="+Inf"} 4',
+        'latency_sum{endpoint="/x"} 3.65',
+        'latency_count{endpoint="/x"} 4',
+    ]
+
+
+def test_stats_and_metrics_include_llm_telemetry(start_server, monkeypatch):
+    for name in LLM_ENV:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    monkeypatch.setenv("NEAR_DUPLICATE_THRESHOLD", "0")
+    hybrid = HybridClassifier()
+    llm = hybrid.llm_classifier
+    answer = {"choices": [{"message": {"content": '{"tier": 2, "type": "comprehensive_analysis", "confidence": 0.9}'}}],
+              "usage": {"prompt_tokens": 100, "completion_tokens": 20}}
+    monkeypatch.setattr(llm, "_call_llm", lambda query, model, timeout=None: llm._parse_response(answer, model, query))
+    _, port = start_server(classifier=hybrid)
+    try:
+        # Too vague for the keywords, so the LLM is asked
+        request(port, "POST", "/classify", {"query": "tell me about the weather"})
+
+        _, stats = request(port, "GET", "/stats")
+        assert stats["llm"]["classifications"] == {"llm": 1}
+        assert stats["llm"]["models"][llm.model]["calls"] == 1
+        assert stats["llm"]["models"][llm.model]["prompt_tokens"] == 100
+
+        _, _, text = scrape(port)
+        samples, types = parse(text)
+        p = "intelligent_rag_llm"
+        assert types[f"{p}_calls_total"] == "counter"
+        assert samples[(f"{p}_calls_total", f'{{model="{llm.model}"}}')] == 1
+        assert samples[(f"{p}_classifications_total", '{outcome="llm"}')] == 1
+        assert samples[(f"{p}_classify_duration_seconds_count", "")] == 1
+    finally:
+        hybrid.close()
@@ -0,0 +1,64 @@
+import pytest
+
+from intelligent_rag import QueryClassification, QueryType
+from intelligent_rag_llm import NearDuplicateIndex
+
+
+def classification(reasoning):
+    return QueryClassification(
+        query_type=QueryType.COMPREHENSIVE_ANALYSIS, confidence=0.9, reasoning=reasoning,
+        recommended_tier=2, rag_full_context=False, top_k=20
+    )
+
+
+BASE = "how do billing invoices sync with ledger exports nightly"
+
+
+def test_same_content_tokens_match_exactly():
+    index = NearDuplicateIndex(threshold=1.0)
+    index.add("What's the auth endpoint?", classification("auth"))
+    assert index.get("what is the AUTH endpoint").reasoning == "auth"
+    assert index.get("what is the auth endpoint for billing") is None
+    assert index.stats()["hits"] == 1 and index.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize("threshold, query, hit", [
+    # "please" is a filler word, so the token sets are equal
+    (0.8, BASE + " please", True),
+    # 8 of 9 content tokens shared: Jaccard 0.89
+    (0.8, BASE + " monthly", True),
+    (0.9, BASE + " monthly", False),
+    # 6 of 10: Jaccard 0.6
+    (0.8, "how do billing invoices sync with ledger imports weekly", False),
+])
+def test_similarity_threshold(threshold, query, hit):
+    index = NearDuplicateIndex(threshold=threshold)
+    index.add(BASE, classification("base"))
+    result = index.get(query)
+    assert (result is not None) == hit
+    if hit:
+        assert result.reasoning == "base"
+
+
+def test_too_short_and_too_long_queries_are_not_indexed():
+    index = NearDuplicateIndex()
+    long_query = " ".join(f"token{i}" for i in range(NearDuplicateIndex.MAX_TOKENS + 1))
+    for query in ["endpoint?", "what is the", long_query]:
+        index.add(query, classification(query))
+        assert index.get(query) is None
+    assert index.stats()["size"] == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    index = NearDuplicateIndex(max_entries=2)
+    index.add("auth endpoint", classification("auth"))
+    index.add("billing endpoint", classification("billing"))
+    assert index.get("auth endpoint") is not None
+    index.add("search endpoint", classification("search"))
+
+    assert index.get("billing endpoint") is None
+    assert index.get("auth endpoint").reasoning == "auth"
+    assert index.get("search endpoint").reasoning == "search"
+    # Evicted entries leave no band buckets behind
+    assert all(index._bands.values())
+    assert {tokens for bucket in index._bands.values() for tokens in bucket} == set(index._entries)
@@ -0,0 +1,81 @@
+import math
+
+import pytest
+
+from intelligent_rag_llm import parse_llm_json, repair_classification
+
+
+@pytest.mark.parametrize("answer, tier, query_type", [
+    ({"tier": 7}, 3, "creative_synthesis"),
+    ({"tier": 2}, 2, "comprehensive_analysis"),
+    ({"tier": "1", "type": "creative synthesis"}, 1, "specific_lookup"),
+    ({"tier": 3, "type": "made_up"}, 3, "creative_synthesis"),
+    ({"type": "comprehensive_analysis"}, 2, "comprehensive_analysis"),
+    ({"tier": None, "type": "Creative Synthesis"}, 3, "creative_synthesis"),
+    ({"type": "made_up"}, 1, "specific_lookup"),
+])
+def test_type_follows_repaired_tier(answer, tier, query_type):
+    cleaned, repaired = repair_classification(answer)
+    assert (cleaned["tier"], cleaned["type"]) == (tier, query_type)
+    assert repaired
+
+
+def test_consistent_answer_is_not_repaired():
+    answer = {"tier": 2, "type": "comprehensive_analysis", "confidence": 0.9, "suggests_full_context": False}
+    assert repair_classification(answer) == (answer, False)
+
+
+@pytest.mark.parametrize("content", [
+    '{"tier": 1, "type": "specific_lookup", "confidence": NaN}',
+    '{"tier": 1, "type": "specific_lookup", "confidence": Infinity}',
+    '{"tier": 1, "type": "specific_lookup", "confidence": "nan"}',
+])
+def test_non_finite_confidence_is_replaced(content):
+    answer, _ = parse_llm_json(content)
+    cleaned, repaired = repair_classification(answer)
+    assert math.isfinite(cleaned["confidence"]) and 0 <= cleaned["confidence"] <= 1
+    assert repaired
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('```json\n{"tier": 2, "type": "comprehensive_analysis"}\n```', {"tier": 2, "type": "comprehensive_analysis"}),
+    ('Sure! Here is the answer: {"tier": 1} Hope that helps.', {"tier": 1}),
+    ('{"tier": 3, "type": "creative_synthesis",}', {"tier": 3, "type": "creative_synthesis"}),
+    ('```\n{"tier": 1, "confidence": 0.8,}\n```', {"tier": 1, "confidence": 0.8}),
+])
+def test_parse_llm_json_salvages_near_misses(content, expected):
+    assert parse_llm_json(content) == (expected, True)
+
+
+def test_parse_llm_json_leaves_valid_json_alone():
+    assert parse_llm_json('{"tier": "2"}') == ({"tier": "2"}, False)
+    # A tier given as a string is coerced by repair, not by parsing
+    cleaned, repaired = repair_classification({"tier": "2"})
+    assert cleaned["tier"] == 2 and repaired
+
+
+@pytest.mark.parametrize("content", ["no json here", "", None, '{"tier": '])
+def test_parse_llm_json_rejects_answers_without_an_object(content):
+    with pytest.raises(ValueError):
+        parse_llm_json(content)
+
+
+def completion(content):
+    return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 100, "completion_tokens": 10}}
+
+
+def test_parse_response_counts_repaired_and_rejected_answers(make_llm_classifier):
+    classifier = make_llm_classifier()
+    model = classifier.model
+    valid = '{"tier": 2, "type": "comprehensive_analysis", "confidence": 0.9, "reasoning": "r", "suggests_full_context": false}'
+
+    assert classifier._parse_response(completion(valid), model, "q").recommended_tier == 2
+    assert classifier._parse_response(completion(f"Answer: {valid}"), model, "q").recommended_tier == 2
+    assert classifier._parse_response(completion('{"tier": "3"}'), model, "q").recommended_tier == 3
+    with pytest.raises(ValueError):
+        classifier._parse_response(completion("tier two, I think"), model, "q")
+
+    counters = classifier.telemetry.models[model]
+    assert counters["repaired_responses"] == 2
+    assert counters["rejected_responses"] == 1
+
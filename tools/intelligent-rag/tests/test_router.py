@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from intelligent_rag_llm import ModelRouter
+
+MODELS = ["primary", "second", "third"]
+
+
+def test_unmeasured_models_keep_their_declared_order():
+    router = ModelRouter(MODELS, exploration=0)
+    assert router.order() == MODELS
+    router.record("third", 0.2, True)
+    # Measured models go first, the rest stay in declared order behind them
+    assert router.order() == ["third", "primary", "second"]
+
+
+def test_latency_is_an_ewma():
+    router = ModelRouter(MODELS, alpha=0.5, exploration=0)
+    router.record("primary", 1.0, True)
+    router.record("primary", 0.2, True)
+    assert router.expected_seconds("primary") == pytest.approx(0.6)
+    router.record("primary", 0.2, True)
+    assert router.expected_seconds("primary") == pytest.approx(0.4)
+
+
+def test_failures_slow_a_model_down():
+    router = ModelRouter(MODELS, alpha=0.5, exploration=0)
+    router.record("primary", 0.2, True)
+    router.record("second", 0.3, True)
+    assert router.order()[:2] == ["primary", "second"]
+
+    router.record("primary", 0.2, False)
+    # 0.2s at a 50% success rate is expected to take 0.4s to a valid answer
+    assert router.expected_seconds("primary") == pytest.approx(0.4)
+    assert router.order()[:2] == ["second", "primary"]
+
+    for _ in range(20):
+        router.record("primary", 0.2, False)
+    assert router.expected_seconds("primary") == pytest.approx(0.2 / ModelRouter.MIN_SUCCESS_RATE)
+
+
+def test_exploration_moves_another_model_first():
+    router = ModelRouter(MODELS, exploration=1.0)
+    router.record("primary", 0.1, True)
+    for _ in range(10):
+        order = router.order()
+        assert order[0] != "primary" and sorted(order) == sorted(MODELS)
+    assert router.explored == 10
+
+
+def test_estimates_persist_across_restarts(tmp_path):
+    path = tmp_path / "state" / "router.json"
+    router = ModelRouter(MODELS, exploration=0, state_path=str(path))
+    router.record("second", 0.1, True)
+    router.record("primary", 0.5, True)
+    router.save()
+
+    saved = json.loads(path.read_text())
+    assert saved["models"]["second"]["calls"] == 1
+    assert list(path.parent.iterdir()) == [path]
+
+    # Models no longer in the chain are ignored; new ones start unmeasured
+    restarted = ModelRouter(["primary", "second", "fourth"], exploration=0, state_path=str(path))
+    assert restarted.order() == ["second", "primary", "fourth"]
+    assert restarted.snapshot()["models"]["second"]["calls"] == 1
+
+
+def test_unreadable_state_is_ignored(tmp_path):
+    path = tmp_path / "router.json"
+    path.write_text("{not json")
+    router = ModelRouter(MODELS, exploration=0, state_path=str(path))
+    assert router.order() == MODELS
+
+
+def test_adaptive_routing_orders_the_classifier_models(make_llm_classifier, tmp_path):
+    classifier = make_llm_classifier(LLM_ROUTING="adaptive", LLM_ROUTER_EXPLORATION=0,
+                                     LLM_ROUTER_STATE=tmp_path / "router.json")
+    fallback = classifier.FALLBACK_MODELS[1]
+    classifier.router.record(fallback, 0.05, True)
+    classifier.router.record(classifier.model, 0.5, True)
+    assert classifier._models()[:2] == [fallback, classifier.model]
+
+    classifier.close()
+    assert json.loads((tmp_path / "router.json").read_text())["models"][fallback]["calls"] == 1
@@ -0,0 +1,74 @@
+import json
+import time
+
+import pytest
+
+from intelligent_rag import IntelligentRAGServer, LRUCache, QueryClassifier, normalize_query
+
+
+class CountingClassifier(QueryClassifier):
+    """Keyword classifier that records the queries it is asked to classify."""
+
+    def __init__(self):
+        super().__init__()
+        self.classified = []
+
+    def classify_many(self, queries):
+        self.classified.extend(queries)
+        return super().classify_many(queries)
+
+
+@pytest.mark.parametrize("query, normalized", [
+    ("What's the auth endpoint?", "what's the auth endpoint"),
+    ("  what's   the AUTH\nendpoint ?!  ", "what's the auth endpoint"),
+    ("endpoint...", "endpoint"),
+    ("a?b", "a?b"),
+    ("", ""),
+])
+def test_normalize_query(query, normalized):
+    assert normalize_query(query) == normalized
+
+
+def test_spellings_are_classified_once_and_echoed_as_sent():
+    classifier = CountingClassifier()
+    server = IntelligentRAGServer(classifier=classifier, access_log=False)
+    spellings = ["What's the auth endpoint?", "what's the AUTH endpoint", "  What's  the auth endpoint!"]
+
+    bodies = [json.loads(body) for body in server.classification_bodies(spellings)]
+    bodies += [json.loads(body) for body in server.classification_bodies(spellings[:1])]
+
+    assert classifier.classified == spellings[:1]
+    assert [body["query"] for body in bodies] == spellings + spellings[:1]
+    assert all(body["classification"] == bodies[0]["classification"] for body in bodies)
+    assert server.cache.stats()["hits"] == 1
+
+
+def test_cached_classifications_expire():
+    classifier = CountingClassifier()
+    server = IntelligentRAGServer(classifier=classifier, cache_ttl=0.2, access_log=False)
+    server.classification_bodies(["what is the endpoint"])
+    server.classification_bodies(["what is the endpoint"])
+    assert len(classifier.classified) == 1
+
+    time.sleep(0.3)
+    server.classification_bodies(["what is the endpoint"])
+    assert len(classifier.classified) == 2
+    assert server.cache.stats()["expirations"] == 1
+
+
+def test_cache_size_zero_disables_the_cache():
+    classifier = CountingClassifier()
+    server = IntelligentRAGServer(classifier=classifier, cache_size=0, access_log=False)
+    for _ in range(3):
+        server.classification_bodies(["what is the endpoint"])
+    assert len(classifier.classified) == 3 and len(server.cache) == 0
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
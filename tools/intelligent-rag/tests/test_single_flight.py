@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from conftest import LLM_ENV, request
+from intelligent_rag import SingleFlight
+from intelligent_rag_llm import HybridClassifier
+
+# Too vague for the keywords, so the hybrid asks the LLM
+QUERY = "tell me about the weather"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", work, 21) for _ in range(5)))
+
+    assert run(main()) == [42] * 5
+    assert calls == [21]
+    assert flight.stats() == {"in_flight": 0, "coalesced": 4}
+
+
+def test_cancelled_owner_does_not_cancel_waiters():
+    flight = SingleFlight()
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.1)
+        return value
+
+    async def main():
+        owner = asyncio.ensure_future(flight.do_async("key", work, "owner"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(flight.do_async("key", work, "waiter"))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        # The waiter takes the work over instead of sharing the cancellation
+        assert await waiter == "waiter"
+        assert not waiter.cancelled()
+
+    run(main())
+    assert calls == ["owner", "waiter"]
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_affect_owner_or_other_waiters():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    async def main():
+        owner = asyncio.ensure_future(flight.do_async("key", work))
+        await asyncio.sleep(0.01)
+        leaving = asyncio.ensure_future(flight.do_async("key", work))
+        staying = asyncio.ensure_future(flight.do_async("key", work))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        assert await owner == "done"
+        assert await staying == "done"
+
+    run(main())
+
+
+def test_failure_is_shared_with_waiters():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.fixture
+def slow_hybrid(monkeypatch):
+    """A HybridClassifier whose upstream takes 0.3s per call; yields (classifier, upstream calls)."""
+    for name in LLM_ENV:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    monkeypatch.setenv("NEAR_DUPLICATE_THRESHOLD", "0")
+    classifier = HybridClassifier()
+    llm = classifier.llm_classifier
+    calls = []
+    answer = {"choices": [{"message": {"content": '{"tier": 2, "type": "comprehensive_analysis", "confidence": 0.9}'}}]}
+
+    def call_llm(query, model, timeout=None):
+        calls.append(query)
+        time.sleep(0.3)
+        return llm._parse_response(answer, model, query)
+
+    monkeypatch.setattr(llm, "_call_llm", call_llm)
+    yield classifier, calls
+    classifier.close()
+
+
+def in_threads(target, count=8):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_sync_classifications_make_one_upstream_call(slow_hybrid):
+    classifier, calls = slow_hybrid
+    results = in_threads(lambda: classifier.classify(QUERY))
+    assert [result.recommended_tier for result in results] == [2] * 8
+    assert calls == [QUERY]
+    assert classifier.in_flight.stats() == {"in_flight": 0, "coalesced": 7}
+
+
+def test_concurrent_identical_requests_make_one_upstream_call(slow_hybrid, start_server):
+    classifier, calls = slow_hybrid
+    _, port = start_server(classifier=classifier)
+    responses = in_threads(lambda: request(port, "POST", "/classify", {"query": QUERY}))
+    assert [status for status, _ in responses] == [200] * 8
+    assert {body["classification"]["recommended_tier"] for _, body in responses} == {2}
+    assert calls == [QUERY]
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from conftest import request
+from intelligent_rag import QueryClassification, QueryType
+from intelligent_rag_llm import HybridClassifier
+
+QUERY = "tell me about the weather"
+
+
+@pytest.fixture
+def make_hybrid(monkeypatch):
+    for name in ("CLASSIFIER_CACHE_DB", "DISTILLED_MODEL", "LLM_LABEL_LOG", "HYBRID_LATENCY_BUDGET_MS",
+                 "LLM_BATCH_SIZE"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("NEAR_DUPLICATE_THRESHOLD", "0")
+    made = []
+
+    def make(delay, error=None):
+        """A hybrid with a 100ms budget whose LLM answers tier 2 after ``delay`` seconds."""
+        classifier = HybridClassifier(latency_budget=0.1)
+        calls = []
+
+        def classify_with_llm(query):
+            calls.append(query)
+            time.sleep(delay)
+            if error is not None:
+                raise error
+            return QueryClassification(
+                query_type=QueryType.COMPREHENSIVE_ANALYSIS, confidence=0.9, reasoning=f"[LLM] {query}",
+                recommended_tier=2, rag_full_context=False, top_k=20
+            )
+
+        monkeypatch.setattr(classifier.llm_classifier, "classify_with_llm", classify_with_llm)
+        made.append(classifier)
+        return classifier, calls
+
+    yield make
+    for classifier in made:
+        classifier.close()
+
+
+def timed(classifier, query=QUERY):
+    started = time.monotonic()
+    result = classifier.classify(query)
+    return result, time.monotonic() - started
+
+
+def test_answer_within_budget_is_used(make_hybrid):
+    classifier, calls = make_hybrid(delay=0.01)
+    result, elapsed = timed(classifier)
+    assert result.recommended_tier == 2 and elapsed < 0.1
+    assert classifier.llm_classifier.telemetry.budget_exceeded == 0
+
+
+def test_late_answer_falls_back_to_keywords_and_is_cached(make_hybrid):
+    classifier, calls = make_hybrid(delay=0.4)
+    result, elapsed = timed(classifier)
+    assert result.recommended_tier == 1 and result.reasoning.startswith("Specific keywords")
+    assert 0.1 <= elapsed < 0.3
+    assert classifier.llm_classifier.telemetry.budget_exceeded == 1
+
+    time.sleep(0.5)
+    result, elapsed = timed(classifier)
+    assert result.recommended_tier == 2 and elapsed < 0.05
+    assert calls == [QUERY]
+
+
+def test_concurrent_callers_share_one_speculation(make_hybrid):
+    classifier, calls = make_hybrid(delay=0.4)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(classifier.classify(QUERY))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [result.recommended_tier for result in results] == [1] * 4
+    time.sleep(0.5)
+    assert calls == [QUERY]
+
+
+def test_failed_llm_answers_with_keywords(make_hybrid):
+    classifier, calls = make_hybrid(delay=0.01, error=ConnectionError("down"))
+    result, elapsed = timed(classifier)
+    assert result.recommended_tier == 1 and elapsed < 0.1
+    assert classifier.in_flight.stats()["in_flight"] == 0
+
+
+def test_server_serves_the_late_answer_on_the_next_request(make_hybrid, start_server):
+    classifier, calls = make_hybrid(delay=0.3)
+    _, port = start_server(classifier=classifier)
+
+    _, first = request(port, "POST", "/classify", {"query": QUERY})
+    assert first["classification"]["recommended_tier"] == 1
+    time.sleep(0.5)
+    _, second = request(port, "POST", "/classify", {"query": QUERY})
+    assert second["classification"]["recommended_tier"] == 2
+    assert calls == [QUERY]
+    # The LLM answer is final, so the server caches it
+    assert request(port, "POST", "/classify", {"query": QUERY})[1] == second
+
+
+def test_over_budget_and_failed_answers_are_provisional(make_hybrid):
+    classifier, _ = make_hybrid(delay=0.4)
+    assert classifier.classify(QUERY).provisional
+
+    failing, _ = make_hybrid(delay=0.01, error=ConnectionError("down"))
+    assert failing.classify(QUERY).provisional
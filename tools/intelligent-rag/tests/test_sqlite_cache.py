@@ -0,0 +1,86 @@
+import time
+
+from intelligent_rag import QueryClassification, QueryType, SQLiteCache
+
+
+def classification(tier=2):
+    return QueryClassification(
+        query_type=QueryType.COMPREHENSIVE_ANALYSIS if tier == 2 else QueryType.SPECIFIC_LOOKUP,
+        confidence=0.85, reasoning="[LLM] because", recommended_tier=tier, rag_full_context=False, top_k=20
+    )
+
+
+def test_round_trip_by_normalized_query_model_and_prompt(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"))
+    cache.put("Review the architecture?", classification(), "model-a", "v1")
+
+    assert cache.get("  review the ARCHITECTURE ", "model-a", "v1") == classification()
+    assert cache.get("review the architecture", "model-b", "v1") is None
+    assert cache.get("review the architecture", "model-a", "v2") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_entries_expire_and_are_evicted(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), ttl=0.2)
+    cache.put("what is the endpoint", classification(1), "model", "v1")
+    assert cache.get("what is the endpoint", "model", "v1") is not None
+
+    time.sleep(0.3)
+    assert cache.get("what is the endpoint", "model", "v1") is None
+    assert len(cache) == 1  # Expired rows stay until the next eviction
+    cache.evict()
+    assert len(cache) == 0 and cache.stats()["evictions"] == 1
+
+
+def test_oldest_entries_beyond_max_entries_are_evicted(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), max_entries=3)
+    cache.EVICT_EVERY = 5
+    for i in range(5):
+        cache.put(f"query {i}", classification(), "model", "v1")
+        time.sleep(0.01)
+
+    # The fifth write triggered an eviction
+    assert len(cache) == 3
+    assert [cache.get(f"query {i}", "model", "v1") is not None for i in range(5)] == [False, False, True, True, True]
+
+
+def test_entries_survive_reopening(tmp_path):
+    path = str(tmp_path / "nested" / "cache.db")
+    SQLiteCache(path).put("review the architecture", classification(), "model", "v1")
+
+    reopened = SQLiteCache(path)
+    assert len(reopened) == 1
+    assert reopened.get("review the architecture", "model", "v1") == classification()
+
+
+def test_llm_answers_are_reused_after_a_restart(make_llm_classifier, monkeypatch, tmp_path):
+    calls = []
+
+    def call_llm(query, model, timeout=None):
+        calls.append(query)
+        return classification()
+
+    for _ in range(2):
+        monkeypatch.setenv("CLASSIFIER_CACHE_DB", str(tmp_path / "cache.db"))
+        classifier = make_llm_classifier()
+        monkeypatch.setattr(classifier, "_call_llm", call_llm)
+        assert classifier.classify_with_llm("review the architecture") == classification()
+    assert calls == ["review the architecture"]
+
+
+def test_fallback_answers_are_kept_under_the_primary_model(make_llm_classifier, monkeypatch, tmp_path):
+    monkeypatch.setenv("CLASSIFIER_CACHE_DB", str(tmp_path / "cache.db"))
+    classifier = make_llm_classifier()
+    fallback = classifier.FALLBACK_MODELS[0]
+
+    def call_llm(query, model, timeout=None):
+        if model == classifier.model:
+            raise ConnectionError("down")
+        return classification()
+
+    monkeypatch.setattr(classifier, "_call_llm", call_llm)
+    assert classifier.classify_with_llm("review the architecture") == classification()
+
+    cache = classifier.persistent_cache
+    assert cache.get("review the architecture", classifier.model, classifier.prompt_version) == classification()
+    assert cache.get("review the architecture", fallback, classifier.prompt_version) is None
@@ -0,0 +1,82 @@
+import importlib.util
+import os
+
+import pytest
+
+from intelligent_rag import FullContextMarkerDetector, RAGResponseHandler
+
+MARKER = RAGResponseHandler.FULL_CONTEXT_MARKER
+FUNCTION_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "apps", "openwebui-functions", "Intelligent_RAG.py"
+)
+
+
+def load_function():
+    spec = importlib.util.spec_from_file_location("openwebui_intelligent_rag", FUNCTION_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+function = load_function()
+
+
+@pytest.mark.parametrize("detector_class", [FullContextMarkerDetector, function.FullContextMarkerDetector])
+def test_marker_split_across_chunks(detector_class):
+    detector = detector_class(MARKER)
+    chunks = ["The docs are thin. [REQUEST_", "FULL_", "CONT", "EXT] need the", " deployment guide"]
+    fed = [detector.feed(chunk) for chunk in chunks]
+
+    assert fed == [False, False, False, True, False]
+    assert detector.chunk_index(chunks[3]) == len("EXT]")
+    assert detector.marker_offset == len("The docs are thin. ")
+    assert detector.reasoning == "need the deployment guide"
+
+
+@pytest.mark.parametrize("detector_class", [FullContextMarkerDetector, function.FullContextMarkerDetector])
+def test_response_without_marker(detector_class):
+    detector = detector_class(MARKER)
+    assert not any(detector.feed(chunk) for chunk in ["[REQUEST_", "PARTIAL", " answer ", "[REQUEST"])
+    assert not detector.detected and detector.reasoning == ""
+    assert detector.chunk_index("abc") == 3
+
+
+def event(content=None, finish_reason=None, completion_id="chatcmpl-1"):
+    return {"id": completion_id, "choices": [{"delta": {"content": content}, "finish_reason": finish_reason}]}
+
+
+def streamed(filter_, chunks, metadata):
+    shown = []
+    for chunk in chunks:
+        shown.append(filter_.stream(event(chunk), __metadata__=metadata)["choices"][0]["delta"]["content"])
+    filter_.stream(event(finish_reason="stop"), __metadata__=metadata)
+    return "".join(shown)
+
+
+@pytest.fixture
+def filter_():
+    filter_ = function.Filter()
+    filter_.valves.verbose = False
+    return filter_
+
+
+def test_hidden_reason_reaches_outlet_by_message_id(filter_):
+    metadata = {"message_id": "msg-1"}
+    shown = streamed(filter_, ["Partial answer [REQUEST_FULL", "_CONTEXT] missing", " the API docs"], metadata)
+
+    assert shown == "Partial answer " + MARKER
+    assert filter_.stream_detectors == {}
+    body = {"id": "msg-1", "messages": [{"role": "assistant", "content": shown}]}
+    result = filter_.outlet(body, __metadata__=metadata)
+
+    assert result["metadata"]["intelligent_rag"]["reroll_requested"]
+    assert result["metadata"]["intelligent_rag"]["reroll_reason"] == "missing the API docs"
+    assert filter_.stream_reasons == {}
+
+
+def test_reason_keyed_by_completion_id_is_dropped(filter_):
+    shown = streamed(filter_, ["Partial answer ", MARKER, " missing the API docs"], None)
+
+    # Still truncated, but outlet could never match a completion id, so nothing is kept
+    assert shown == "Partial answer " + MARKER
+    assert filter_.stream_detectors == {} and filter_.stream_reasons == {}
@@ -0,0 +1,41 @@
+import http.client
+import json
+import time
+
+from intelligent_rag import IntelligentRAGServer, QueryClassifier
+
+
+class SlowClassifier(QueryClassifier):
+    """Keyword classifier that takes ``delay`` seconds per classify_many call."""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def classify_many(self, queries):
+        time.sleep(self.delay)
+        return super().classify_many(queries)
+
+
+def test_ndjson_rows_are_written_as_chunks_are_classified(start_server):
+    chunks = 3
+    _, port = start_server(classifier=SlowClassifier(0.4))
+    queries = [f"question number {i}" for i in range(IntelligentRAGServer.STREAM_CHUNK * chunks)]
+
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        started = time.monotonic()
+        conn.request("POST", "/classify/batch", body=json.dumps({"queries": queries, "stream": True}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        assert response.status == 200
+        first = json.loads(response.readline())
+        first_row_after = time.monotonic() - started
+        rows = [first] + [json.loads(line) for line in response.read().splitlines()]
+        total = time.monotonic() - started
+    finally:
+        conn.close()
+
+    assert [row["query"] for row in rows] == queries
+    assert first_row_after < 0.4 * (chunks - 1)
+    assert total >= 0.4 * chunks
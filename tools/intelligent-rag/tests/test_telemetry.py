@@ -0,0 +1,79 @@
+import logging
+import time
+
+import requests
+
+from intelligent_rag_llm import LLMTelemetry, RateLimitFilter
+
+
+def record(msg, level=logging.WARNING, *args):
+    return logging.LogRecord("intelligent_rag.llm", level, __file__, 1, msg, args, None)
+
+
+def test_rate_limit_filter_drops_bursts_and_reports_them():
+    limiter = RateLimitFilter(burst=2, interval=0.1)
+    passed = [limiter.filter(record("%s failed: %s", logging.WARNING, "model", i)) for i in range(5)]
+    assert passed == [True, True, False, False, False]
+    # Other templates and other levels have their own allowance
+    assert limiter.filter(record("Batch of %d failed"))
+    assert limiter.filter(record("%s failed: %s", logging.ERROR))
+
+    time.sleep(0.15)
+    late = record("%s failed: %s", logging.WARNING, "model", "down")
+    assert limiter.filter(late)
+    assert late.getMessage() == "model failed: down (3 similar messages suppressed)"
+
+    # Nothing was dropped in the last window, so nothing is reported
+    time.sleep(0.15)
+    quiet = record("%s failed: %s", logging.WARNING, "model", "down")
+    assert limiter.filter(quiet) and quiet.getMessage() == "model failed: down"
+
+
+def completion(content):
+    return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 100, "completion_tokens": 20}}
+
+
+ANSWER = '{"tier": 2, "type": "comprehensive_analysis", "confidence": 0.9, "reasoning": "r", "suggests_full_context": false}'
+
+
+def test_counters_after_success_failure_and_fallback(make_llm_classifier, monkeypatch):
+    classifier = make_llm_classifier()
+    primary, fallback = classifier.model, classifier.FALLBACK_MODELS[0]
+    failing = {}
+
+    def call_llm(query, model, timeout=None):
+        error = failing.get(model)
+        if error is not None:
+            raise error
+        return classifier._parse_response(completion(ANSWER), model, query)
+
+    monkeypatch.setattr(classifier, "_call_llm", call_llm)
+    assert classifier.classify_with_llm("success") is not None
+
+    failing[primary] = requests.Timeout("slow")
+    assert classifier.classify_with_llm("falls back") is not None
+
+    failing.update((model, ConnectionError("down")) for model in classifier._models())
+    assert classifier.classify_with_llm("fails") is None
+
+    snapshot = classifier.telemetry.snapshot()
+    assert snapshot["classifications"] == {"llm": 2, "failed": 1}
+    first, second = snapshot["models"][primary], snapshot["models"][fallback]
+    assert (first["calls"], first["failures"], first["timeouts"]) == (3, 2, 1)
+    assert (second["calls"], second["failures"], second["timeouts"]) == (2, 1, 0)
+    assert first["error_rate"] == 2 / 3
+    assert first["prompt_tokens"] == second["prompt_tokens"] == 100
+    assert first["estimated_cost_usd"] > 0
+    assert classifier.telemetry.classify_latency.count == 3
+
+
+def test_render_lists_every_model_counter():
+    telemetry = LLMTelemetry()
+    telemetry.record_call("a", 0.2)
+    telemetry.record_call("b", 1.2, error=TimeoutError())
+    telemetry.record_budget_exceeded()
+
+    text = telemetry.render("prefix")
+    assert 'prefix_llm_calls_total{model="a"} 1' in text
+    assert 'prefix_llm_timeouts_total{model="b"} 1' in text
+    assert "prefix_llm_budget_exceeded_total 1" in text